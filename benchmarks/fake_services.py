@@ -0,0 +1,167 @@
+"""
+Local HTTP stand-ins for the FDSN web service and the nearest city service.
+
+One threaded server answers:
+
+- ``/fdsnws/event/1/query``: the bundled QuakeML, with the event id of the
+  fixture replaced by the requested ``eventid`` so that every id is a
+  different event;
+- ``/fdsnws/station/1/query``: the bundled StationXML;
+- ``/fdsnws/{event,station}/1/application.wadl``: the WADL obspy reads when
+  the client is created (dataselect answers 404, as a server without it);
+- ``/get_nearest_city``: ``(distance, city, province)`` as the real service.
+
+FDSN and nearest city requests wait their own latency before answering, so
+a burst of tickets can be replayed against a slow FDSN server.
+"""
+
+import time
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from benchmarks import stubs
+
+
+_WADL_PARAMS = {
+    "event": (
+        ("eventid", "xs:string"), ("starttime", "xs:dateTime"), ("endtime", "xs:dateTime"),
+        ("updatedafter", "xs:dateTime"), ("minlatitude", "xs:double"), ("maxlatitude", "xs:double"),
+        ("minlongitude", "xs:double"), ("maxlongitude", "xs:double"), ("minmagnitude", "xs:double"),
+        ("maxmagnitude", "xs:double"), ("includearrivals", "xs:boolean"),
+        ("includeallorigins", "xs:boolean"), ("includeallmagnitudes", "xs:boolean"),
+        ("includecomments", "xs:boolean"), ("orderby", "xs:string"), ("limit", "xs:int"),
+        ("format", "xs:string"),
+    ),
+    "station": (
+        ("network", "xs:string"), ("station", "xs:string"), ("location", "xs:string"),
+        ("channel", "xs:string"), ("starttime", "xs:dateTime"), ("endtime", "xs:dateTime"),
+        ("latitude", "xs:double"), ("longitude", "xs:double"), ("maxradius", "xs:double"),
+        ("level", "xs:string"), ("format", "xs:string"),
+    ),
+}
+
+_WADL = """<?xml version="1.0" encoding="UTF-8"?>
+<application xmlns="http://wadl.dev.java.net/2009/02" xmlns:xs="http://www.w3.org/2001/XMLSchema">
+  <resources base="{base}">
+    <resource path="query">
+      <method name="GET" id="query">
+        <request>
+{params}
+        </request>
+      </method>
+    </resource>
+  </resources>
+</application>
+"""
+
+
+def _wadl(base, service):
+    params = "\n".join(
+        f'          <param name="{name}" style="query" type="{kind}"/>' for name, kind in _WADL_PARAMS[service]
+    )
+    return _WADL.format(base=base, params=params)
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, body, content_type="application/xml", status=200):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        services = self.server.services
+        url = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        route = url.path.rstrip("/")
+        services.count(route)
+
+        if route == "/get_nearest_city":
+            services.wait(services.nearest_latency)
+            return self._send(services.nearest_answer, "text/plain")
+
+        if not route.startswith("/fdsnws/"):
+            return self._send("not found", "text/plain", 404)
+        services.wait(services.fdsn_latency)
+        parts = route.split("/")  # ["", "fdsnws", service, "1", method]
+        service, method = (parts[2], parts[4]) if len(parts) == 5 else (None, None)
+        if service not in _WADL_PARAMS:
+            return self._send("not found", "text/plain", 404)
+        if method == "application.wadl":
+            return self._send(_wadl(f"{services.url}/fdsnws/{service}/1", service))
+        if method != "query":
+            return self._send("not found", "text/plain", 404)
+        if service == "station":
+            return self._send(services.inventory)
+        event_id = query.get("eventid", stubs.EVENT_ID)
+        return self._send(services.event.replace(stubs.EVENT_ID, event_id))
+
+
+class FakeServices:
+    """
+    FDSN and nearest city stand-ins on a local port.
+
+    :param float fdsn_latency: seconds before every FDSN answer (WADL included)
+    :param float nearest_latency: seconds before every nearest city answer
+    :param int port: 0 picks a free port
+    """
+
+    def __init__(self, fdsn_latency=0.0, nearest_latency=0.0, host="127.0.0.1", port=0,
+                 event_file=stubs.EVENT_FILE, inventory_file=stubs.INVENTORY_FILE):
+        self.fdsn_latency = fdsn_latency
+        self.nearest_latency = nearest_latency
+        self.nearest_answer = repr((12.3, "Quito", "Pichincha"))
+        with open(event_file, encoding="utf-8") as f:
+            self.event = f.read()
+        with open(inventory_file, encoding="utf-8") as f:
+            self.inventory = f.read()
+        self.requests = Counter()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.services = self
+        self._thread = None
+
+    @property
+    def host(self):
+        return self._server.server_address[0]
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def count(self, route):
+        with self._lock:
+            self.requests[route] += 1
+
+    @staticmethod
+    def wait(latency):
+        if latency:
+            time.sleep(latency)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-services", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
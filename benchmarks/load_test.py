@@ -0,0 +1,401 @@
+"""
+End-to-end load test of the ticket service.
+
+Starts :mod:`benchmarks.fake_services` (FDSN event/station web service and
+nearest city service backed by the bundled QuakeML/StationXML, with their
+own latency) and the FastAPI app of :mod:`iganima.api.main` in a separate
+process, pointed at them through a generated iganima config. Map renders are
+stubbed in the job fork-server (:mod:`benchmarks.stub_maps`) unless
+``--real_maps`` is given. Then it fires ``--requests`` GET /tickets
+requests, spread over ``--distinct`` event ids (so repeated ids hit the
+deduplication and the render cache), at most ``--concurrency`` at a time
+within ``--spread`` seconds, follows every ticket to its end with long-poll
+and reports:
+
+- throughput: /tickets responses per second and finished tickets per second;
+- p50/p95/p99 of the /tickets response time and of the time to a finished ticket;
+- deduplication rate (responses with ``deduplicated: true``), rejections
+  (429) and error rate (failed requests or tickets ending in error).
+
+Usage::
+
+    python -m benchmarks.load_test --requests 40 --distinct 8 --fdsn_latency 0.3
+    python -m benchmarks.load_test --requests 200 --distinct 50 --spread 60 --max_concurrent_jobs 4
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import socket
+import logging
+import argparse
+import tempfile
+import subprocess
+import configparser
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from benchmarks import stubs
+from benchmarks.fake_services import FakeServices
+
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ACTIVE_STATUSES = ("pending", "queued", "processing")
+LONG_POLL_SECONDS = 30
+API_START_TIMEOUT = 180
+
+_LOGGING_INI = """[loggers]
+keys=root
+
+[handlers]
+keys=file_handler
+
+[formatters]
+keys=default
+
+[logger_root]
+level=INFO
+handlers=file_handler
+
+[handler_file_handler]
+class=FileHandler
+formatter=default
+args=({log_file!r},)
+
+[formatter_default]
+format=%(asctime)s - %(levelname)s - %(name)s - %(message)s
+"""
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def write_config(workdir, services, args):
+    """
+    iganima config and FDSN server file pointing at the fake services.
+
+    :returns: string: path of the iganima config
+    """
+    frames_in = os.path.join(workdir, "frames_in")
+    stubs.write_assets(frames_in)
+
+    server_file = os.path.join(workdir, "server_configuration.json")
+    with open(server_file, "w", encoding="utf-8") as f:
+        json.dump({"FDSN": {"name": "FDSN", "server_ip": services.host, "port": str(services.port)}}, f)
+
+    config = configparser.ConfigParser()
+    config["fdsn"] = {
+        "server_id": "FDSN",
+        "server_config_file": server_file,
+        "xml_inventory_file": stubs.INVENTORY_FILE,
+        "nearest_url": f"{services.url}/get_nearest_city",
+        "nearest_token": "loadtest",
+    }
+    config["animation"] = {
+        "mapbox_access_token": "loadtest",
+        "frames_number": str(args.frames_number),
+        "fps": str(args.fps),
+        "number_stations": "10",
+        "frames_out": os.path.join(workdir, "frames"),
+        "frames_in": frames_in,
+        "video_out": os.path.join(workdir, "video"),
+        "asset_cache_dir": os.path.join(workdir, "assets"),
+    }
+    if args.keyframes:
+        config["animation"]["keyframes"] = str(args.keyframes)
+    config_path = os.path.join(workdir, "iganima.cfg")
+    with open(config_path, "w", encoding="utf-8") as f:
+        config.write(f)
+    return config_path
+
+
+def start_api(workdir, config_path, port, args):
+    """Start the API (``--serve_api``) in its own process; its output goes to ``api.log``."""
+    logging_ini = os.path.join(workdir, "logging.ini")
+    with open(logging_ini, "w", encoding="utf-8") as f:
+        f.write(_LOGGING_INI.format(log_file=os.path.join(workdir, "igsismani.log")))
+
+    env = os.environ.copy()
+    env.update({
+        "IGSISMANI_ARTIFACTS_DIR": os.path.join(workdir, "artifacts"),
+        "IGSISMANI_DEFAULT_IGANIMA_CONFIG": config_path,
+        "IGSISMANI_LOGGING_INI": logging_ini,
+        "IGSISMANI_JOB_MODE": "forkserver",
+        "IGSISMANI_REPO_DIR": REPO_DIR,
+        "IGSISMANI_LOADTEST_MAP_LATENCY": str(args.map_latency),
+    })
+    env.pop("IGSISMANI_STATE_DB", None)
+    if args.max_concurrent_jobs:
+        env["IGSISMANI_MAX_CONCURRENT_JOBS"] = str(args.max_concurrent_jobs)
+    if args.max_queued_jobs:
+        env["IGSISMANI_MAX_QUEUED_JOBS"] = str(args.max_queued_jobs)
+
+    cmd = [sys.executable, "-m", "benchmarks.load_test", "--serve_api", str(port)]
+    if args.real_maps:
+        cmd.append("--real_maps")
+    log = open(os.path.join(workdir, "api.log"), "w", encoding="utf-8")
+    return subprocess.Popen(cmd, cwd=REPO_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+def wait_until_ready(base_url, proc, timeout=API_START_TIMEOUT):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"API exited with code {proc.returncode} while starting, see api.log")
+        try:
+            if requests.get(f"{base_url}/metrics", timeout=2).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    raise TimeoutError(f"API not ready after {timeout} s")
+
+
+def stop_api(proc):
+    proc.terminate()
+    try:
+        proc.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+
+
+def plan_requests(args):
+    """
+    Event id and start offset of every request: ``--distinct`` ids, each one
+    requested ``--requests / --distinct`` times, in random order within ``--spread`` s.
+
+    :returns: list: (offset_seconds, event_id), sorted by offset
+    """
+    rng = random.Random(args.seed)
+    ids = [f"{args.event_prefix}{i:04d}" for i in range(max(1, min(args.distinct, args.requests)))]
+    event_ids = [ids[i % len(ids)] for i in range(args.requests)]
+    rng.shuffle(event_ids)
+    return sorted((rng.uniform(0, args.spread) if args.spread else 0.0, e) for e in event_ids)
+
+
+def follow_ticket(status_url, timeout):
+    """Long-poll the ticket until it leaves the active statuses. :returns: dict: last ticket state"""
+    deadline = time.monotonic() + timeout
+    data = requests.get(status_url, timeout=10).json()
+    while data.get("status") in ACTIVE_STATUSES and time.monotonic() < deadline:
+        wait = min(LONG_POLL_SECONDS, max(1, int(deadline - time.monotonic())))
+        data = requests.get(
+            status_url, params={"wait": wait, "since": data.get("updated_at")}, timeout=wait + 10
+        ).json()
+    return data
+
+
+def fire(base_url, t0, offset, event_id, args):
+    """One client: create the ticket and, unless ``--no_wait``, follow it to its end."""
+    delay = t0 + offset - time.monotonic()
+    if delay > 0:
+        time.sleep(delay)
+    record = {"event_id": event_id, "offset": offset}
+    params = {"event_id": event_id, "magnitude": args.magnitude, "preview": str(args.preview).lower()}
+    start = time.monotonic()
+    record["sent"] = start - t0
+    try:
+        response = requests.get(f"{base_url}/tickets", params=params, timeout=args.request_timeout)
+    except requests.RequestException as e:
+        record.update(status_code=None, request_seconds=time.monotonic() - start, error=str(e))
+        return record
+    record["request_seconds"] = time.monotonic() - start
+    record["status_code"] = response.status_code
+    if response.status_code != 200:
+        record["error"] = response.text[:200]
+        return record
+
+    body = response.json()
+    record.update(ticket_id=body["ticket_id"], deduplicated=body.get("deduplicated", False))
+    if args.no_wait:
+        return record
+    try:
+        ticket = follow_ticket(body["status_url"], args.ticket_timeout)
+    except (requests.RequestException, ValueError) as e:
+        record["error"] = f"status: {e}"
+        return record
+    record.update(
+        final_status=ticket.get("status"),
+        cache_hit=ticket.get("cache_hit"),
+        ticket_seconds=time.monotonic() - start,
+        finished=time.monotonic() - t0,
+    )
+    if ticket.get("status") != "done":
+        record["error"] = ticket.get("message") or ticket.get("status")
+    return record
+
+
+def percentile(values, q):
+    """Nearest-rank percentile, None for an empty list."""
+    if not values:
+        return None
+    values = sorted(values)
+    rank = max(1, int(-(-q * len(values) // 100)))
+    return values[min(rank, len(values)) - 1]
+
+
+def summarize(records):
+    ok = [r for r in records if r.get("status_code") == 200]
+    rejected = [r for r in records if r.get("status_code") == 429]
+    failed = [r for r in records if r.get("error")]
+    finished = [r for r in ok if r.get("final_status")]
+    done = [r for r in finished if r["final_status"] == "done"]
+
+    create_window = max((r["sent"] + r["request_seconds"] for r in records), default=0.0)
+    finish_window = max((r["finished"] for r in finished), default=0.0)
+    tickets_done = {r["ticket_id"] for r in done}
+    request_latency = [r["request_seconds"] for r in records if r.get("status_code") is not None]
+    ticket_latency = [r["ticket_seconds"] for r in done]
+
+    return {
+        "requests": len(records),
+        "distinct_events": len({r["event_id"] for r in records}),
+        "responses_ok": len(ok),
+        "rejected_429": len(rejected),
+        "errors": len(failed),
+        "error_rate": len(failed) / len(records) if records else 0.0,
+        "dedup_rate": sum(1 for r in ok if r.get("deduplicated")) / len(ok) if ok else 0.0,
+        "tickets": len({r["ticket_id"] for r in ok}),
+        "tickets_done": len(tickets_done),
+        "cache_hits": len({r["ticket_id"] for r in done if r.get("cache_hit")}),
+        "requests_per_second": len(ok) / create_window if create_window else None,
+        "tickets_per_second": len(tickets_done) / finish_window if finish_window else None,
+        "request_seconds": {f"p{q}": percentile(request_latency, q) for q in (50, 95, 99)},
+        "ticket_seconds": {f"p{q}": percentile(ticket_latency, q) for q in (50, 95, 99)},
+        "wall_seconds": max(create_window, finish_window),
+    }
+
+
+def _fmt(value, unit=""):
+    return "-" if value is None else f"{value:.3f}{unit}"
+
+
+def report(summary, services_requests):
+    print(f"requests: {summary['requests']} over {summary['distinct_events']} events, "
+          f"{summary['tickets']} tickets, {summary['tickets_done']} done "
+          f"({summary['cache_hits']} from the render cache)")
+    print(f"throughput: {_fmt(summary['requests_per_second'])} /tickets responses/s, "
+          f"{_fmt(summary['tickets_per_second'])} finished tickets/s")
+    for name in ("request_seconds", "ticket_seconds"):
+        p = summary[name]
+        print(f"{name:<16} p50 {_fmt(p['p50'], ' s'):>10}  p95 {_fmt(p['p95'], ' s'):>10}  p99 {_fmt(p['p99'], ' s'):>10}")
+    print(f"dedup rate: {summary['dedup_rate']:.1%}  rejected (429): {summary['rejected_429']}  "
+          f"error rate: {summary['error_rate']:.1%}")
+    print(f"FDSN event queries: {services_requests.get('/fdsnws/event/1/query', 0)}  "
+          f"nearest city queries: {services_requests.get('/get_nearest_city', 0)}")
+    print(f"wall time: {summary['wall_seconds']:.1f} s")
+
+
+def serve_api(port, real_maps):
+    """Body of the API process: stub the map renders in the fork-server and run the app."""
+    import uvicorn
+    from iganima.api import workers
+
+    if not real_maps:
+        workers.PRELOAD_MODULES.append("benchmarks.stub_maps")
+    from iganima.api.main import app
+
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning")
+
+
+def main(args):
+
+    workdir = tempfile.mkdtemp(prefix="igsismani-load-")
+    services = FakeServices(fdsn_latency=args.fdsn_latency, nearest_latency=args.nearest_latency).start()
+    proc = None
+    try:
+        config_path = write_config(workdir, services, args)
+        port = _free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        proc = start_api(workdir, config_path, port, args)
+        wait_until_ready(base_url, proc)
+
+        plan = plan_requests(args)
+        t0 = time.monotonic()
+        with ThreadPoolExecutor(max_workers=args.concurrency or len(plan)) as pool:
+            futures = [pool.submit(fire, base_url, t0, offset, event_id, args) for offset, event_id in plan]
+            records = [f.result() for f in futures]
+        metrics_text = requests.get(f"{base_url}/metrics", timeout=10).text
+    finally:
+        if proc is not None:
+            stop_api(proc)
+        services.stop()
+        if args.keep:
+            print(f"Load test files kept in {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    summary = summarize(records)
+    report(summary, services.requests)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({
+                "summary": summary,
+                "records": records,
+                "fake_services": dict(services.requests),
+                "metrics": metrics_text,
+            }, f, indent=2)
+
+    if args.max_error_rate is not None and summary["error_rate"] > args.max_error_rate:
+        print(f"FAIL: error rate {summary['error_rate']:.1%} exceeds {args.max_error_rate:.1%}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="End-to-end load test of the IGSISMANI ticket service")
+    parser.add_argument("--requests", type=int, default=40, help="Total /tickets requests")
+    parser.add_argument("--distinct", type=int, default=10,
+                        help="Distinct event ids; the rest of the requests repeat them")
+    parser.add_argument("--concurrency", type=int, default=0,
+                        help="Clients in flight at once (default: one per request)")
+    parser.add_argument("--spread", type=float, default=0.0,
+                        help="Seconds over which the requests start (0: all at once)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--event_prefix", type=str, default="igepn2024lt")
+    parser.add_argument("--magnitude", type=float, default=4.5)
+    parser.add_argument("--preview", action="store_true", help="Ask for the low-resolution preview too")
+    parser.add_argument("--no_wait", action="store_true",
+                        help="Only measure /tickets responses, do not follow the tickets")
+    parser.add_argument("--request_timeout", type=float, default=30.0)
+    parser.add_argument("--ticket_timeout", type=float, default=1800.0,
+                        help="Seconds to follow a ticket before giving up")
+    parser.add_argument("--fdsn_latency", type=float, default=0.0,
+                        help="Seconds added to every answer of the fake FDSN server")
+    parser.add_argument("--nearest_latency", type=float, default=0.0,
+                        help="Seconds added to every answer of the fake nearest city service")
+    parser.add_argument("--map_latency", type=float, default=0.0,
+                        help="Seconds added to every stubbed map render")
+    parser.add_argument("--real_maps", action="store_true", help="Render the maps with Mapbox/Kaleido")
+    parser.add_argument("--frames_number", type=int, default=20)
+    parser.add_argument("--fps", type=int, default=4)
+    parser.add_argument("--keyframes", type=int, default=0)
+    parser.add_argument("--max_concurrent_jobs", type=int, default=0,
+                        help="IGSISMANI_MAX_CONCURRENT_JOBS of the API (default: inherited)")
+    parser.add_argument("--max_queued_jobs", type=int, default=0,
+                        help="IGSISMANI_MAX_QUEUED_JOBS of the API (default: inherited)")
+    parser.add_argument("--max_error_rate", type=float, default=None,
+                        help="Exit with status 1 if the error rate is above this fraction")
+    parser.add_argument("--json", type=str, default=None,
+                        help="Write the summary, every request and the final /metrics to this JSON file")
+    parser.add_argument("--keep", action="store_true", help="Keep the artifacts and logs of the run")
+    parser.add_argument("--serve_api", type=int, default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--verbose", action="store_true")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+
+    if args.serve_api:
+        serve_api(args.serve_api, args.real_maps)
+    else:
+        sys.exit(main(args))
@@ -0,0 +1,242 @@
+"""
+Stage-level benchmarks of the video pipeline.
+
+Runs :func:`create_event_video` offline, with the bundled QuakeML/StationXML
+fixtures and the stubs of :mod:`benchmarks.stubs` in place of FDSN, the
+nearest city service and Mapbox/Kaleido, and reports the time of each stage:
+
+- ``event``: event fetch and QuakeML parsing (``get_event_by_id``, ``event2dict``)
+- ``inventory``: ``read_inventory`` of the StationXML
+- ``stations``: picks table, ``create_stations_dict`` and distances
+- ``map``: map frames (stubbed renders, keyframe interpolation) or their restore from the stage cache
+- ``info``: ``InfoBarsScene`` frames or their restore from the stage cache
+- ``assets``: outro slides (``asset_store.load_slide``)
+- ``compose``: ``compose_frames``
+- ``encode``: ``encode_outputs``
+
+The first run starts with empty stage and asset caches (cold); the following
+runs reuse them (warm). The command exits with status 1 when the end-to-end
+time of any run exceeds the budget (RNF1: under one minute).
+
+Usage::
+
+    python -m benchmarks.run_benchmarks --budget 60 --warm_runs 2
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+import functools
+import statistics
+import contextlib
+from unittest import mock
+
+from obspy import read_inventory
+
+from iganima import asset_store
+from iganima import iganima_utils as u
+from iganima import video_pipeline as vp
+from benchmarks import stubs
+
+
+STAGES = ("event", "inventory", "stations", "map", "info", "assets", "compose", "encode")
+
+DEFAULT_BUDGET_SECONDS = 60.0
+
+
+def _timed(timings, stage, func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - start
+    return wrapper
+
+
+def _timed_stage_cache(timings, func):
+    # restore_stage/save_stage(stage_cache_dir, stage, ...): tiempo a cuenta de la etapa
+    @functools.wraps(func)
+    def wrapper(stage_cache_dir, stage, *args, **kwargs):
+        return _timed(timings, stage, func)(stage_cache_dir, stage, *args, **kwargs)
+    return wrapper
+
+
+def build_run_param(workdir, frames_in, args):
+    """Run parameters equivalent to :func:`vp.load_run_parameters` for the benchmark."""
+    animation = {
+        "mapbox_access_token": "benchmark",
+        "frames_number": str(args.frames_number),
+        "fps": str(args.fps),
+        "number_stations": "10",
+        "frames_out": os.path.join(workdir, "frames"),
+        "frames_in": frames_in,
+        "video_out": os.path.join(workdir, "video"),
+        "asset_cache_dir": os.path.join(workdir, "assets"),
+    }
+    if args.keyframes:
+        animation["keyframes"] = str(args.keyframes)
+        animation["output_fps"] = str(args.output_fps)
+    if args.compositor_threads:
+        animation["compositor_threads"] = str(args.compositor_threads)
+    return {
+        "fdsn": {
+            "server_id": "FDSN",
+            "xml_inventory_file": stubs.INVENTORY_FILE,
+            "nearest_url": "http://nearest.invalid/get_nearest_city",
+            "nearest_token": "benchmark",
+        },
+        "animation": animation,
+        "mseed_server": {"FDSN": {"name": "FDSN", "server_ip": "fdsn.invalid", "port": "8080"}},
+    }
+
+
+def reset_process_caches():
+    """Forget what earlier runs left in memory, so a cold run reads every file again."""
+    for cache in (asset_store._HASHES, asset_store._LOGOS, asset_store._SLIDES):
+        cache.clear()
+
+
+def run_once(run_param, workdir, client, args):
+    """
+    One benchmark run: the station stages, then the whole pipeline with every stage timed.
+
+    :returns: dict: ``{"stages": {stage: seconds}, "total": seconds, "map_renders": n}``;
+        ``total`` covers the station stages too, so the budget check is end to end
+    """
+    timings = {}
+    map_source = stubs.StubMapSource(latency=args.map_latency)
+
+    run_start = time.perf_counter()
+    start = run_start
+    inventory = read_inventory(stubs.INVENTORY_FILE)
+    timings["inventory"] = time.perf_counter() - start
+
+    catalog = client.get_events(eventid=stubs.EVENT_ID)
+    start = time.perf_counter()
+    picks_df = u.picks2dataframe(catalog)
+    station_set = set(f"{n}.{s}" for n, s in zip(picks_df["network"], picks_df["station"]))
+    _, station_list = u.create_stations_dict(station_set, inventory)
+    for station_dict in station_list:
+        u.attach_distance_dict(station_dict, catalog[0])
+    timings["stations"] = time.perf_counter() - start
+
+    with contextlib.ExitStack() as stack:
+        patch = stack.enter_context
+        patch(mock.patch.object(u, "connect_fdsn", lambda ip, port: client))
+        patch(mock.patch.object(vp.requests, "get", stubs.FakeNearestCity(latency=args.nearest_latency)))
+        patch(mock.patch.object(vp, "save_frame", map_source.save_frame))
+        patch(mock.patch.object(vp, "save_basemap_frame", map_source.save_basemap_frame))
+        patch(mock.patch.object(vp, "save_overlay_frame", map_source.save_overlay_frame))
+        for module, name, stage in (
+            (u, "get_event_by_id", "event"),
+            (u, "event2dict", "event"),
+            (vp, "render_map_frames", "map"),
+            (vp, "render_map_keyframes", "map"),
+            (vp, "render_info_frames", "info"),
+            (asset_store, "load_slide", "assets"),
+            (vp, "compose_frames", "compose"),
+            (vp, "encode_outputs", "encode"),
+        ):
+            patch(mock.patch.object(module, name, _timed(timings, stage, getattr(module, name))))
+        for name in ("restore_stage", "save_stage"):
+            patch(mock.patch.object(vp, name, _timed_stage_cache(timings, getattr(vp, name))))
+
+        vp.create_event_video(
+            stubs.EVENT_ID,
+            run_param,
+            stage_cache_dir=os.path.join(workdir, "stages"),
+            outputs=args.outputs,
+            profile=args.profile,
+        )
+        total = time.perf_counter() - run_start
+
+    return {"stages": timings, "total": total, "map_renders": map_source.renders}
+
+
+def report(cold, warm, budget):
+    """Print the stage table: cold run and median of the warm runs."""
+    header = f"{'stage':<10} {'cold (s)':>10} {'warm (s)':>10}"
+    print(header)
+    print("-" * len(header))
+    for stage in STAGES:
+        cold_s = cold["stages"].get(stage, 0.0)
+        warm_s = statistics.median(r["stages"].get(stage, 0.0) for r in warm) if warm else float("nan")
+        print(f"{stage:<10} {cold_s:>10.3f} {warm_s:>10.3f}")
+    print("-" * len(header))
+    warm_total = statistics.median(r["total"] for r in warm) if warm else float("nan")
+    print(f"{'pipeline':<10} {cold['total']:>10.3f} {warm_total:>10.3f}")
+    print(f"map renders: cold {cold['map_renders']}, warm {warm[0]['map_renders'] if warm else '-'}")
+    print(f"budget (RNF1): {budget:.1f} s")
+
+
+def main(args):
+
+    workdir = tempfile.mkdtemp(prefix="igsismani-bench-")
+    try:
+        frames_in = os.path.join(workdir, "frames_in")
+        stubs.write_assets(frames_in)
+        run_param = build_run_param(workdir, frames_in, args)
+        client = stubs.FakeFDSNClient(latency=args.fdsn_latency)
+        vp.configure_manim()
+
+        reset_process_caches()
+        cold = run_once(run_param, workdir, client, args)
+        warm = [run_once(run_param, workdir, client, args) for _ in range(args.warm_runs)]
+    finally:
+        if args.keep:
+            print(f"Benchmark files kept in {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report(cold, warm, args.budget)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"budget": args.budget, "cold": cold, "warm": warm}, f, indent=2)
+
+    over = [r["total"] for r in [cold] + warm if r["total"] > args.budget]
+    if over:
+        print(f"FAIL: end-to-end time {max(over):.1f} s exceeds the budget of {args.budget:.1f} s")
+        return 1
+    print("OK")
+    return 0
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Stage-level benchmarks of the IGSISMANI video pipeline")
+    parser.add_argument("--budget", type=float,
+                        default=float(os.getenv("IGSISMANI_RNF1_BUDGET_SECONDS", DEFAULT_BUDGET_SECONDS)),
+                        help="Maximum end-to-end seconds per run (default: $IGSISMANI_RNF1_BUDGET_SECONDS or 60)")
+    parser.add_argument("--warm_runs", type=int, default=2,
+                        help="Runs after the cold one, reusing the stage and asset caches")
+    parser.add_argument("--frames_number", type=int, default=20)
+    parser.add_argument("--fps", type=int, default=4)
+    parser.add_argument("--keyframes", type=int, default=0,
+                        help="Benchmark the keyframe mode with this many Mapbox renders")
+    parser.add_argument("--output_fps", type=int, default=25)
+    parser.add_argument("--compositor_threads", type=int, default=0)
+    parser.add_argument("--outputs", type=str, default=None,
+                        help="Comma separated output formats: mp4 (always), webm, gif, jpg (poster)")
+    parser.add_argument("--profile", type=str, default="full", choices=["full", "preview"])
+    parser.add_argument("--map_latency", type=float, default=0.0,
+                        help="Seconds added to every stubbed map render (a Kaleido render is ~0.5-1 s)")
+    parser.add_argument("--fdsn_latency", type=float, default=0.0,
+                        help="Seconds added to every stubbed FDSN request")
+    parser.add_argument("--nearest_latency", type=float, default=0.0,
+                        help="Seconds added to the stubbed nearest city request")
+    parser.add_argument("--json", type=str, default=None, help="Write the raw timings to this JSON file")
+    parser.add_argument("--keep", action="store_true", help="Keep the frames and videos of the runs")
+    parser.add_argument("--verbose", action="store_true")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+
+    sys.exit(main(args))
@@ -0,0 +1,20 @@
+"""
+Preload module for the job fork-server in load tests.
+
+Importing it replaces the Mapbox/Kaleido renders of :mod:`iganima.video_pipeline`
+with :class:`benchmarks.stubs.StubMapSource`, so every job forked from the
+server renders its maps locally. ``IGSISMANI_LOADTEST_MAP_LATENCY`` adds
+seconds to every stubbed render (a Kaleido render is ~0.5-1 s).
+"""
+
+import os
+
+from iganima import video_pipeline
+from benchmarks import stubs
+
+
+_map_source = stubs.StubMapSource(latency=float(os.environ.get("IGSISMANI_LOADTEST_MAP_LATENCY", "0")))
+
+video_pipeline.save_frame = _map_source.save_frame
+video_pipeline.save_basemap_frame = _map_source.save_basemap_frame
+video_pipeline.save_overlay_frame = _map_source.save_overlay_frame
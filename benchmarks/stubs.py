@@ -0,0 +1,132 @@
+"""
+Offline stand-ins for the external services of the pipeline.
+
+- :class:`FakeFDSNClient` answers ``get_events`` by parsing the bundled
+  QuakeML, so the event stage still measures the QuakeML parsing.
+- :class:`FakeNearestCity` replaces the ``requests.get`` call to the nearest
+  city service.
+- :class:`StubMapSource` replaces the Kaleido/Mapbox renders
+  (``save_frame``, ``save_basemap_frame``, ``save_overlay_frame``) with locally
+  drawn images of the same size.
+
+Every stub accepts a latency in seconds to emulate the remote service.
+"""
+
+import os
+import time
+
+import cv2
+import numpy as np
+from obspy import read_events
+
+from iganima import asset_store
+from iganima.keyframes import FIG_WIDTH, FIG_HEIGHT
+
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+EVENT_FILE = os.path.join(FIXTURES_DIR, "event.quakeml")
+INVENTORY_FILE = os.path.join(FIXTURES_DIR, "inventory.xml")
+EVENT_ID = "igepn2024bench"
+
+
+class FakeFDSNClient:
+    """``obspy.clients.fdsn.Client`` with ``get_events`` served from a QuakeML file."""
+
+    def __init__(self, event_file=EVENT_FILE, latency=0.0):
+        self.event_file = event_file
+        self.latency = latency
+
+    def get_events(self, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        return read_events(self.event_file, format="QUAKEML")
+
+
+class _Response:
+
+    def __init__(self, text):
+        self.text = text
+        self.status_code = 200
+
+    def raise_for_status(self):
+        pass
+
+
+class FakeNearestCity:
+    """Callable with the signature of ``requests.get`` answering like the nearest city service."""
+
+    def __init__(self, distance=12.3, city="Quito", province="Pichincha", latency=0.0):
+        self.answer = repr((distance, city, province))
+        self.latency = latency
+
+    def __call__(self, url, params=None, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        return _Response(self.answer)
+
+
+class StubMapSource:
+    """
+    Map renders drawn locally: a terrain-like gradient that changes with the
+    zoom, the epicentre and the logo box. PNG size and compression cost are
+    close to the real frames.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.renders = 0
+
+    def _basemap(self, zoom, scale):
+        width, height = int(round(FIG_WIDTH * scale)), int(round(FIG_HEIGHT * scale))
+        y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+        f = 2.0 ** (zoom - 4.5) / 60.0
+        cx, cy = width / 2, height / 2
+        relief = np.sin((x - cx) * f) * np.cos((y - cy) * f * 1.3)
+        img = np.empty((height, width, 3), dtype=np.uint8)
+        img[:, :, 0] = 200 + 30 * relief
+        img[:, :, 1] = 215 + 25 * relief
+        img[:, :, 2] = 190 + 20 * relief
+        return img
+
+    def _render(self, path, img):
+        if self.latency:
+            time.sleep(self.latency)
+        self.renders += 1
+        if not cv2.imwrite(path, img):
+            raise RuntimeError(f"Could not write {path}")
+
+    def save_frame(self, fig, frame_name, mapbox_access_token, event_latitude, event_longitude,
+                   event_annotation, zoom_level, logo_source=None, map_style="outdoors", scale=1):
+        img = self._basemap(zoom_level, scale)
+        h, w = img.shape[:2]
+        cv2.circle(img, (w // 2, h // 2), max(1, int(3 * scale)), (0, 128, 0), -1, cv2.LINE_AA)
+        cv2.rectangle(img, (0, 0), (int(w * 0.4), int(h * 0.2)), (255, 255, 255), -1)
+        self._render(frame_name, img)
+
+    def save_basemap_frame(self, frame_name, mapbox_access_token, event_latitude, event_longitude,
+                           zoom_level, map_style="outdoors", scale=1):
+        self._render(frame_name, self._basemap(zoom_level, scale))
+
+    def save_overlay_frame(self, frame_name, logo_source=None, scale=1):
+        width, height = int(round(FIG_WIDTH * scale)), int(round(FIG_HEIGHT * scale))
+        layer = np.zeros((height, width, 4), dtype=np.uint8)
+        layer[:int(height * 0.2), :int(width * 0.4)] = (255, 255, 255, 255)
+        self._render(frame_name, layer)
+
+
+def write_assets(frames_in, size=(720, 1084)):
+    """
+    Synthetic ``frames_in``: the outro slides and the logo.
+
+    :param string frames_in: directory to create
+    :param tuple size: (width, height) of the slides
+    """
+    os.makedirs(frames_in, exist_ok=True)
+    width, height = size
+    for name, color in (("outro.igepn.png", (168, 95, 46)), ("doc_anuncio_1.png", (32, 0, 128))):
+        slide = np.full((height, width, 3), color, dtype=np.uint8)
+        cv2.putText(slide, name, (40, height // 2), cv2.FONT_HERSHEY_SIMPLEX, 1.2, (255, 255, 255), 2)
+        cv2.imwrite(os.path.join(frames_in, name), slide)
+    logo = np.zeros((64, 256, 4), dtype=np.uint8)
+    logo[8:56, 8:248] = (168, 95, 46, 255)
+    cv2.imwrite(os.path.join(frames_in, asset_store.LOGO_FILE), logo)
@@ -0,0 +1,203 @@
+from __future__ import annotations
+
+import logging
+import os
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+from iganima.api.scheduler import JobScheduler
+from iganima.memory import available_memory_mb
+
+logger = logging.getLogger(__name__)
+
+# Adaptive admission: the number of render jobs allowed to run at once is
+# recomputed every few seconds from the cost of past jobs (peak RSS, CPU
+# cores used) and the headroom of the host (idle CPU, MemAvailable), between
+# a lower and an upper bound.
+
+REASONS = ("cpu", "memory", "max_bound", "min_bound")
+
+
+class JobCost:
+    """
+    Exponential moving average of the peak RSS and the CPU cores used by a
+    render job, fed with every finished job. Starts from a default guess so
+    the controller can act before the first job ends.
+    """
+
+    def __init__(self, rss_mb: float = 1024.0, cores: float = 1.0, alpha: float = 0.3) -> None:
+        self.rss_mb = float(rss_mb)
+        self.cores = float(cores)
+        self.alpha = alpha
+        self.samples = 0
+        self._lock = threading.Lock()
+
+    def observe(self, rss_peak_mb: Optional[float], cpu_seconds: Optional[float], seconds: Optional[float]) -> None:
+        """
+        Record a finished job.
+
+        :param rss_peak_mb: peak RSS of the job process plus its children (Kaleido, ffmpeg)
+        :param cpu_seconds: CPU time of the job process (all threads) and its children
+        :param seconds: wall time of the job
+        """
+        if not rss_peak_mb and not (cpu_seconds and seconds):
+            return
+        with self._lock:
+            # The first sample replaces the guess instead of blending with it.
+            a = 1.0 if self.samples == 0 else self.alpha
+            if rss_peak_mb:
+                self.rss_mb += a * (float(rss_peak_mb) - self.rss_mb)
+            if cpu_seconds and seconds:
+                self.cores += a * (max(0.05, float(cpu_seconds) / float(seconds)) - self.cores)
+            self.samples += 1
+
+    def estimate(self) -> Tuple[float, float]:
+        """(peak RSS in MB, CPU cores) expected for the next job."""
+        with self._lock:
+            return self.rss_mb, self.cores
+
+
+class HostLoad:
+    """CPU busy fraction of the host between two calls, from /proc/stat (load average elsewhere)."""
+
+    def __init__(self) -> None:
+        self.cpu_count = os.cpu_count() or 1
+        self._last: Optional[Tuple[int, int]] = None
+
+    def _read_stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            with open("/proc/stat") as f:
+                values = [int(v) for v in f.readline().split()[1:]]
+        except (OSError, ValueError):
+            return None
+        idle = values[3] + (values[4] if len(values) > 4 else 0)  # idle + iowait
+        return sum(values), idle
+
+    def cpu_busy(self) -> Optional[float]:
+        """Fraction (0-1) of the host CPU in use since the previous call, None if unknown."""
+        current = self._read_stat()
+        if current is None:
+            try:
+                return min(1.0, os.getloadavg()[0] / self.cpu_count)
+            except OSError:
+                return None
+        last, self._last = self._last, current
+        if last is None or current[0] <= last[0]:
+            return None
+        total, idle = current[0] - last[0], current[1] - last[1]
+        return max(0.0, min(1.0, 1.0 - idle / total))
+
+
+JOB_COST = JobCost()
+
+
+class AdaptiveConcurrency:
+    """
+    Sets the concurrency limit of a JobScheduler from the host headroom, or
+    of a fleet.Worker (the slots of one worker process) in broker mode.
+
+    On every tick:
+
+    - cpu: running jobs plus the jobs that fit in the idle cores below
+      cpu_target (idle cores / cores per job);
+    - memory: running jobs plus the jobs whose peak RSS fits in MemAvailable
+      minus memory_reserve_mb;
+    - the limit is the smaller of both, between min_jobs and max_jobs. It
+      goes up by one job per tick (the new jobs must show up in the host load
+      before the next step) and down at once; running jobs are never stopped.
+
+    The reason of the current limit is the constraint that set it: cpu,
+    memory, or the bound it was clamped to.
+    """
+
+    def __init__(
+        self,
+        scheduler: JobScheduler,
+        min_jobs: int = 1,
+        max_jobs: Optional[int] = None,
+        interval: float = 5.0,
+        cpu_target: float = 0.9,
+        memory_reserve_mb: float = 1024.0,
+        job_cost: JobCost = JOB_COST,
+        host: Optional[HostLoad] = None,
+    ) -> None:
+        self.scheduler = scheduler
+        self.max_jobs = min(scheduler.max_concurrent, int(max_jobs or scheduler.max_concurrent))
+        self.min_jobs = max(1, min(int(min_jobs), self.max_jobs))
+        self.interval = interval
+        self.cpu_target = cpu_target
+        self.memory_reserve_mb = memory_reserve_mb
+        self.job_cost = job_cost
+        self.host = host or HostLoad()
+        self.reason = "min_bound"
+        self._last: Dict[str, Any] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.scheduler.set_limit(self.min_jobs)
+        self.host.cpu_busy()  # first /proc/stat sample
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._loop, name="igsismani-admission", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.tick()
+            except Exception:
+                logger.exception("adaptive concurrency tick failed")
+
+    def tick(self) -> int:
+        """Recompute and apply the limit. Returns the limit applied."""
+        rss_mb, cores = self.job_cost.estimate()
+        running = int(self.scheduler.stats()["running"])
+        current = self.scheduler.limit
+
+        candidates = {}
+        busy = self.host.cpu_busy()
+        if busy is not None:
+            idle_cores = self.host.cpu_count * (self.cpu_target - busy)
+            candidates["cpu"] = running + int(idle_cores // cores)
+        available = available_memory_mb()
+        if available is not None:
+            candidates["memory"] = running + int((available - self.memory_reserve_mb) // rss_mb)
+
+        if candidates:
+            reason = min(candidates, key=candidates.get)
+            target = candidates[reason]
+        else:
+            # No host signal on this platform: stay where we are.
+            reason, target = self.reason, current
+        if target >= self.max_jobs:
+            reason, target = "max_bound", self.max_jobs
+        elif target <= self.min_jobs:
+            reason, target = "min_bound", self.min_jobs
+        limit = min(target, current + 1)
+
+        if limit != current:
+            logger.info(
+                "concurrency limit %s -> %s (%s): running=%s cpu_busy=%s available_mb=%s job_rss_mb=%.0f job_cores=%.2f",
+                current, limit, reason, running, busy, available, rss_mb, cores,
+            )
+        self.reason = reason
+        self._last = {
+            "cpu_busy": busy,
+            "memory_available_mb": available,
+            "job_rss_mb": rss_mb,
+            "job_cores": cores,
+            "job_samples": self.job_cost.samples,
+        }
+        return self.scheduler.set_limit(limit)
+
+    def state(self) -> Dict[str, Any]:
+        """Current limit, its reason, the bounds and the inputs of the last tick."""
+        return {
+            "limit": self.scheduler.limit,
+            "reason": self.reason,
+            "min_jobs": self.min_jobs,
+            "max_jobs": self.max_jobs,
+            **self._last,
+        }
@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from email.utils import formatdate
+from pathlib import Path
+from typing import Iterator, Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import Response, StreamingResponse
+
+CHUNK_SIZE = 256 * 1024
+
+# Published outputs are never rewritten: events/<event_id>/<event_id>-<n>.<ext>
+# and the content-addressed renders/<render_key>.<ext>
+VERSIONED_VIDEO_RE = re.compile(r"^(.+-\d+|[0-9a-f]{64})\.(mp4|webm|gif|jpg)$")
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+DEFAULT_CACHE_CONTROL = "public, max-age=60"
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+# (path, size, mtime_ns) -> ETag, so each file is hashed once per process.
+# Least recently used first; at most ETAG_CACHE_SIZE files are remembered.
+ETAG_CACHE_SIZE = 1024
+_ETAG_CACHE: OrderedDict[Tuple[str, int, int], str] = OrderedDict()
+_ETAG_LOCK = threading.Lock()
+
+
+def file_etag(path: Path) -> str:
+    """Strong ETag: SHA-256 of the file content (truncated), cached per file version."""
+    st = path.stat()
+    key = (str(path), st.st_size, st.st_mtime_ns)
+    with _ETAG_LOCK:
+        etag = _ETAG_CACHE.get(key)
+        if etag is not None:
+            _ETAG_CACHE.move_to_end(key)
+            return etag
+
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            h.update(chunk)
+    etag = f'"{h.hexdigest()[:32]}"'
+    with _ETAG_LOCK:
+        _ETAG_CACHE[key] = etag
+        _ETAG_CACHE.move_to_end(key)
+        while len(_ETAG_CACHE) > ETAG_CACHE_SIZE:
+            _ETAG_CACHE.popitem(last=False)
+    return etag
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    candidates = [c.strip() for c in header.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single "bytes=a-b" range into inclusive (start, end).
+
+    Returns None for unsupported forms (e.g. multiple ranges), in which case
+    the whole file is served. Raises ValueError for unsatisfiable ranges.
+    """
+    m = _RANGE_RE.match(header.strip())
+    if not m:
+        return None
+    first, last = m.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # suffix range: last N bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError("unsatisfiable range")
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError("unsatisfiable range")
+    return start, min(end, size - 1)
+
+
+def _iter_file(path: Path, start: int, length: int) -> Iterator[bytes]:
+    with path.open("rb") as f:
+        f.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def video_response(request: Request, path: Path, media_type: str = "video/mp4") -> Response:
+    """
+    Serve path with HTTP Range support (single range), strong ETag,
+    conditional GET (If-None-Match / If-Range) and cache headers.
+    """
+    st = path.stat()
+    size = st.st_size
+    etag = file_etag(path)
+    cache_control = IMMUTABLE_CACHE_CONTROL if VERSIONED_VIDEO_RE.match(path.name) else DEFAULT_CACHE_CONTROL
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(st.st_mtime, usegmt=True),
+        "Cache-Control": cache_control,
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": f'attachment; filename="{path.name}"',
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    byte_range = None
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (not if_range or if_range.strip() == etag):
+        try:
+            byte_range = _parse_range(range_header, size)
+        except ValueError:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+
+    if byte_range is None:
+        start, length, status_code = 0, size, 200
+    else:
+        start, end = byte_range
+        length = end - start + 1
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(length)
+
+    if request.method == "HEAD":
+        return Response(status_code=status_code, headers=headers, media_type=media_type)
+
+    return StreamingResponse(
+        _iter_file(path, start, length),
+        status_code=status_code,
+        headers=headers,
+        media_type=media_type,
+    )
+
+
+# Offload modes: the proxy streams the file itself (sendfile) after the API validated the ticket.
+OFFLOAD_DEFAULT_HEADERS = {
+    "nginx": "X-Accel-Redirect",  # value: internal URI (prefix + path under artifacts dir)
+    "sendfile": "X-Sendfile",  # value: absolute filesystem path (Apache mod_xsendfile, lighttpd)
+}
+
+
+def offload_response(
+    path: Path,
+    *,
+    artifacts_dir: Path,
+    mode: str,
+    header_name: Optional[str] = None,
+    internal_prefix: str = "/protected/",
+    media_type: str = "video/mp4",
+) -> Response:
+    """
+    Empty response that tells the front proxy to serve path itself.
+
+    - mode "nginx": `X-Accel-Redirect: <internal_prefix><path relative to artifacts_dir>`
+    - mode "sendfile": `X-Sendfile: <absolute path>`
+
+    Range, conditional GET and ETag are then handled by the proxy.
+    """
+    if mode not in OFFLOAD_DEFAULT_HEADERS:
+        raise ValueError(f"unknown offload mode: {mode}")
+    header_name = header_name or OFFLOAD_DEFAULT_HEADERS[mode]
+
+    if mode == "nginx":
+        rel = path.resolve().relative_to(artifacts_dir.resolve()).as_posix()
+        target = internal_prefix.rstrip("/") + "/" + rel
+    else:
+        target = str(path.resolve())
+
+    cache_control = IMMUTABLE_CACHE_CONTROL if VERSIONED_VIDEO_RE.match(path.name) else DEFAULT_CACHE_CONTROL
+    headers = {
+        header_name: target,
+        "Cache-Control": cache_control,
+        "Content-Disposition": f'attachment; filename="{path.name}"',
+    }
+    return Response(status_code=200, headers=headers, media_type=media_type)
@@ -0,0 +1,250 @@
+from __future__ import annotations
+
+import logging
+import os
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from iganima.api import metrics
+from iganima.api.job_queue import JobBroker, LeasedJob
+from iganima.api.runner import ArtifactStore, abandon_job_spec, run_job_spec
+from iganima.api.state_store import StateStore, TicketStore
+
+logger = logging.getLogger(__name__)
+
+
+class Worker:
+    """
+    Render worker consuming a JobBroker, in its own process (run_worker.py).
+    On the host of the API it opens the SQLite broker and state database
+    directly and works in the artifacts directory of the API (artifacts None).
+    On other hosts all three go through the API (see open_state and
+    iganima.api.remote): the job renders in a local directory and its outputs
+    are uploaded to the API.
+
+    Each of the `slots` threads leases one job at a time and runs it with
+    runner.run_job_spec (the render itself runs in a forked process, as in the
+    API). While a job runs, a heartbeat extends its lease every
+    lease_seconds / 3; if the worker dies, the lease expires and another worker
+    takes the job. A job leased more than max_attempts times (its workers
+    keep dying, e.g. killed for memory) fails its ticket instead of running again.
+
+    At most `limit` slots lease jobs at once: all of them unless it is lowered
+    with set_limit, e.g. by an admission.AdaptiveConcurrency running in the
+    worker process against the headroom of its host. The worker registers
+    its current limit as its slots, so the API sees the capacity actually offered.
+    """
+
+    def __init__(
+        self,
+        broker: JobBroker,
+        store: TicketStore,
+        artifacts: Optional[ArtifactStore] = None,
+        worker_id: Optional[str] = None,
+        slots: int = 1,
+        lease_seconds: float = 60.0,
+        poll_seconds: float = 2.0,
+        max_attempts: int = 3,
+    ) -> None:
+        self.broker = broker
+        self.store = store
+        self.artifacts = artifacts
+        self.host = socket.gethostname()
+        self.worker_id = worker_id or f"{self.host}-{os.getpid()}"
+        self.slots = max(1, int(slots))
+        self.lease_seconds = float(lease_seconds)
+        self.poll_seconds = float(poll_seconds)
+        self.max_attempts = max(1, int(max_attempts))
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+        self._running: Dict[str, LeasedJob] = {}
+        self._busy = 0  # slots leasing or running a job
+        self.limit = self.slots
+
+    @property
+    def max_concurrent(self) -> int:
+        return self.slots
+
+    def set_limit(self, limit: int) -> int:
+        """Change the number of slots allowed to run jobs (1..slots). Returns the limit applied."""
+        with self._lock:
+            self.limit = max(1, min(self.slots, int(limit)))
+            return self.limit
+
+    def run(self) -> None:
+        """Serve jobs until stop() is called; running jobs are finished before returning."""
+        self.broker.register_worker(self.worker_id, self.host, self.limit)
+        logger.info("worker %s started with %s slots", self.worker_id, self.slots)
+        for i in range(self.slots):
+            t = threading.Thread(target=self._slot_loop, name=f"igsismani-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        # Also the worker heartbeat: the API counts the slots of live workers.
+        while not self._stop.wait(self.lease_seconds / 3):
+            self._heartbeat()
+        # After stop(), the running jobs keep their leases until they finish;
+        # otherwise another worker would lease and render them a second time.
+        for t in self._threads:
+            while True:
+                t.join(timeout=self.lease_seconds / 3)
+                if not t.is_alive():
+                    break
+                self._heartbeat()
+        self.broker.unregister_worker(self.worker_id)
+        logger.info("worker %s stopped", self.worker_id)
+
+    def stop(self) -> None:
+        """Stop leasing new jobs (e.g. on SIGTERM)."""
+        self._stop.set()
+
+    def stats(self) -> Dict[str, float]:
+        """Scheduler gauges of this worker for /metrics."""
+        with self._lock:
+            running = len(self._running)
+        stats = self.broker.stats()
+        return {
+            "queued": stats["queued"],
+            "running": running,
+            "max_concurrent": self.slots,
+            "concurrency_limit": self.limit,
+            "max_queued": 0,
+        }
+
+    def _heartbeat(self) -> None:
+        try:
+            self.broker.register_worker(self.worker_id, self.host, self.limit)
+            self._extend_leases()
+        except Exception:
+            logger.exception("worker %s heartbeat failed", self.worker_id)
+
+    def _extend_leases(self) -> None:
+        with self._lock:
+            jobs = list(self._running.values())
+        for job in jobs:
+            if not self.broker.heartbeat(job.job_id, self.worker_id, self.lease_seconds):
+                logger.warning("worker %s lost the lease of job %s", self.worker_id, job.job_id)
+
+    def _slot_loop(self) -> None:
+        while not self._stop.is_set():
+            with self._lock:
+                free = self._busy < self.limit
+                if free:
+                    self._busy += 1
+            if not free:
+                # Slot above the current limit: idle until the limit goes up.
+                self._stop.wait(self.poll_seconds)
+                continue
+            try:
+                try:
+                    job = self.broker.lease(self.worker_id, self.lease_seconds)
+                except Exception:
+                    logger.exception("could not lease a job")
+                    job = None
+                if job is not None:
+                    self._run(job)
+            finally:
+                with self._lock:
+                    self._busy -= 1
+            if job is None:
+                self._stop.wait(self.poll_seconds)
+
+    def _run(self, job: LeasedJob) -> None:
+        if job.attempts > self.max_attempts:
+            message = f"job abandoned after {job.attempts - 1} attempts: its workers stopped before finishing it"
+            logger.error("%s: %s", job.job_id, message)
+            abandon_job_spec(job.spec, self.store, message)
+            self.broker.complete(job.job_id, self.worker_id, error=message)
+            return
+
+        logger.info("worker %s running job %s (attempt %s)", self.worker_id, job.job_id, job.attempts)
+        with self._lock:
+            self._running[job.job_id] = job
+        error = None
+        try:
+            # Errors of the render are recorded in the ticket by run_job_spec itself.
+            run_job_spec(job.spec, self.store, self.artifacts)
+        except Exception as e:
+            logger.exception("job %s failed", job.job_id)
+            error = str(e) or type(e).__name__
+        finally:
+            with self._lock:
+                self._running.pop(job.job_id, None)
+        self.broker.complete(job.job_id, self.worker_id, error=error)
+
+
+def _remote_state(scheme: str) -> Callable[[str, Path], Tuple[TicketStore, Optional[ArtifactStore]]]:
+    def factory(path: str, artifacts_dir: Path) -> Tuple[TicketStore, Optional[ArtifactStore]]:
+        from iganima.api.remote import ApiClient, HttpArtifacts, HttpStateStore
+
+        client = ApiClient(f"{scheme}://{path}")
+        return HttpStateStore(client), HttpArtifacts(client, artifacts_dir)
+
+    return factory
+
+
+# State URL scheme -> factory(path, artifacts_dir) returning the ticket store and the artifact
+# handoff of a worker. "sqlite" alone uses <artifacts_dir>/state.sqlite3 and the artifacts
+# directory of the API (same host); "http(s)://<api host>:<port>" goes through that API.
+STATE_BACKENDS: Dict[str, Callable[[str, Path], Tuple[TicketStore, Optional[ArtifactStore]]]] = {
+    "sqlite": lambda path, artifacts_dir: (
+        StateStore(Path(path) if path else Path(artifacts_dir) / "state.sqlite3"), None
+    ),
+    "http": _remote_state("http"),
+    "https": _remote_state("https"),
+}
+
+
+def open_state(url: str, artifacts_dir: Path) -> Tuple[TicketStore, Optional[ArtifactStore]]:
+    """
+    Ticket store and artifact handoff (None: the directories of the job spec)
+    for a URL such as ``sqlite:////srv/igsismani/state.sqlite3`` or
+    ``http://api.example:8000``; artifacts_dir is where the jobs of this worker work.
+
+    :raises ValueError: for an unknown scheme
+    """
+    scheme, _, rest = url.strip().partition(":")
+    path = rest[2:] if rest.startswith("//") else rest
+    factory = STATE_BACKENDS.get(scheme.lower())
+    if factory is None:
+        raise ValueError(f"unknown state backend {scheme!r}, expected one of {sorted(STATE_BACKENDS)}")
+    return factory(path, artifacts_dir)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        admission = self.server.admission
+        body = metrics.render_metrics(
+            self.server.worker.stats(), admission.state() if admission else None
+        ).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", metrics.CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def serve_metrics(
+    worker: Worker, host: str, port: int, admission: Optional[Any] = None
+) -> ThreadingHTTPServer:
+    """
+    Prometheus /metrics of the worker process (job and stage durations,
+    results, memory, and the adaptive concurrency state when `admission`
+    is given) on host:port, served from a daemon thread.
+    """
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    server.worker = worker
+    server.admission = admission
+    threading.Thread(target=server.serve_forever, name="igsismani-worker-metrics", daemon=True).start()
+    return server
@@ -0,0 +1,367 @@
+from __future__ import annotations
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+from iganima.api.scheduler import QueueFullError
+
+logger = logging.getLogger(__name__)
+
+# Durable job queue shared by the API processes (producers) and the worker
+# processes of iganima.api.fleet (consumers). A job is leased by one worker
+# for lease_seconds and the worker keeps extending the lease while the job
+# runs; if the worker dies the lease expires and the next lease() hands the
+# job to another worker.
+
+
+class LeasedJob:
+    """A job handed to a worker: its id, spec, priority and how many times it has been leased."""
+
+    def __init__(self, job_id: str, spec: Dict[str, Any], priority: float, attempts: int) -> None:
+        self.job_id = job_id
+        self.spec = spec
+        self.priority = priority
+        self.attempts = attempts
+
+    def __repr__(self) -> str:
+        return f"LeasedJob({self.job_id!r}, attempts={self.attempts})"
+
+
+class JobBroker:
+    """
+    Interface of a durable job queue. SQLiteBroker is the local
+    implementation; brokers for other backends register in BROKERS.
+    """
+
+    def enqueue(
+        self, job_id: str, spec: Dict[str, Any], priority: float = 0.0, not_before: Optional[float] = None
+    ) -> None:
+        """Queue a job; higher priority first, FIFO at equal priority. It is not leased before not_before (time.time())."""
+        raise NotImplementedError
+
+    def lease(self, worker_id: str, lease_seconds: float) -> Optional[LeasedJob]:
+        """Take the next queued job (or one whose lease expired) for worker_id, None if there is none."""
+        raise NotImplementedError
+
+    def heartbeat(self, job_id: str, worker_id: str, lease_seconds: float) -> bool:
+        """Extend the lease of a running job. False if worker_id no longer holds it."""
+        raise NotImplementedError
+
+    def complete(self, job_id: str, worker_id: str, error: Optional[str] = None) -> None:
+        """Mark a leased job as done (or failed, with error): it will not be leased again."""
+        raise NotImplementedError
+
+    def release(self, job_id: str, worker_id: str) -> None:
+        """Give a leased job back to the queue (worker shutting down before running it)."""
+        raise NotImplementedError
+
+    def register_worker(self, worker_id: str, host: str, slots: int) -> None:
+        """Record that worker_id is alive and runs up to slots jobs at once."""
+        raise NotImplementedError
+
+    def unregister_worker(self, worker_id: str) -> None:
+        raise NotImplementedError
+
+    def position(self, job_id: str) -> Optional[int]:
+        """1-based position of a queued job, None if it is not waiting."""
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, float]:
+        """queued, running, workers, slots (of live workers) and avg_job_seconds."""
+        raise NotImplementedError
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id        TEXT PRIMARY KEY,
+    spec          TEXT NOT NULL,
+    priority      REAL NOT NULL,
+    status        TEXT NOT NULL,
+    worker_id     TEXT,
+    lease_expires REAL,
+    attempts      INTEGER NOT NULL DEFAULT 0,
+    enqueued_at   REAL NOT NULL,
+    not_before    REAL,
+    started_at    REAL,
+    finished_at   REAL,
+    error         TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_queue_idx ON jobs (status, priority DESC);
+
+CREATE TABLE IF NOT EXISTS workers (
+    worker_id    TEXT PRIMARY KEY,
+    host         TEXT,
+    slots        INTEGER NOT NULL,
+    heartbeat_at REAL NOT NULL
+);
+"""
+
+
+class SQLiteBroker(JobBroker):
+    """
+    Job queue in a SQLite database (WAL mode). Every state change is a
+    BEGIN IMMEDIATE transaction, so any number of API and worker processes on
+    the same host can share it. WAL needs shared memory on a local disk: the
+    database must not live on NFS/SMB, and processes on other hosts must not
+    open it (their workers use the "http" broker, through the API). Finished jobs are kept for `retention_seconds` (for
+    the average job time) and then deleted.
+
+    Jobs: queued -> leased -> done / failed. A leased job whose lease expired
+    is leased again as if it were queued.
+    """
+
+    def __init__(self, db_path: Path, worker_ttl: float = 60.0, retention_seconds: float = 86400.0) -> None:
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.worker_ttl = worker_ttl
+        self.retention_seconds = retention_seconds
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(
+            str(self.db_path),
+            timeout=30.0,
+            isolation_level=None,  # explicit transactions only
+            check_same_thread=False,
+        )
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "not_before" not in columns:
+            # queue created before not_before existed
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN not_before REAL")
+
+    def _transaction(self) -> "_Transaction":
+        return _Transaction(self._conn)
+
+    def enqueue(
+        self, job_id: str, spec: Dict[str, Any], priority: float = 0.0, not_before: Optional[float] = None
+    ) -> None:
+        with self._lock, self._transaction():
+            self._conn.execute(
+                "INSERT INTO jobs (job_id, spec, priority, status, enqueued_at, not_before) "
+                "VALUES (?, ?, ?, 'queued', ?, ?)",
+                (job_id, json.dumps(spec, ensure_ascii=False), float(priority), time.time(), not_before),
+            )
+
+    def lease(self, worker_id: str, lease_seconds: float) -> Optional[LeasedJob]:
+        now = time.time()
+        with self._lock, self._transaction():
+            row = self._conn.execute(
+                "SELECT job_id, spec, priority, status, worker_id, attempts FROM jobs "
+                "WHERE (status = 'queued' AND (not_before IS NULL OR not_before <= ?)) "
+                "OR (status = 'leased' AND lease_expires < ?) "
+                "ORDER BY priority DESC, rowid LIMIT 1",
+                (now, now),
+            ).fetchone()
+            if row is None:
+                return None
+            if row["status"] == "leased":
+                logger.warning(
+                    "lease of job %s by worker %s expired, leasing it again to %s",
+                    row["job_id"], row["worker_id"], worker_id,
+                )
+            self._conn.execute(
+                "UPDATE jobs SET status = 'leased', worker_id = ?, lease_expires = ?, attempts = attempts + 1, "
+                "started_at = ? WHERE job_id = ?",
+                (worker_id, now + lease_seconds, now, row["job_id"]),
+            )
+        return LeasedJob(row["job_id"], json.loads(row["spec"]), row["priority"], row["attempts"] + 1)
+
+    def heartbeat(self, job_id: str, worker_id: str, lease_seconds: float) -> bool:
+        with self._lock, self._transaction():
+            cur = self._conn.execute(
+                "UPDATE jobs SET lease_expires = ? WHERE job_id = ? AND worker_id = ? AND status = 'leased'",
+                (time.time() + lease_seconds, job_id, worker_id),
+            )
+            return cur.rowcount == 1
+
+    def complete(self, job_id: str, worker_id: str, error: Optional[str] = None) -> None:
+        now = time.time()
+        with self._lock, self._transaction():
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, lease_expires = NULL, error = ? "
+                "WHERE job_id = ? AND worker_id = ?",
+                ("failed" if error else "done", now, error, job_id, worker_id),
+            )
+            self._conn.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ?",
+                (now - self.retention_seconds,),
+            )
+
+    def release(self, job_id: str, worker_id: str) -> None:
+        with self._lock, self._transaction():
+            self._conn.execute(
+                "UPDATE jobs SET status = 'queued', worker_id = NULL, lease_expires = NULL, "
+                "attempts = MAX(0, attempts - 1) WHERE job_id = ? AND worker_id = ? AND status = 'leased'",
+                (job_id, worker_id),
+            )
+
+    def register_worker(self, worker_id: str, host: str, slots: int) -> None:
+        with self._lock, self._transaction():
+            self._conn.execute(
+                "INSERT OR REPLACE INTO workers (worker_id, host, slots, heartbeat_at) VALUES (?, ?, ?, ?)",
+                (worker_id, host, int(slots), time.time()),
+            )
+
+    def unregister_worker(self, worker_id: str) -> None:
+        with self._lock, self._transaction():
+            self._conn.execute("DELETE FROM workers WHERE worker_id = ?", (worker_id,))
+
+    def position(self, job_id: str) -> Optional[int]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT rowid, priority, status FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+            if row is None or row["status"] != "queued":
+                return None
+            ahead = self._conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND (priority > ? OR (priority = ? AND rowid < ?))",
+                (row["priority"], row["priority"], row["rowid"]),
+            ).fetchone()[0]
+        return 1 + ahead
+
+    def stats(self) -> Dict[str, float]:
+        now = time.time()
+        with self._lock:
+            queued = self._conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'queued' OR (status = 'leased' AND lease_expires < ?)",
+                (now,),
+            ).fetchone()[0]
+            running = self._conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'leased' AND lease_expires >= ?", (now,)
+            ).fetchone()[0]
+            workers, slots = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(slots), 0) FROM workers WHERE heartbeat_at >= ?",
+                (now - self.worker_ttl,),
+            ).fetchone()
+            avg = self._conn.execute(
+                "SELECT AVG(finished_at - started_at) FROM (SELECT finished_at, started_at FROM jobs "
+                "WHERE status = 'done' ORDER BY finished_at DESC LIMIT 20)"
+            ).fetchone()[0]
+        return {
+            "queued": queued,
+            "running": running,
+            "workers": workers,
+            "slots": slots,
+            "avg_job_seconds": round(avg, 1) if avg is not None else None,
+        }
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT/ROLLBACK, serialising writers across processes."""
+
+    def __init__(self, conn: sqlite3.Connection) -> None:
+        self._conn = conn
+
+    def __enter__(self) -> None:
+        self._conn.execute("BEGIN IMMEDIATE")
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        if exc_type is None:
+            self._conn.execute("COMMIT")
+        else:
+            self._conn.execute("ROLLBACK")
+        return False
+
+
+def _http_broker(scheme: str) -> Callable[[str, Path], JobBroker]:
+    def factory(path: str, default_dir: Path) -> JobBroker:
+        # Imported here: iganima.api.remote builds on this module.
+        from iganima.api.remote import ApiClient, HttpBroker
+
+        return HttpBroker(ApiClient(f"{scheme}://{path}"))
+
+    return factory
+
+
+# Broker URL scheme -> factory(path, default_dir). "sqlite" alone uses <default_dir>/jobs.sqlite3;
+# "http(s)://<api host>:<port>" is the queue of that API, for workers on other hosts (iganima.api.remote).
+BROKERS: Dict[str, Callable[[str, Path], JobBroker]] = {
+    "sqlite": lambda path, default_dir: SQLiteBroker(Path(path) if path else Path(default_dir) / "jobs.sqlite3"),
+    "http": _http_broker("http"),
+    "https": _http_broker("https"),
+}
+
+
+def open_broker(url: str, default_dir: Path) -> JobBroker:
+    """
+    Broker for a URL such as ``sqlite``, ``sqlite:////srv/igsismani/jobs.sqlite3``
+    or ``http://api.example:8000``.
+
+    :raises ValueError: for an unknown scheme
+    """
+    scheme, _, rest = url.strip().partition(":")
+    path = rest[2:] if rest.startswith("//") else rest
+    factory = BROKERS.get(scheme.lower())
+    if factory is None:
+        raise ValueError(f"unknown job broker {scheme!r}, expected one of {sorted(BROKERS)}")
+    return factory(path, default_dir)
+
+
+class BrokerScheduler:
+    """
+    JobScheduler interface on top of a JobBroker, for API processes that only
+    queue jobs: submit() stores the spec of the job (runner.QueuedJob) and the
+    worker processes run it. max_concurrent is the number of slots of the
+    live workers.
+    """
+
+    def __init__(self, broker: JobBroker, max_queued: int, default_job_seconds: float = 60.0) -> None:
+        self.broker = broker
+        self.max_queued = max(1, int(max_queued))
+        self.default_job_seconds = float(default_job_seconds)
+
+    def submit(
+        self,
+        job_id: str,
+        fn: Callable[[], None],
+        priority: float = 0.0,
+        not_before: Optional[float] = None,
+    ) -> int:
+        """
+        Queue the spec of fn under job_id. Returns the 1-based queue position.
+        Workers do not lease it before not_before (time.time()).
+
+        :raises TypeError: if fn has no JSON spec (only runner.QueuedJob can run in a worker)
+        :raises QueueFullError: if max_queued jobs are already waiting
+        """
+        spec = getattr(fn, "spec", None)
+        if spec is None:
+            raise TypeError(f"job {job_id} has no spec and cannot be queued in the broker")
+        stats = self.stats()
+        if stats["queued"] >= self.max_queued:
+            raise QueueFullError(
+                f"job queue is full ({self.max_queued} waiting)",
+                retry_after=self._retry_after(stats),
+            )
+        self.broker.enqueue(job_id, spec, priority, not_before=not_before)
+        return self.broker.position(job_id) or 1
+
+    def position(self, job_id: str) -> Optional[int]:
+        return self.broker.position(job_id)
+
+    @property
+    def limit(self) -> int:
+        return int(self.broker.stats()["slots"])
+
+    def stats(self) -> Dict[str, float]:
+        stats = self.broker.stats()
+        return {
+            "queued": stats["queued"],
+            "running": stats["running"],
+            "max_concurrent": stats["slots"],
+            "concurrency_limit": stats["slots"],
+            "max_queued": self.max_queued,
+            "avg_job_seconds": stats["avg_job_seconds"] or self.default_job_seconds,
+            "workers": stats["workers"],
+        }
+
+    def _retry_after(self, stats: Dict[str, float]) -> int:
+        waves = (stats["queued"] + stats["running"]) / max(1, stats["max_concurrent"])
+        return max(1, int(waves * stats["avg_job_seconds"]))
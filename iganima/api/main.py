@@ -8,15 +8,15 @@ from pathlib import Path
 load_dotenv(dotenv_path=Path(__file__).resolve().parents[2] / ".env")
 
 
+import asyncio
 import json
 import os
-import threading
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 
 from fastapi import FastAPI, HTTPException, Query, Request
-from fastapi.responses import FileResponse, HTMLResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, PlainTextResponse, RedirectResponse, StreamingResponse
 from pydantic import BaseModel
 import logging, logging.config
 
@@ -24,7 +24,27 @@ import logging, logging.config
 # NOTE:
 # Place runner.py in the same package/module path as this file expects.
 # If you keep package imports, change this to: from iganima.api.runner import start_video_job
-from iganima.api.runner import start_video_job, normalize_event_id, get_ticket_status_by_id, resolve_ticket_video_path
+from iganima.api.runner import (
+    LocalArtifacts,
+    start_video_job,
+    normalize_event_id,
+    is_newer_revision,
+    revision_fingerprint,
+    get_ticket_status_by_id,
+    resolve_ticket_artifact_path,
+    resolve_ticket_profile_path,
+    resolve_ticket_video_path,
+)
+from iganima.api.scheduler import JobScheduler, QueueFullError, compute_priority
+from iganima.api import metrics
+from iganima.api.admission import AdaptiveConcurrency
+from iganima.api.job_queue import BrokerScheduler, open_broker
+from iganima.api.delivery import OFFLOAD_DEFAULT_HEADERS, offload_response, video_response
+from iganima.api.notifier import TicketNotifier
+from iganima.api.state_store import ACTIVE_STATUSES, StateStore
+from iganima.api.worker_api import worker_router
+from iganima.api.workers import start_fork_server
+from iganima.output_formats import MEDIA_TYPES, OUTPUT_FORMATS, parse_outputs
 
 
     
@@ -46,12 +66,105 @@ TICKETS_DIR = (ARTIFACTS_DIR / "tickets").resolve()
 for d in (ARTIFACTS_DIR, EVENTS_DIR, TICKETS_DIR):
     d.mkdir(parents=True, exist_ok=True)
 
-# Global concurrency guard (protects CPU/RAM/GPU).
+# Ticket and event state (SQLite, WAL). Legacy status.json/state.json files are imported once.
+STATE_DB = Path(os.environ.get("IGSISMANI_STATE_DB", str(ARTIFACTS_DIR / "state.sqlite3"))).resolve()
+_STATE_STORE = StateStore(STATE_DB)
+_STATE_STORE.migrate_json_state(TICKETS_DIR, EVENTS_DIR)
+
+# Push-style status: job threads notify waiting long-poll / SSE requests.
+_TICKET_NOTIFIER = TicketNotifier()
+_STATE_STORE.add_ticket_listener(_TICKET_NOTIFIER.notify)
+LONG_POLL_MAX_SECONDS = 60
+SSE_HEARTBEAT_SECONDS = 15
+STATE_RECHECK_SECONDS = 5
+
+# Global concurrency guard (protects CPU/RAM/GPU): a fixed pool of job threads
+# fed by a bounded priority queue. Requests beyond MAX_QUEUED_JOBS get HTTP 429.
+# The number of threads allowed to run at once may be lowered (see below).
 MAX_CONCURRENT_JOBS = int(os.environ.get("IGSISMANI_MAX_CONCURRENT_JOBS", "1"))
-_JOB_SEMAPHORE = threading.Semaphore(MAX_CONCURRENT_JOBS)
+MAX_QUEUED_JOBS = int(os.environ.get("IGSISMANI_MAX_QUEUED_JOBS", "100"))
+
+# Durable job queue ("sqlite" or "sqlite:////path/jobs.sqlite3"): jobs are only queued here and
+# run by worker processes (run_worker.py), on this or other hosts. Empty: jobs run in this process.
+JOB_BROKER = os.environ.get("IGSISMANI_JOB_BROKER", "").strip()
+# Token of the /internal endpoints (iganima.api.worker_api) through which workers on other
+# hosts reach the queue, the ticket state and the artifacts. Empty: only workers on this host.
+WORKER_TOKEN = os.environ.get("IGSISMANI_WORKER_TOKEN", "").strip()
+if JOB_BROKER:
+    _JOB_SCHEDULER = BrokerScheduler(open_broker(JOB_BROKER, ARTIFACTS_DIR), MAX_QUEUED_JOBS)
+else:
+    _JOB_SCHEDULER = JobScheduler(MAX_CONCURRENT_JOBS, MAX_QUEUED_JOBS)
+
+# Adaptive concurrency ("1" enables it): MAX_CONCURRENT_JOBS becomes the upper bound and
+# the limit follows the idle CPU and MemAvailable of the host, given the cost of past jobs.
+ADAPTIVE_CONCURRENCY = os.environ.get("IGSISMANI_ADAPTIVE_CONCURRENCY", "0").strip().lower() in ("1", "true", "yes")
+_ADMISSION: Optional[AdaptiveConcurrency] = None
+if ADAPTIVE_CONCURRENCY and not JOB_BROKER:
+    _ADMISSION = AdaptiveConcurrency(
+        _JOB_SCHEDULER,
+        min_jobs=int(os.environ.get("IGSISMANI_MIN_CONCURRENT_JOBS", "1")),
+        interval=float(os.environ.get("IGSISMANI_ADMISSION_INTERVAL_SECONDS", "5")),
+        cpu_target=float(os.environ.get("IGSISMANI_ADMISSION_CPU_TARGET", "0.9")),
+        memory_reserve_mb=float(os.environ.get("IGSISMANI_ADMISSION_MEMORY_RESERVE_MB", "1024")),
+    )
+    _ADMISSION.start()
+
+logger.info(
+    "API starting: artifacts_dir=%s events_dir=%s tickets_dir=%s state_db=%s",
+    ARTIFACTS_DIR,
+    EVENTS_DIR,
+    TICKETS_DIR,
+    STATE_DB,
+)
+# Video delivery offload to a front proxy: "" (serve from Python), "nginx" (X-Accel-Redirect)
+# or "sendfile" (X-Sendfile). The header name and nginx internal location are configurable.
+VIDEO_OFFLOAD = os.environ.get("IGSISMANI_VIDEO_OFFLOAD", "").strip().lower()
+VIDEO_OFFLOAD_HEADER = os.environ.get("IGSISMANI_VIDEO_OFFLOAD_HEADER") or None
+VIDEO_OFFLOAD_PREFIX = os.environ.get("IGSISMANI_VIDEO_OFFLOAD_PREFIX", "/protected/")
+if VIDEO_OFFLOAD and VIDEO_OFFLOAD not in OFFLOAD_DEFAULT_HEADERS:
+    raise ValueError(
+        f"IGSISMANI_VIDEO_OFFLOAD must be one of {sorted(OFFLOAD_DEFAULT_HEADERS)} or empty, got {VIDEO_OFFLOAD!r}"
+    )
 
-logger.info("API starting: artifacts_dir=%s events_dir=%s tickets_dir=%s", ARTIFACTS_DIR, EVENTS_DIR, TICKETS_DIR)
-logger.info("API config: max_concurrent_jobs=%s", MAX_CONCURRENT_JOBS)
+# Low-resolution preview + poster rendered ahead of the full video ("0" disables it by default).
+PREVIEW_ENABLED = os.environ.get("IGSISMANI_PREVIEW", "1").strip().lower() not in ("0", "false", "no", "")
+
+# A request for a newer revision of an event (revision, event_status or magnitude changed) supersedes
+# its active ticket instead of being deduplicated ("0" disables it).
+SUPERSEDE_ENABLED = os.environ.get("IGSISMANI_SUPERSEDE", "1").strip().lower() not in ("0", "false", "no", "")
+
+# "forkserver" (default) keeps a pre-warmed process with the pipeline imported; "subprocess" runs run_igsismani.py per job.
+JOB_MODE = os.environ.get("IGSISMANI_JOB_MODE", "forkserver").strip().lower()
+
+logger.info(
+    "API config: max_concurrent_jobs=%s adaptive=%s max_queued_jobs=%s job_broker=%s job_mode=%s video_offload=%s preview=%s",
+    MAX_CONCURRENT_JOBS,
+    ADAPTIVE_CONCURRENCY,
+    MAX_QUEUED_JOBS,
+    JOB_BROKER or "in-process",
+    JOB_MODE,
+    VIDEO_OFFLOAD or "off",
+    PREVIEW_ENABLED,
+)
+
+if JOB_MODE != "subprocess" and not JOB_BROKER:
+    start_fork_server()
+
+if JOB_BROKER:
+    # Jobs run in run_worker.py: admission control and job/stage metrics live there.
+    if ADAPTIVE_CONCURRENCY:
+        logger.warning(
+            "IGSISMANI_ADAPTIVE_CONCURRENCY is ignored by the API in broker mode: set it for each "
+            "run_worker.py, which adapts its own slots to its host"
+        )
+    logger.info(
+        "broker mode: /metrics of the API reports the queue and worker slots; job and stage metrics "
+        "are served by each worker on IGSISMANI_WORKER_METRICS_PORT"
+    )
+    logger.info(
+        "workers on other hosts: %s",
+        "enabled (/internal)" if WORKER_TOKEN else "disabled (set IGSISMANI_WORKER_TOKEN)",
+    )
 
 
 class CreateTicketResponse(BaseModel):
@@ -59,6 +172,7 @@ class CreateTicketResponse(BaseModel):
     status: str
     status_url: str
     deduplicated: bool = False
+    supersedes: Optional[str] = None  # ticket replaced by this one (older revision of the event)
 
 
 class TicketStatus(BaseModel):
@@ -71,10 +185,65 @@ class TicketStatus(BaseModel):
     finished_at: Optional[str] = None
     message: Optional[str] = None
     output_file: Optional[str] = None  # relative path from ARTIFACTS_DIR
+    outputs: Optional[List[str]] = None  # requested formats
+    artifacts: Optional[Dict[str, str]] = None  # format -> relative path from ARTIFACTS_DIR
+    preview_status: Optional[str] = None  # queued / processing / done / error / skipped
+    preview_artifacts: Optional[Dict[str, str]] = None  # low-resolution mp4 + poster jpg
+    preview_message: Optional[str] = None
+    priority: Optional[float] = None
+    queue_position: Optional[int] = None  # 1-based, only while queued
+    render_key: Optional[str] = None  # hash of the render inputs
+    cache_hit: Optional[bool] = None  # True if an existing video with the same render_key was reused
+    stage: Optional[str] = None  # running pipeline stage (event, nearest_city, map, info, composite, encode)
+    progress: Optional[Dict[str, Optional[int]]] = None  # frames_done / frames_total of the running stage
+    timings: Optional[Dict[str, Dict[str, Any]]] = None  # stage -> seconds, RSS (+ per-frame min/avg/max, cached)
+    queue_wait_seconds: Optional[float] = None
+    duration_seconds: Optional[float] = None  # from start to end of the render job
+    rss_peak_mb: Optional[float] = None  # peak resident memory of the render process
+    cpu_profile: Optional[bool] = None  # True if the render runs under cProfile (/tickets/{id}/profile)
+    revision: Optional[Dict[str, Any]] = None  # revision / event_status / magnitude given in the request
+    supersedes: Optional[str] = None  # older ticket of the event replaced by this one
+    superseded_by: Optional[str] = None  # newer ticket that replaced this one (status "superseded")
+
+
+class TicketList(BaseModel):
+    tickets: List[TicketStatus]
+
+
+class EventState(BaseModel):
+    event_id: str
+    status: str
+    active_ticket_id: Optional[str] = None
+    created_at: Optional[str] = None
+    updated_at: Optional[str] = None
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+    last_output_file: Optional[str] = None
+    message: Optional[str] = None
+    tickets: List[TicketStatus] = []
+
+
+def _queue_full_exception(e: QueueFullError) -> HTTPException:
+    logger.warning("job queue full: %s (retry_after=%s)", e, e.retry_after)
+    return HTTPException(
+        status_code=429,
+        detail=str(e),
+        headers={"Retry-After": str(e.retry_after)},
+    )
 
 
 app = FastAPI(title="igsismani ticket service (GET)")
 
+if JOB_BROKER and WORKER_TOKEN:
+    app.include_router(
+        worker_router(
+            _JOB_SCHEDULER.broker,
+            _STATE_STORE,
+            LocalArtifacts(ARTIFACTS_DIR, EVENTS_DIR, TICKETS_DIR, _STATE_STORE),
+            WORKER_TOKEN,
+        )
+    )
+
 
 @app.get("/ui", response_class=HTMLResponse)
 def ui_home():
@@ -101,17 +270,22 @@ def ui_home():
 def ui_create_ticket(request: Request, event_id: str = Query(..., min_length=1)):
     event_id_norm = normalize_event_id(event_id)
 
-    existing = get_ticket_status_by_id(event_id_norm, TICKETS_DIR, EVENTS_DIR)
-    if existing and existing.get("status") in ("pending", "queued", "processing"):
+    existing = get_ticket_status_by_id(event_id_norm, _STATE_STORE)
+    if existing and existing.get("status") in ACTIVE_STATUSES:
         ticket_id = existing["ticket_id"]
     else:
-        ticket_id = start_video_job(
-            event_id=event_id_norm,
-            artifacts_dir=ARTIFACTS_DIR,
-            events_dir=EVENTS_DIR,
-            tickets_dir=TICKETS_DIR,
-            semaphore=_JOB_SEMAPHORE,
-        )
+        try:
+            ticket_id = start_video_job(
+                event_id=event_id_norm,
+                artifacts_dir=ARTIFACTS_DIR,
+                events_dir=EVENTS_DIR,
+                tickets_dir=TICKETS_DIR,
+                store=_STATE_STORE,
+                scheduler=_JOB_SCHEDULER,
+                preview=PREVIEW_ENABLED,
+            )
+        except QueueFullError as e:
+            raise _queue_full_exception(e) from e
 
     view_url = request.url_for("view_ticket", ticket_id=ticket_id)
     return RedirectResponse(url=str(view_url), status_code=302)
@@ -121,20 +295,55 @@ def ui_create_ticket(request: Request, event_id: str = Query(..., min_length=1))
 def create_ticket(
     request: Request,
     event_id: str = Query(..., min_length=1),
+    magnitude: Optional[float] = Query(None, description="Event magnitude, used for queue priority"),
+    event_status: Optional[str] = Query(None, description="Event evaluation status (automatic/manual)"),
+    priority: Optional[float] = Query(None, description="Explicit queue priority (higher runs first)"),
+    outputs: Optional[str] = Query(None, description="Comma separated output formats: mp4 (always), webm, gif, jpg"),
+    preview: Optional[bool] = Query(None, description="Render a fast low-resolution preview first (default: IGSISMANI_PREVIEW)"),
+    cpu_profile: Optional[bool] = Query(None, description="Run the render under cProfile (default: sampled with IGSISMANI_CPU_PROFILE_SAMPLE_RATE)"),
+    revision: Optional[str] = Query(None, description="Event revision, e.g. the origin creationTime (later values are newer)"),
 ) -> CreateTicketResponse:
     """
     Create (or deduplicate) a ticket via GET.
 
+    Jobs are queued by priority: an explicit `priority`, otherwise the
+    magnitude, with reviewed (manual) events ahead at equal magnitude.
+    Returns 429 with Retry-After when the queue is full.
+
+    `outputs` selects extra formats encoded from the same frames (WebM, GIF,
+    poster JPEG); each one is listed under `artifacts` when the ticket is done.
+
+    Unless `preview=false`, a low-resolution preview video and a poster are
+    rendered first at high priority and listed under `preview_artifacts`.
+
+    With `cpu_profile=true` the render is profiled; the profile is served by
+    /tickets/{ticket_id}/profile once the render ends.
+
+    A request for a newer revision of an event than its active ticket (a later
+    `revision`, or a different `event_status` / `magnitude`) supersedes that
+    ticket: its render is cancelled and the new ticket is returned.
+
     Example:
-      GET /tickets?event_id=igepn2016hnmu
+      GET /tickets?event_id=igepn2016hnmu&magnitude=5.2&event_status=manual
+      GET /tickets?event_id=igepn2016hnmu&outputs=mp4,gif,jpg
     """
     logger.info("/tickets requested: event_id=%s", event_id)
+    try:
+        output_formats = parse_outputs(outputs)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
     event_id_norm = normalize_event_id(event_id)
     logger.info("event_id normalized: raw=%s normalized=%s", event_id, event_id_norm)
 
-    # Fast path: if there is already an active ticket for this event, return it (no new job).
-    existing = get_ticket_status_by_id(event_id_norm, TICKETS_DIR, EVENTS_DIR)
-    if existing and existing.get("status") in ("pending", "queued", "processing"):
+    # Fast path: if there is already an active ticket for this event, return it (no new job),
+    # unless the request is about a newer revision of the event.
+    fingerprint = revision_fingerprint(revision=revision, event_status=event_status, magnitude=magnitude)
+    existing = get_ticket_status_by_id(event_id_norm, _STATE_STORE)
+    if (
+        existing
+        and existing.get("status") in ACTIVE_STATUSES
+        and not (SUPERSEDE_ENABLED and is_newer_revision(fingerprint, existing.get("revision")))
+    ):
         status_url = str(request.url_for("get_ticket_status", ticket_id=existing["ticket_id"]))
         logger.info("deduplicated request: event_id=%s ticket_id=%s status=%s", event_id_norm, existing.get("ticket_id"), existing.get("status"))
         return CreateTicketResponse(
@@ -145,56 +354,184 @@ def create_ticket(
         )
 
     # Otherwise, create a new ticket and attempt to start the job.
-    logger.info("creating new ticket: event_id=%s", event_id_norm)
-    ticket_id = start_video_job(
-        event_id=event_id_norm,
-        artifacts_dir=ARTIFACTS_DIR,
-        events_dir=EVENTS_DIR,
-        tickets_dir=TICKETS_DIR,
-        semaphore=_JOB_SEMAPHORE,
-    )
+    job_priority = compute_priority(magnitude=magnitude, event_status=event_status, explicit=priority)
+    logger.info("creating new ticket: event_id=%s priority=%s", event_id_norm, job_priority)
+    try:
+        ticket_id = start_video_job(
+            event_id=event_id_norm,
+            artifacts_dir=ARTIFACTS_DIR,
+            events_dir=EVENTS_DIR,
+            tickets_dir=TICKETS_DIR,
+            store=_STATE_STORE,
+            scheduler=_JOB_SCHEDULER,
+            priority=job_priority,
+            outputs=output_formats,
+            preview=PREVIEW_ENABLED if preview is None else preview,
+            cpu_profile=cpu_profile,
+            revision=fingerprint,
+            supersede=SUPERSEDE_ENABLED,
+        )
+    except QueueFullError as e:
+        raise _queue_full_exception(e) from e
 
     logger.info("ticket created: event_id=%s ticket_id=%s", event_id_norm, ticket_id)
     status_url = str(request.url_for("get_ticket_status", ticket_id=ticket_id))
-    st = get_ticket_status_by_id(event_id_norm, TICKETS_DIR, EVENTS_DIR, ticket_id_hint=ticket_id)
+    st = get_ticket_status_by_id(event_id_norm, _STATE_STORE, ticket_id_hint=ticket_id)
     status = (st or {}).get("status", "queued")
     logger.info("create_ticket response: event_id=%s ticket_id=%s status=%s status_url=%s", event_id_norm, ticket_id, status, status_url)
-    return CreateTicketResponse(ticket_id=ticket_id, status=status, status_url=status_url, deduplicated=False)
+    return CreateTicketResponse(
+        ticket_id=ticket_id,
+        status=status,
+        status_url=status_url,
+        deduplicated=False,
+        supersedes=(st or {}).get("supersedes"),
+    )
 
 
-@app.get("/tickets/{ticket_id}", response_model=TicketStatus, name="get_ticket_status")
-def get_ticket_status(ticket_id: str) -> TicketStatus:
+def _load_ticket(ticket_id: str) -> Dict[str, Any]:
+    data = _STATE_STORE.get_ticket(ticket_id)
+    if data is None:
+        logger.info("ticket not found: %s", ticket_id)
+        raise HTTPException(status_code=404, detail="ticket not found")
+    return data
+
+
+def _with_queue_position(data: Dict[str, Any]) -> Dict[str, Any]:
+    if data.get("status") == "queued":
+        data["queue_position"] = _JOB_SCHEDULER.position(data["ticket_id"])
+    return data
+
+
+@app.get("/tickets/search", response_model=TicketList, name="search_tickets")
+def search_tickets(
+    status: Optional[str] = Query(None, description="Filter by ticket status"),
+    event_id: Optional[str] = Query(None, description="Filter by event id"),
+    limit: int = Query(50, ge=1, le=1000),
+) -> TicketList:
     """
-    Read ticket status by ticket_id.
+    List tickets, most recent first.
+
+    Example:
+      GET /tickets/search?status=processing
+      GET /tickets/search?event_id=igepn2016hnmu&limit=10
+    """
+    event_id_norm = normalize_event_id(event_id) if event_id else None
+    rows = _STATE_STORE.list_tickets(status=status, event_id=event_id_norm, limit=limit)
+    return TicketList(tickets=[TicketStatus(**_with_queue_position(r)) for r in rows])
+
+
+@app.get("/events/{event_id}", response_model=EventState, name="get_event_state")
+def get_event_state(event_id: str) -> EventState:
+    """
+    Read the state of an event and its most recent tickets.
     """
-    logger.info("/tickets/%s requested", ticket_id)
-    p = (TICKETS_DIR / ticket_id / "status.json").resolve()
     try:
-        p.relative_to(TICKETS_DIR)
+        event_id_norm = normalize_event_id(event_id)
     except ValueError as e:
-        logger.warning("invalid ticket_id path traversal attempt: %s", ticket_id)
-        raise HTTPException(status_code=400, detail="invalid ticket_id") from e
+        raise HTTPException(status_code=400, detail=str(e)) from e
 
-    if not p.exists():
-        logger.info("ticket not found: %s", ticket_id)
-        raise HTTPException(status_code=404, detail="ticket not found")
+    data = _STATE_STORE.get_event(event_id_norm)
+    if data is None:
+        raise HTTPException(status_code=404, detail="event not found")
 
-    try:
-        data = json.loads(p.read_text())
-    except json.JSONDecodeError as e:
-        logger.exception("corrupted ticket status.json for ticket_id=%s", ticket_id)
-        raise HTTPException(status_code=500, detail="corrupted ticket status") from e
+    rows = _STATE_STORE.list_tickets(event_id=event_id_norm, limit=20)
+    return EventState(**data, tickets=[TicketStatus(**_with_queue_position(r)) for r in rows])
+
+
+async def _wait_for_ticket_change(ticket_id: str, seen_updated_at: Optional[str], timeout: float) -> Optional[Dict[str, Any]]:
+    """
+    Wait until the ticket differs from the version the caller has seen
+    (updated_at), it reaches a final status, or timeout expires. Returns the
+    current ticket state.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while True:
+        fut = _TICKET_NOTIFIER.subscribe(ticket_id)
+        data = _STATE_STORE.get_ticket(ticket_id)
+        remaining = deadline - loop.time()
+        if (
+            data is None
+            or data.get("updated_at") != seen_updated_at
+            or data.get("status") not in ACTIVE_STATUSES
+            or remaining <= 0
+        ):
+            _TICKET_NOTIFIER.unsubscribe(ticket_id, fut)
+            return data
+        # Re-read periodically: jobs started by another API worker do not notify this process.
+        await _TICKET_NOTIFIER.wait(ticket_id, fut, min(remaining, STATE_RECHECK_SECONDS))
+
+
+@app.get("/tickets/{ticket_id}", response_model=TicketStatus, name="get_ticket_status")
+async def get_ticket_status(
+    ticket_id: str,
+    wait: Optional[float] = Query(None, ge=0, le=LONG_POLL_MAX_SECONDS, description="Long-poll: seconds to wait for a change"),
+    since: Optional[str] = Query(None, description="Long-poll: updated_at already seen by the client"),
+) -> TicketStatus:
+    """
+    Read ticket status by ticket_id.
+
+    With `wait`, the request is held until the ticket changes (relative to
+    `since`, or to its state when the request arrived), it finishes, or
+    `wait` seconds pass.
+
+    Example:
+      GET /tickets/0a1b2c3d4e?wait=30&since=2026-01-01T12:00:00+00:00
+    """
+    logger.info("/tickets/%s requested", ticket_id)
+    data = _load_ticket(ticket_id)
+
+    if wait:
+        seen = since if since is not None else data.get("updated_at")
+        data = await _wait_for_ticket_change(ticket_id, seen, wait) or data
 
     logger.info("ticket status read: ticket_id=%s status=%s", ticket_id, data.get("status"))
 
-    return TicketStatus(**data)
+    return TicketStatus(**_with_queue_position(data))
+
+
+@app.get("/tickets/{ticket_id}/events", name="ticket_events")
+async def ticket_events(ticket_id: str, request: Request):
+    """
+    Server-sent events stream of the ticket status.
+
+    Sends a `status` event with the ticket JSON on every change and closes the
+    stream once the ticket reaches a final status.
+    """
+    _load_ticket(ticket_id)
+
+    async def _stream():
+        last = None
+        data = _STATE_STORE.get_ticket(ticket_id)
+        while data is not None:
+            data = _with_queue_position(data)
+            key = (data.get("updated_at"), data.get("status"), data.get("queue_position"))
+            if key != last:
+                last = key
+                yield f"event: status\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+            else:
+                yield ": keep-alive\n\n"
+            if data.get("status") not in ACTIVE_STATUSES or await request.is_disconnected():
+                return
+            data = await _wait_for_ticket_change(ticket_id, data.get("updated_at"), SSE_HEARTBEAT_SECONDS)
+
+    return StreamingResponse(
+        _stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 
-@app.get("/tickets/{ticket_id}/video")
-def get_ticket_video(ticket_id: str):
+@app.api_route("/tickets/{ticket_id}/video", methods=["GET", "HEAD"])
+def get_ticket_video(ticket_id: str, request: Request):
+    """
+    Download the ticket video. Supports Range requests, ETag / If-None-Match
+    and long-lived caching of the versioned `<event>-<n>.mp4` files.
+    """
     try:
         video_path = resolve_ticket_video_path(
             ticket_id=ticket_id,
-            tickets_dir=TICKETS_DIR,
+            store=_STATE_STORE,
             artifacts_dir=ARTIFACTS_DIR,
         )
     except FileNotFoundError as e:
@@ -205,29 +542,138 @@ def get_ticket_video(ticket_id: str):
         # Not ready / error states
         raise HTTPException(status_code=409, detail=str(e)) from e
 
-    return FileResponse(
-        path=str(video_path),
-        media_type="video/mp4",
-        filename=video_path.name,
-    )
+    if VIDEO_OFFLOAD:
+        return offload_response(
+            video_path,
+            artifacts_dir=ARTIFACTS_DIR,
+            mode=VIDEO_OFFLOAD,
+            header_name=VIDEO_OFFLOAD_HEADER,
+            internal_prefix=VIDEO_OFFLOAD_PREFIX,
+            media_type="video/mp4",
+        )
 
+    return video_response(request, video_path, media_type="video/mp4")
 
-@app.get("/tickets/{ticket_id}/view", response_class=HTMLResponse, name="view_ticket")
-def view_ticket(ticket_id: str):
-    p = (TICKETS_DIR / ticket_id / "status.json").resolve()
 
+@app.api_route("/tickets/{ticket_id}/artifacts/{fmt}", methods=["GET", "HEAD"], name="get_ticket_artifact")
+def get_ticket_artifact(ticket_id: str, fmt: str, request: Request):
+    """
+    Download one output of the ticket (mp4, webm, gif, jpg), with the same
+    Range / ETag / caching behaviour as /tickets/{ticket_id}/video.
+    """
+    fmt = fmt.lower()
+    if fmt not in OUTPUT_FORMATS:
+        raise HTTPException(status_code=404, detail=f"unknown output format: {fmt}")
     try:
-        p.relative_to(TICKETS_DIR)
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail="invalid ticket_id") from e
+        path = resolve_ticket_artifact_path(
+            ticket_id=ticket_id,
+            store=_STATE_STORE,
+            artifacts_dir=ARTIFACTS_DIR,
+            fmt=fmt,
+        )
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e)) from e
+    except PermissionError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e)) from e
+
+    if VIDEO_OFFLOAD:
+        return offload_response(
+            path,
+            artifacts_dir=ARTIFACTS_DIR,
+            mode=VIDEO_OFFLOAD,
+            header_name=VIDEO_OFFLOAD_HEADER,
+            internal_prefix=VIDEO_OFFLOAD_PREFIX,
+            media_type=MEDIA_TYPES[fmt],
+        )
+
+    return video_response(request, path, media_type=MEDIA_TYPES[fmt])
 
-    if not p.exists():
-        raise HTTPException(status_code=404, detail="ticket not found")
 
+@app.api_route("/tickets/{ticket_id}/preview/{fmt}", methods=["GET", "HEAD"], name="get_ticket_preview")
+def get_ticket_preview(ticket_id: str, fmt: str, request: Request):
+    """
+    Download the preview of the ticket: `mp4` (low-resolution video) or `jpg`
+    (poster). Available as soon as preview_status is done, before the full video.
+    """
+    fmt = fmt.lower()
+    if fmt not in OUTPUT_FORMATS:
+        raise HTTPException(status_code=404, detail=f"unknown output format: {fmt}")
     try:
-        data = json.loads(p.read_text())
-    except json.JSONDecodeError as e:
-        raise HTTPException(status_code=500, detail="corrupted ticket status") from e
+        path = resolve_ticket_artifact_path(
+            ticket_id=ticket_id,
+            store=_STATE_STORE,
+            artifacts_dir=ARTIFACTS_DIR,
+            fmt=fmt,
+            preview=True,
+        )
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e)) from e
+    except PermissionError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e)) from e
+
+    if VIDEO_OFFLOAD:
+        return offload_response(
+            path,
+            artifacts_dir=ARTIFACTS_DIR,
+            mode=VIDEO_OFFLOAD,
+            header_name=VIDEO_OFFLOAD_HEADER,
+            internal_prefix=VIDEO_OFFLOAD_PREFIX,
+            media_type=MEDIA_TYPES[fmt],
+        )
+
+    return video_response(request, path, media_type=MEDIA_TYPES[fmt])
+
+
+@app.get("/tickets/{ticket_id}/profile", name="get_ticket_profile")
+def get_ticket_profile(
+    ticket_id: str,
+    request: Request,
+    format: str = Query("pstats", description="pstats (cProfile statistics) or collapsed (flamegraph stacks)"),
+):
+    """
+    Download the CPU profile of a ticket created with `cpu_profile=true` (or
+    sampled). `pstats` opens with `python -m pstats` or snakeviz; `collapsed`
+    feeds flamegraph.pl, speedscope or inferno.
+
+    Example:
+      GET /tickets/0a1b2c3d4e/profile?format=collapsed
+    """
+    try:
+        path = resolve_ticket_profile_path(
+            ticket_id=ticket_id,
+            store=_STATE_STORE,
+            tickets_dir=TICKETS_DIR,
+            fmt=format,
+        )
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e)) from e
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e)) from e
+
+    media_type = "text/plain; charset=utf-8" if format == "collapsed" else "application/octet-stream"
+    return video_response(request, path, media_type=media_type)
+
+
+@app.get("/metrics", response_class=PlainTextResponse, name="metrics")
+def get_metrics() -> PlainTextResponse:
+    """
+    Prometheus metrics of this API process: queue wait, job and stage
+    durations, job results, running/queued jobs, the concurrency limit (and
+    its reason when adaptive) and cache hit ratios.
+    """
+    return PlainTextResponse(
+        metrics.render_metrics(_JOB_SCHEDULER.stats(), _ADMISSION.state() if _ADMISSION else None),
+        media_type=metrics.CONTENT_TYPE,
+    )
+
+
+@app.get("/tickets/{ticket_id}/view", response_class=HTMLResponse, name="view_ticket")
+def view_ticket(ticket_id: str):
+    data = _load_ticket(ticket_id)
 
     status = data.get("status")
     event_id = data.get("event_id")
@@ -235,13 +681,36 @@ def view_ticket(ticket_id: str):
     started_at = data.get("started_at")
     finished_at = data.get("finished_at")
     message = data.get("message")
+    preview_status = data.get("preview_status")
+    preview_artifacts = data.get("preview_artifacts") or {}
 
     status_url = f"/tickets/{ticket_id}"
     video_url = f"/tickets/{ticket_id}/video"
+    events_url = f"/tickets/{ticket_id}/events"
 
+    # Reload the page when the status stream reports a different status.
     auto_refresh = ""
-    if status in ("queued", "processing"):
-        auto_refresh = '<meta http-equiv="refresh" content="5">'
+    if status in ACTIVE_STATUSES:
+        auto_refresh = f"""
+        <noscript><meta http-equiv="refresh" content="5"></noscript>
+        <script>
+            var source = new EventSource("{events_url}");
+            source.addEventListener("status", function (e) {{
+                var data = JSON.parse(e.data);
+                if (data.status !== "{status}" || data.preview_status !== {json.dumps(preview_status)}) {{
+                    source.close();
+                    window.location.reload();
+                }} else if (data.queue_position) {{
+                    var el = document.getElementById("queue-position");
+                    if (el) {{ el.textContent = data.queue_position; }}
+                }} else if (data.stage) {{
+                    var el = document.getElementById("stage");
+                    var p = data.progress;
+                    if (el) {{ el.textContent = data.stage + (p && p.frames_total ? " (" + p.frames_done + "/" + p.frames_total + ")" : ""); }}
+                }}
+            }});
+        </script>
+        """
 
     html = f"""
     <html>
@@ -266,12 +735,38 @@ def view_ticket(ticket_id: str):
 
     if status == "done":
         html += f'<p><a href="{video_url}">Descargar video</a></p>'
+        for fmt in data.get("artifacts") or {}:
+            if fmt != "mp4":
+                html += f'<p><a href="/tickets/{ticket_id}/artifacts/{fmt}">Descargar {fmt}</a></p>'
     elif status == "queued":
-        html += "<p>El ticket está en cola.</p>"
+        position = _JOB_SCHEDULER.position(ticket_id)
+        if position:
+            html += f'<p>El ticket está en cola (posición <span id="queue-position">{position}</span>).</p>'
+        else:
+            html += "<p>El ticket está en cola.</p>"
     elif status == "processing":
         html += "<p>El video se está generando. Esta página se actualizará automáticamente.</p>"
+        html += f'<p><b>Etapa:</b> <span id="stage">{data.get("stage") or "-"}</span></p>'
+
+    if status in ACTIVE_STATUSES and preview_status == "done":
+        html += "<h3>Vista previa</h3>"
+        if "jpg" in preview_artifacts:
+            html += f'<p><img src="/tickets/{ticket_id}/preview/jpg" style="max-width:360px"></p>'
+        if "mp4" in preview_artifacts:
+            html += f'<p><a href="/tickets/{ticket_id}/preview/mp4">Descargar vista previa</a></p>'
+    elif status in ACTIVE_STATUSES and preview_status in ("queued", "processing"):
+        html += "<p>Generando vista previa...</p>"
     elif status == "error":
         html += f"<p><b>Error:</b> {message}</p>"
+    elif status == "superseded":
+        superseded_by = data.get("superseded_by")
+        if superseded_by:
+            html += (
+                "<p>Este ticket fue reemplazado por una revisión más reciente del evento: "
+                f'<a href="/tickets/{superseded_by}/view">ticket {superseded_by}</a>.</p>'
+            )
+        else:
+            html += "<p>Este ticket fue reemplazado por una revisión más reciente del evento.</p>"
 
     html += """
     </body>
@@ -0,0 +1,246 @@
+from __future__ import annotations
+
+import math
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from iganima.api.admission import REASONS as ADMISSION_REASONS
+
+# Minimal Prometheus text exposition (format 0.0.4): counters and histograms
+# kept in memory by the API process, rendered by GET /metrics.
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{_escape(extra[1])}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> _LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[_LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Iterable[float] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(float(b) for b in buckets)) + (math.inf,)
+        # label values -> (bucket counts, sum, count)
+        self._values: Dict[_LabelValues, Tuple[List[int], float, int]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts, total, n = self._values.get(key) or ([0] * len(self.buckets), 0.0, 0)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value, n + 1)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, (list(c), s, n)) for k, (c, s, n) in self._values.items())
+        lines = []
+        for key, (counts, total, n) in items:
+            for bound, count in zip(self.buckets, counts):
+                labels = _format_labels(self.labelnames, key, ("le", _format_value(bound)))
+                lines.append(f"{self.name}_bucket{labels} {count}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {n}")
+        return lines
+
+
+def gauge_lines(name: str, documentation: str, samples: Dict[_LabelValues, float], labelnames: Sequence[str] = ()) -> List[str]:
+    """Lines of a gauge whose values are read at scrape time."""
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} gauge"]
+    for key, value in sorted(samples.items()):
+        lines.append(f"{name}{_format_labels(labelnames, key)} {_format_value(value)}")
+    return lines
+
+
+# Jobs are labelled by kind: "full" (the ticket video) or "preview".
+JOB_QUEUE_WAIT = Histogram(
+    "igsismani_job_queue_wait_seconds",
+    "Seconds a render job waited in the queue before starting.",
+    ("kind",),
+    buckets=(0.5, 1, 5, 10, 30, 60, 120, 300, 600, 1800),
+)
+JOB_DURATION = Histogram(
+    "igsismani_job_duration_seconds",
+    "Seconds from the start of a render job to its end (RNF1: under 60 s).",
+    ("kind", "result"),
+    buckets=(5, 10, 20, 30, 45, 60, 90, 120, 300, 600),
+)
+STAGE_DURATION = Histogram(
+    "igsismani_stage_duration_seconds",
+    "Seconds spent in each pipeline stage.",
+    ("kind", "stage"),
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60),
+)
+JOB_RSS_PEAK = Histogram(
+    "igsismani_job_rss_peak_megabytes",
+    "Peak resident memory of a render job process, in MB.",
+    ("kind",),
+    buckets=(256, 512, 768, 1024, 1536, 2048, 3072, 4096, 6144, 8192),
+)
+STAGE_RSS_PEAK = Histogram(
+    "igsismani_stage_rss_peak_megabytes",
+    "Peak resident memory of the render process during each pipeline stage, in MB.",
+    ("kind", "stage"),
+    buckets=(256, 512, 768, 1024, 1536, 2048, 3072, 4096, 6144, 8192),
+)
+JOBS = Counter(
+    "igsismani_jobs_total",
+    "Render jobs by result (done, error, memory_limit, rejected, superseded).",
+    ("kind", "result"),
+)
+CACHE_LOOKUPS = Counter(
+    "igsismani_cache_lookups_total",
+    "Render cache and stage cache (map, info) lookups by result (hit, miss).",
+    ("cache", "result"),
+)
+
+REGISTRY: List[_Metric] = [
+    JOB_QUEUE_WAIT, JOB_DURATION, STAGE_DURATION, JOB_RSS_PEAK, STAGE_RSS_PEAK, JOBS, CACHE_LOOKUPS,
+]
+
+CACHES = ("render", "map", "info")
+
+
+def observe_job(
+    kind: str,
+    result: str,
+    duration_s: float,
+    timings: Optional[Dict[str, Dict[str, float]]] = None,
+    cache_hit: Optional[bool] = None,
+    rss_peak_mb: Optional[float] = None,
+) -> None:
+    """
+    Record a finished render job.
+
+    :param timings: per-stage timings and memory of the job (``stages`` of iganima.progress.JobProgress)
+    :param cache_hit: render cache result, None if the job did not get that far
+    :param rss_peak_mb: peak RSS of the job process
+    """
+    JOBS.inc(kind=kind, result=result)
+    JOB_DURATION.observe(duration_s, kind=kind, result=result)
+    if rss_peak_mb:
+        JOB_RSS_PEAK.observe(rss_peak_mb, kind=kind)
+    if cache_hit is not None:
+        CACHE_LOOKUPS.inc(cache="render", result="hit" if cache_hit else "miss")
+    for stage, values in (timings or {}).items():
+        if "seconds" in values:
+            STAGE_DURATION.observe(values["seconds"], kind=kind, stage=stage)
+        if values.get("rss_peak_mb"):
+            STAGE_RSS_PEAK.observe(values["rss_peak_mb"], kind=kind, stage=stage)
+        if stage in CACHES:
+            CACHE_LOOKUPS.inc(cache=stage, result="hit" if values.get("cached") else "miss")
+
+
+def render_metrics(
+    scheduler_stats: Optional[Dict[str, float]] = None,
+    admission_state: Optional[Dict[str, Any]] = None,
+) -> str:
+    """
+    Text exposition of every metric, plus the scheduler gauges, the adaptive
+    concurrency state (iganima.api.admission, when enabled) and the cache hit ratios.
+    """
+    lines: List[str] = []
+    for metric in REGISTRY:
+        lines += metric.render()
+
+    if scheduler_stats:
+        for key, doc in (
+            ("running", "Render jobs running now."),
+            ("queued", "Render jobs waiting in the queue."),
+            ("max_concurrent", "Maximum concurrent render jobs."),
+            ("concurrency_limit", "Render jobs allowed to run at once now (max_concurrent unless adaptive)."),
+            ("max_queued", "Maximum queued render jobs."),
+        ):
+            lines += gauge_lines(f"igsismani_jobs_{key}", doc, {(): float(scheduler_stats[key])})
+
+    if admission_state:
+        lines += gauge_lines(
+            "igsismani_jobs_concurrency_limit_reason",
+            "Constraint that set the current concurrency limit (1 for the active reason).",
+            {(r,): float(r == admission_state["reason"]) for r in ADMISSION_REASONS},
+            ("reason",),
+        )
+        for key, name, doc in (
+            ("cpu_busy", "igsismani_host_cpu_busy_ratio", "Fraction of the host CPU in use at the last admission tick."),
+            ("memory_available_mb", "igsismani_host_memory_available_megabytes", "MemAvailable of the host at the last admission tick."),
+            ("job_rss_mb", "igsismani_job_cost_rss_megabytes", "Expected peak RSS of a render job (moving average)."),
+            ("job_cores", "igsismani_job_cost_cpu_cores", "Expected CPU cores used by a render job (moving average)."),
+        ):
+            if admission_state.get(key) is not None:
+                lines += gauge_lines(name, doc, {(): float(admission_state[key])})
+
+    ratios = {}
+    for cache in CACHES:
+        hits = CACHE_LOOKUPS.value(cache=cache, result="hit")
+        total = hits + CACHE_LOOKUPS.value(cache=cache, result="miss")
+        if total:
+            ratios[(cache,)] = hits / total
+    lines += gauge_lines(
+        "igsismani_cache_hit_ratio",
+        "Fraction of cache lookups that were hits since the API started.",
+        ratios,
+        ("cache",),
+    )
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+from typing import Dict, List, Tuple
+
+
+class TicketNotifier:
+    """
+    Wakes up async waiters when a ticket changes.
+
+    notify() is called from job threads; waiters live on the API event loop,
+    so wake-ups are delivered with call_soon_threadsafe. Changes made by
+    another API process are not seen here, so waiters should also re-read
+    the state after a timeout.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._waiters: Dict[str, List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]]] = {}
+
+    def subscribe(self, ticket_id: str) -> asyncio.Future:
+        """
+        Register interest in the next change of ticket_id.
+
+        Subscribe before reading the current state, so a change that happens in
+        between is not missed.
+        """
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        with self._lock:
+            self._waiters.setdefault(ticket_id, []).append((loop, fut))
+        return fut
+
+    def unsubscribe(self, ticket_id: str, fut: asyncio.Future) -> None:
+        with self._lock:
+            waiters = self._waiters.get(ticket_id)
+            if not waiters:
+                return
+            waiters[:] = [(lp, f) for lp, f in waiters if f is not fut]
+            if not waiters:
+                del self._waiters[ticket_id]
+
+    def notify(self, ticket_id: str) -> None:
+        with self._lock:
+            waiters = self._waiters.pop(ticket_id, [])
+        for loop, fut in waiters:
+            loop.call_soon_threadsafe(_resolve, fut)
+
+    async def wait(self, ticket_id: str, fut: asyncio.Future, timeout: float) -> bool:
+        """Wait for fut (from subscribe). Returns False on timeout."""
+        try:
+            await asyncio.wait_for(fut, timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self.unsubscribe(ticket_id, fut)
+
+
+def _resolve(fut: asyncio.Future) -> None:
+    if not fut.done():
+        fut.set_result(None)
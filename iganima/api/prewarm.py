@@ -0,0 +1,23 @@
+"""
+Preload module for the job fork-server.
+
+Importing this module pulls in the scientific stack used by the pipeline and
+reads the default iganima config, so that every job forked from the server
+inherits them already loaded.
+"""
+from __future__ import annotations
+
+import logging
+import os
+
+from iganima import video_pipeline
+
+video_pipeline.configure_manim()
+
+_config_env = os.environ.get("IGSISMANI_DEFAULT_IGANIMA_CONFIG")
+if _config_env:
+    try:
+        video_pipeline.load_run_parameters(os.path.realpath(os.path.expanduser(_config_env)))
+    except Exception as e:
+        # The job itself will report the error with the ticket.
+        logging.getLogger(__name__).warning("could not preload iganima config: %s", e)
@@ -0,0 +1,238 @@
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import requests
+
+from iganima.api.job_queue import JobBroker, LeasedJob
+from iganima.api.runner import ArtifactStore, index_render
+from iganima.api.state_store import TicketStore
+from iganima.output_formats import OUTPUT_FORMATS
+
+logger = logging.getLogger(__name__)
+
+# Worker processes on hosts other than the API's: the job queue, the ticket
+# state and the artifact handoff go through the /internal endpoints of the API
+# (iganima.api.worker_api), which owns the SQLite databases and the artifacts
+# directory. Selected with IGSISMANI_JOB_BROKER / IGSISMANI_STATE_URL =
+# http(s)://<api host>:<port> in run_worker.py (see job_queue.BROKERS and
+# fleet.STATE_BACKENDS).
+
+
+class ApiClient:
+    """
+    JSON calls to the /internal endpoints of the API, authenticated with the
+    worker token (IGSISMANI_WORKER_TOKEN unless given). Connection errors and
+    5xx answers are retried `retries` times.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        token: Optional[str] = None,
+        timeout: float = 30.0,
+        upload_timeout: float = 600.0,
+        retries: int = 3,
+    ) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.token = token if token is not None else os.environ.get("IGSISMANI_WORKER_TOKEN", "")
+        self.timeout = float(timeout)
+        self.upload_timeout = float(upload_timeout)
+        self.retries = max(1, int(retries))
+        self._local = threading.local()
+
+    def _session(self) -> requests.Session:
+        # One session (and keep-alive connection) per thread: worker slots call concurrently.
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            if self.token:
+                session.headers["Authorization"] = f"Bearer {self.token}"
+            self._local.session = session
+        return session
+
+    def call(
+        self,
+        method: str,
+        path: str,
+        body: Optional[Dict[str, Any]] = None,
+        missing_ok: bool = False,
+        retry: bool = True,
+    ) -> Any:
+        """
+        JSON answer of `method /internal<path>`; None for a 404 if missing_ok.
+        Calls that must not run twice (lease, publish) pass retry=False.
+
+        :raises requests.HTTPError: for any other error answer
+        """
+        url = f"{self.base_url}/internal{path}"
+        attempts = self.retries if retry else 1
+        for attempt in range(1, attempts + 1):
+            try:
+                r = self._session().request(method, url, json=body, timeout=self.timeout)
+                if r.status_code < 500 or attempt == attempts:
+                    break
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == attempts:
+                    raise
+            time.sleep(attempt)
+        if missing_ok and r.status_code == 404:
+            return None
+        r.raise_for_status()
+        return r.json() if r.content else None
+
+    def upload(self, path: str, file: Path) -> None:
+        """Stream file as the body of `PUT /internal<path>` (not retried: the caller's job fails instead)."""
+        with file.open("rb") as f:
+            r = self._session().put(f"{self.base_url}/internal{path}", data=f, timeout=self.upload_timeout)
+        r.raise_for_status()
+
+
+class HttpBroker(JobBroker):
+    """The job queue of the API (its JobBroker), reached over HTTP."""
+
+    def __init__(self, client: ApiClient) -> None:
+        self.client = client
+
+    def enqueue(
+        self, job_id: str, spec: Dict[str, Any], priority: float = 0.0, not_before: Optional[float] = None
+    ) -> None:
+        body = {"job_id": job_id, "spec": spec, "priority": priority, "not_before": not_before}
+        self.client.call("POST", "/jobs", body)
+
+    def lease(self, worker_id: str, lease_seconds: float) -> Optional[LeasedJob]:
+        body = {"worker_id": worker_id, "lease_seconds": lease_seconds}
+        job = self.client.call("POST", "/jobs/lease", body, retry=False)
+        if not job:
+            return None
+        return LeasedJob(job["job_id"], job["spec"], job["priority"], job["attempts"])
+
+    def heartbeat(self, job_id: str, worker_id: str, lease_seconds: float) -> bool:
+        body = {"worker_id": worker_id, "lease_seconds": lease_seconds}
+        return bool(self.client.call("POST", f"/jobs/{job_id}/heartbeat", body)["held"])
+
+    def complete(self, job_id: str, worker_id: str, error: Optional[str] = None) -> None:
+        self.client.call("POST", f"/jobs/{job_id}/complete", {"worker_id": worker_id, "error": error})
+
+    def release(self, job_id: str, worker_id: str) -> None:
+        self.client.call("POST", f"/jobs/{job_id}/release", {"worker_id": worker_id})
+
+    def register_worker(self, worker_id: str, host: str, slots: int) -> None:
+        self.client.call("PUT", f"/workers/{worker_id}", {"host": host, "slots": slots})
+
+    def unregister_worker(self, worker_id: str) -> None:
+        self.client.call("DELETE", f"/workers/{worker_id}")
+
+    def position(self, job_id: str) -> Optional[int]:
+        return self.client.call("GET", f"/jobs/{job_id}/position")["position"]
+
+    def stats(self) -> Dict[str, float]:
+        return self.client.call("GET", "/jobs/stats")
+
+
+class HttpStateStore(TicketStore):
+    """The ticket and event state of the API (its StateStore), reached over HTTP."""
+
+    def __init__(self, client: ApiClient) -> None:
+        self.client = client
+
+    def get_ticket(self, ticket_id: str) -> Optional[Dict[str, Any]]:
+        return self.client.call("GET", f"/tickets/{ticket_id}", missing_ok=True)
+
+    def update_ticket(self, ticket_id: str, **updates: Any) -> Dict[str, Any]:
+        ticket = self.client.call("PATCH", f"/tickets/{ticket_id}", {"updates": updates}, missing_ok=True)
+        if ticket is None:
+            raise KeyError(f"ticket '{ticket_id}' not found")
+        return ticket
+
+    def get_event(self, event_id: str) -> Optional[Dict[str, Any]]:
+        return self.client.call("GET", f"/events/{event_id}", missing_ok=True)
+
+    def update_event(self, event_id: str, initial: Dict[str, Any], **updates: Any) -> Dict[str, Any]:
+        return self.client.call("PATCH", f"/events/{event_id}", {"initial": initial, "updates": updates})
+
+    def release_event(self, event_id: str, ticket_id: str, **event_updates: Any) -> None:
+        self.client.call("POST", f"/events/{event_id}/release", {"ticket_id": ticket_id, "updates": event_updates})
+
+    def get_render(self, render_key: str) -> Optional[str]:
+        render = self.client.call("GET", f"/renders/{render_key}", missing_ok=True)
+        return render["output_file"] if render else None
+
+    def put_render(self, render_key: str, event_id: str, output_file: str, created_at: str) -> None:
+        body = {"event_id": event_id, "output_file": output_file, "created_at": created_at}
+        self.client.call("PUT", f"/renders/{render_key}", body)
+
+
+class HttpArtifacts(ArtifactStore):
+    """
+    Jobs work in a directory of the worker host (artifacts_dir, with its own
+    ticket directories and stage / render caches) and upload their outputs
+    to the API, which publishes them in its artifacts directory.
+
+    A render cache hit on this host is first published by render key alone,
+    from the copy the API indexed when it published that render; only if the
+    API has no such copy are the files uploaded.
+    """
+
+    def __init__(self, client: ApiClient, artifacts_dir: Path) -> None:
+        self.client = client
+        self.artifacts_dir = Path(artifacts_dir).resolve()
+        self.events_dir = self.artifacts_dir / "events"
+        self.tickets_dir = self.artifacts_dir / "tickets"
+
+    def publish_render(
+        self, ticket_id: str, event_id: str, outputs: Dict[str, Path], render_key: Optional[str], cache_hit: bool
+    ) -> Tuple[Dict[str, str], Optional[int]]:
+        result = self._publish(ticket_id, "full", event_id, outputs, render_key, cache_hit)
+        return result["artifacts"], result["version"]
+
+    def publish_preview(
+        self, ticket_id: str, event_id: str, outputs: Dict[str, Path], render_key: Optional[str], cache_hit: bool
+    ) -> Dict[str, str]:
+        return self._publish(ticket_id, "preview", event_id, outputs, render_key, cache_hit)["artifacts"]
+
+    def publish_ticket_file(self, ticket_id: str, path: Path) -> None:
+        self.client.upload(f"/tickets/{ticket_id}/files/{path.name}", path)
+
+    def _publish(
+        self,
+        ticket_id: str,
+        kind: str,
+        event_id: str,
+        outputs: Dict[str, Path],
+        render_key: Optional[str],
+        cache_hit: bool,
+    ) -> Dict[str, Any]:
+        body = {"kind": kind, "event_id": event_id, "render_key": render_key}
+        if cache_hit and render_key:
+            result = self.client.call(
+                "POST",
+                f"/tickets/{ticket_id}/publish",
+                dict(body, cache_hit=True, outputs={fmt: None for fmt in outputs}),
+                missing_ok=True,
+                retry=False,
+            )
+            if result is not None:
+                return result
+            logger.info("render %s is not on the API host, uploading it", render_key)
+
+        names = {}
+        for fmt, src in outputs.items():
+            names[fmt] = f"{kind}{OUTPUT_FORMATS[fmt]}"
+            self.client.upload(f"/tickets/{ticket_id}/files/{names[fmt]}", src)
+        result = self.client.call(
+            "POST", f"/tickets/{ticket_id}/publish", dict(body, cache_hit=False, outputs=names), retry=False
+        )
+        if not cache_hit:
+            for src in outputs.values():
+                # Keep the render in the cache of this host (renders/<key>.<ext>), as LocalArtifacts does.
+                if render_key:
+                    index_render(src, self.artifacts_dir / "renders", render_key)
+                src.unlink(missing_ok=True)
+        return result
+
@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import json
 import os
+import random
 import re
 import secrets
 import shutil
@@ -10,9 +11,33 @@ import threading
 import time
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Optional, Sequence, Tuple
 import logging
 
+from iganima.api import metrics
+from iganima.api.admission import JOB_COST
+from iganima.api.job_queue import BrokerScheduler
+from iganima.api.scheduler import JobScheduler, QueueFullError
+from iganima.api.state_store import ACTIVE_STATUSES, StateStore, TicketStore
+from iganima.api.workers import run_job_in_worker
+from iganima.output_formats import OUTPUT_FORMATS, parse_outputs
+from iganima.profiling import PROFILE_FILES
+from iganima.progress import JobCancelled, read_progress
+
+
+# Tie-break: a preview runs ahead of the full renders of the same priority,
+# never ahead of a bigger (or reviewed) event. Magnitudes come with one
+# decimal and reviewed events get +0.5, so the boost stays below 0.1.
+PREVIEW_PRIORITY_BOOST = 0.05
+
+# How often the job's progress file is copied into the ticket.
+PROGRESS_POLL_SECONDS = 1.0
+
+# Written into the ticket directory (with the id of the newer ticket) when a newer
+# revision of the event supersedes the ticket; the render stops at its next stage boundary.
+CANCEL_FILE = "cancel"
+
+
 def utc_now_iso() -> str:
     return datetime.now(timezone.utc).isoformat()
 
@@ -33,17 +58,6 @@ def normalize_event_id(event_id: str) -> str:
     return safe[:64]
 
 
-def _atomic_write_json(path: Path, data: Dict[str, Any]) -> None:
-    path.parent.mkdir(parents=True, exist_ok=True)
-    tmp = path.with_suffix(path.suffix + ".tmp")
-    tmp.write_text(json.dumps(data, indent=2, ensure_ascii=False))
-    tmp.replace(path)
-
-
-def _read_json(path: Path) -> Dict[str, Any]:
-    return json.loads(path.read_text())
-
-
 def _new_ticket_id() -> str:
     # 10 chars hex (40 bits): short and easy to handle.
     return secrets.token_hex(5)
@@ -70,49 +84,10 @@ def _event_dir(events_dir: Path, event_id: str) -> Path:
     return (events_dir / event_id).resolve()
 
 
-def _event_lock_path(events_dir: Path, event_id: str) -> Path:
-    return _event_dir(events_dir, event_id) / "event.lock"
-
-
-def _event_state_path(events_dir: Path, event_id: str) -> Path:
-    return _event_dir(events_dir, event_id) / "state.json"
-
-
 def _ticket_dir(tickets_dir: Path, ticket_id: str) -> Path:
     return (tickets_dir / ticket_id).resolve()
 
 
-def _ticket_status_path(tickets_dir: Path, ticket_id: str) -> Path:
-    return _ticket_dir(tickets_dir, ticket_id) / "status.json"
-
-
-def _acquire_event_lock(events_dir: Path, event_id: str) -> bool:
-    ed = _event_dir(events_dir, event_id)
-    ed.mkdir(parents=True, exist_ok=True)
-    lock_path = _event_lock_path(events_dir, event_id)
-
-    flags = os.O_CREAT | os.O_EXCL | os.O_WRONLY
-    try:
-        fd = os.open(str(lock_path), flags, 0o644)
-    except FileExistsError:
-        return False
-
-    try:
-        payload = {"event_id": event_id, "created_at": utc_now_iso()}
-        os.write(fd, json.dumps(payload).encode("utf-8"))
-    finally:
-        os.close(fd)
-    return True
-
-
-def _release_event_lock(events_dir: Path, event_id: str) -> None:
-    lock_path = _event_lock_path(events_dir, event_id)
-    try:
-        lock_path.unlink(missing_ok=True)
-    except Exception:
-        pass
-
-
 def _init_event_state(event_id: str) -> Dict[str, Any]:
     now = utc_now_iso()
     return {
@@ -124,19 +99,23 @@ def _init_event_state(event_id: str) -> Dict[str, Any]:
         "started_at": None,
         "finished_at": None,
         "last_output_file": None,
+        "last_version": None,
         "message": None,
     }
 
 
-def _set_event_state(events_dir: Path, event_id: str, **updates: Any) -> None:
-    sp = _event_state_path(events_dir, event_id)
-    current = _read_json(sp) if sp.exists() else _init_event_state(event_id)
-    current.update(updates)
-    current["updated_at"] = utc_now_iso()
-    _atomic_write_json(sp, current)
+def _set_event_state(store: TicketStore, event_id: str, **updates: Any) -> None:
+    store.update_event(event_id, _init_event_state(event_id), **updates, updated_at=utc_now_iso())
 
 
-def _init_ticket_status(ticket_id: str, event_id: str) -> Dict[str, Any]:
+def _init_ticket_status(
+    ticket_id: str,
+    event_id: str,
+    priority: float = 0.0,
+    outputs: Sequence[str] = ("mp4",),
+    cpu_profile: bool = False,
+    revision: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
     now = utc_now_iso()
     return {
         "ticket_id": ticket_id,
@@ -148,88 +127,841 @@ def _init_ticket_status(ticket_id: str, event_id: str) -> Dict[str, Any]:
         "finished_at": None,
         "message": None,
         "output_file": None,
+        "outputs": list(outputs),
+        "artifacts": None,
+        "preview_status": None,
+        "preview_artifacts": None,
+        "priority": priority,
+        "stage": None,
+        "progress": None,
+        "timings": None,
+        "queue_wait_seconds": None,
+        "duration_seconds": None,
+        "rss_peak_mb": None,
+        "cpu_profile": cpu_profile,
+        "revision": revision,
+        "supersedes": None,
+        "superseded_by": None,
+    }
+
+
+def _set_ticket_status(store: TicketStore, ticket_id: str, **updates: Any) -> None:
+    store.update_ticket(ticket_id, **updates, updated_at=utc_now_iso())
+
+
+def _progress_fields(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Ticket fields for the state written by iganima.progress.JobProgress."""
+    stage = data.get("stage")
+    return {
+        "stage": stage,
+        "progress": {"frames_done": data.get("frames_done"), "frames_total": data.get("frames_total")} if stage else None,
+        "timings": data.get("stages"),
+        "rss_peak_mb": data.get("rss_peak_mb"),
     }
 
 
-def _set_ticket_status(tickets_dir: Path, ticket_id: str, **updates: Any) -> None:
-    sp = _ticket_status_path(tickets_dir, ticket_id)
-    current = _read_json(sp) if sp.exists() else {}
-    current.update(updates)
-    current["updated_at"] = utc_now_iso()
-    _atomic_write_json(sp, current)
+def _watch_progress(
+    progress_path: Path, store: TicketStore, ticket_id: str, stop: threading.Event, cancel_path: Optional[Path] = None
+) -> None:
+    """
+    Copy the job's progress file into the ticket whenever it changes, until
+    stop is set. With cancel_path, a superseded_by seen in the ticket is
+    written there for the render (see _cancel_requested).
+    """
+    last_mtime = None
+    while not stop.wait(PROGRESS_POLL_SECONDS):
+        try:
+            mtime = progress_path.stat().st_mtime_ns
+        except OSError:
+            continue
+        if mtime == last_mtime:
+            continue
+        last_mtime = mtime
+        data = read_progress(progress_path)
+        if not data:
+            continue
+        try:
+            ticket = store.update_ticket(ticket_id, **_progress_fields(data), updated_at=utc_now_iso())
+            if cancel_path is not None:
+                _cancel_requested(store, ticket_id, cancel_path, ticket)
+        except Exception as e:
+            # e.g. the API is briefly unreachable from a remote worker: the next change retries.
+            logging.warning(f"could not update the progress of ticket {ticket_id}: {e}")
+            last_mtime = None
+
+
+def _run_watched_job(progress_path: Path, store: TicketStore, ticket_id: str, **job_args: Any) -> Dict[str, Any]:
+    """
+    _run_job with live progress in the ticket. Returns the last state of the
+    progress file (empty if the job wrote none).
+    """
+    progress_path.unlink(missing_ok=True)
+    stop = threading.Event()
+    watcher = threading.Thread(
+        target=_watch_progress,
+        args=(progress_path, store, ticket_id, stop, job_args.get("cancel_path")),
+        name=f"igsismani-progress-{ticket_id}",
+        daemon=True,
+    )
+    watcher.start()
+    try:
+        _run_job(progress_path=progress_path, **job_args)
+    finally:
+        stop.set()
+        watcher.join()
+    return read_progress(progress_path) or {}
 
 
-def _next_output_path(events_dir: Path, event_id: str) -> Path:
+def _scan_last_version(events_dir: Path, event_id: str) -> int:
+    """Highest <event_id>-<n>.mp4 already published (used once per event, for state without last_version)."""
     ed = _event_dir(events_dir, event_id)
-    ed.mkdir(parents=True, exist_ok=True)
+    if not ed.exists():
+        return 0
     pat = re.compile(rf"^{re.escape(event_id)}-(\d+)\.mp4$")
 
     max_n = 0
     for p in ed.iterdir():
-        if not p.is_file():
-            continue
         m = pat.match(p.name)
-        if not m:
-            continue
-        try:
-            n = int(m.group(1))
-        except ValueError:
-            continue
-        max_n = max(max_n, n)
+        if m:
+            max_n = max(max_n, int(m.group(1)))
+    return max_n
+
+
+def _read_manifest(manifest_path: Path) -> Dict[str, Any]:
+    if not manifest_path.exists():
+        raise FileNotFoundError(
+            "Video process finished but wrote no manifest. See stdout/stderr logs."
+        )
+    manifest = json.loads(manifest_path.read_text())
+    output = manifest.get("output_file")
+    if not output or not Path(output).is_file():
+        raise FileNotFoundError(f"Manifest points to a missing MP4: {output}")
+    return manifest
 
-    return ed / f"{event_id}-{max_n + 1}.mp4"
 
+def _publish_output(src: Path, events_dir: Path, event_id: str, last_version: int) -> Tuple[Path, int]:
+    """
+    Publish src as events/<event_id>/<event_id>-<n>.mp4 without copying.
+
+    The file is hard-linked under the next free version number (os.link never
+    overwrites, so concurrent publishers cannot clobber each other) and then
+    removed from the ticket directory. If hard links are not possible (e.g.
+    different filesystems), fall back to copy + atomic rename.
+    """
+    ed = _event_dir(events_dir, event_id)
+    ed.mkdir(parents=True, exist_ok=True)
 
-def _find_newest_mp4(root: Path, started_epoch: float) -> Optional[Path]:
-    newest: Optional[Path] = None
-    newest_mtime = 0.0
-    threshold = max(0.0, started_epoch - 2.0)
-    for p in root.rglob("*.mp4"):
+    n = last_version + 1
+    while True:
+        dst = ed / f"{event_id}-{n}.mp4"
         try:
-            mtime = p.stat().st_mtime
+            os.link(src, dst)
+            break
+        except FileExistsError:
+            n += 1
         except OSError:
-            continue
-        if mtime < threshold:
-            continue
-        if newest is None or mtime > newest_mtime:
-            newest = p
-            newest_mtime = mtime
-    return newest
+            if dst.exists():
+                n += 1
+                continue
+            tmp_out = dst.with_suffix(".mp4.tmp")
+            shutil.copy2(src, tmp_out)
+            tmp_out.replace(dst)
+            break
+
+    src.unlink(missing_ok=True)
+    return dst, n
+
+
+def _publish_artifact(src: Path, dst: Path) -> Path:
+    """
+    Move an extra output of a render next to its published video.
+
+    dst carries the version number already reserved by _publish_output, so a
+    plain link (or copy + rename) is enough.
+    """
+    try:
+        os.link(src, dst)
+    except FileExistsError:
+        pass
+    except OSError:
+        tmp = dst.with_name(dst.name + ".tmp")
+        shutil.copy2(src, tmp)
+        tmp.replace(dst)
+    src.unlink(missing_ok=True)
+    return dst
+
+
+def index_render(output_path: Path, renders_dir: Path, key: str) -> None:
+    """Hard-link a published output as renders/<key>.<ext> (no copy; the first render of a key wins)."""
+    renders_dir.mkdir(parents=True, exist_ok=True)
+    target = renders_dir / f"{key}{output_path.suffix}"
+    try:
+        os.link(output_path, target)
+    except FileExistsError:
+        pass
+    except OSError:
+        tmp = target.with_name(target.name + ".tmp")
+        shutil.copy2(output_path, tmp)
+        tmp.replace(target)
+
+
+def _cached_render_output(store: TicketStore, key: Optional[str], cached_path: Path, artifacts_dir: Path) -> str:
+    """
+    Artifact path (relative to artifacts_dir) for a render cache hit: the
+    versioned video recorded for the key, or the renders/<key>.mp4 entry itself.
+    """
+    rel = store.get_render(key) if key else None
+    if rel and (artifacts_dir / rel).is_file():
+        return rel
+    return str(cached_path.resolve().relative_to(artifacts_dir))
+
+
+class ArtifactStore:
+    """
+    Where a render job works and how its outputs are handed off to the API.
+
+    artifacts_dir, events_dir and tickets_dir are the working directories of
+    the job on this host (ticket directory, stage and render caches).
+    LocalArtifacts publishes in place, in the artifacts directory of the API;
+    iganima.api.remote.HttpArtifacts uploads the outputs of a worker on
+    another host to the API, which publishes them with LocalArtifacts.
+    """
+
+    artifacts_dir: Path
+    events_dir: Path
+    tickets_dir: Path
+
+    def publish_render(
+        self, ticket_id: str, event_id: str, outputs: Dict[str, Path], render_key: Optional[str], cache_hit: bool
+    ) -> Tuple[Dict[str, str], Optional[int]]:
+        """
+        Publish the outputs (format -> file) of a full render as the next
+        version of the event. Returns format -> path relative to the artifacts
+        directory of the API, and the version published (None for a cache hit,
+        which reuses the video already published for render_key).
+        """
+        raise NotImplementedError
+
+    def publish_preview(
+        self, ticket_id: str, event_id: str, outputs: Dict[str, Path], render_key: Optional[str], cache_hit: bool
+    ) -> Dict[str, str]:
+        """Publish the outputs of a preview render; returns format -> path relative to the artifacts directory."""
+        raise NotImplementedError
+
+    def publish_ticket_file(self, ticket_id: str, path: Path) -> None:
+        """Make a file of the ticket directory (e.g. the CPU profile) available to the API under the same name."""
+        raise NotImplementedError
+
+
+class LocalArtifacts(ArtifactStore):
+    """Outputs published by hard links in the artifacts directory shared with the API (same host)."""
+
+    def __init__(self, artifacts_dir: Path, events_dir: Path, tickets_dir: Path, store: TicketStore) -> None:
+        self.artifacts_dir = Path(artifacts_dir).resolve()
+        self.events_dir = Path(events_dir).resolve()
+        self.tickets_dir = Path(tickets_dir).resolve()
+        self.store = store
+
+    def publish_render(
+        self, ticket_id: str, event_id: str, outputs: Dict[str, Path], render_key: Optional[str], cache_hit: bool
+    ) -> Tuple[Dict[str, str], Optional[int]]:
+        extra_outputs = {fmt: path for fmt, path in outputs.items() if fmt != "mp4"}
+        if cache_hit:
+            # Same render inputs as a previous video: reuse it.
+            rel_output = _cached_render_output(self.store, render_key, outputs["mp4"], self.artifacts_dir)
+            artifacts = {
+                fmt: str(path.resolve().relative_to(self.artifacts_dir)) for fmt, path in extra_outputs.items()
+            }
+            return {"mp4": rel_output, **artifacts}, None
+
+        # Publish while the event is still claimed by this ticket.
+        renders_dir = self.artifacts_dir / "renders"
+        state = self.store.get_event(event_id) or {}
+        last_version = state.get("last_version")
+        if last_version is None:
+            last_version = _scan_last_version(self.events_dir, event_id)
+        output_path, version = _publish_output(outputs["mp4"], self.events_dir, event_id, last_version)
+        rel_output = str(output_path.relative_to(self.artifacts_dir))
+        artifacts = {}
+        for fmt, src in extra_outputs.items():
+            dst = output_path.with_name(f"{event_id}-{version}{OUTPUT_FORMATS[fmt]}")
+            artifacts[fmt] = str(_publish_artifact(src, dst).relative_to(self.artifacts_dir))
+        if render_key:
+            index_render(output_path, renders_dir, render_key)
+            for rel in artifacts.values():
+                index_render(self.artifacts_dir / rel, renders_dir, render_key)
+            self.store.put_render(render_key, event_id, rel_output, utc_now_iso())
+        return {"mp4": rel_output, **artifacts}, version
+
+    def publish_preview(
+        self, ticket_id: str, event_id: str, outputs: Dict[str, Path], render_key: Optional[str], cache_hit: bool
+    ) -> Dict[str, str]:
+        pdir = _ticket_dir(self.tickets_dir, ticket_id) / "preview"
+        pdir.mkdir(parents=True, exist_ok=True)
+        artifacts = {}
+        for fmt, src in outputs.items():
+            if not cache_hit:
+                src = _publish_artifact(src, pdir / f"{event_id}-preview{OUTPUT_FORMATS[fmt]}")
+                if render_key:
+                    index_render(src, self.artifacts_dir / "renders", render_key)
+            artifacts[fmt] = str(src.resolve().relative_to(self.artifacts_dir))
+        return artifacts
+
+    def publish_ticket_file(self, ticket_id: str, path: Path) -> None:
+        # Already in the ticket directory the API reads.
+        pass
+
+
+def _job_mode() -> str:
+    """
+    How jobs are executed:
+      - "forkserver" (default): fork from a pre-warmed server that already imported the pipeline.
+      - "subprocess": spawn a fresh `python run_igsismani.py` per job.
+    """
+    return os.environ.get("IGSISMANI_JOB_MODE", "forkserver").strip().lower()
+
+
+def _run_job_subprocess(
+    *,
+    script: Path,
+    repo_root: Path,
+    config_path: Path,
+    event_id: str,
+    frames_dir: Path,
+    output_dir: Path,
+    manifest_path: Path,
+    render_cache_dir: Optional[Path],
+    stage_cache_dir: Optional[Path],
+    outputs: Optional[Sequence[str]],
+    stdout_path: Path,
+    stderr_path: Path,
+    timeout_s: int,
+    profile: str = "full",
+    progress_path: Optional[Path] = None,
+    cpu_profile_dir: Optional[Path] = None,
+    memory_limit_mb: Optional[float] = None,
+    trace_memory: bool = False,
+    cancel_path: Optional[Path] = None,
+) -> None:
+    cmd = [
+        "python",
+        str(script),
+        "--iganima_config",
+        str(config_path),
+        "--event_id",
+        str(event_id),
+        "--frames_dir",
+        str(frames_dir),
+        "--output_dir",
+        str(output_dir),
+        "--manifest",
+        str(manifest_path),
+    ]
+    if render_cache_dir:
+        cmd += ["--render_cache_dir", str(render_cache_dir)]
+    if stage_cache_dir:
+        cmd += ["--stage_cache_dir", str(stage_cache_dir)]
+    if outputs:
+        cmd += ["--outputs", ",".join(outputs)]
+    if profile != "full":
+        cmd += ["--profile", profile]
+    if progress_path:
+        cmd += ["--progress", str(progress_path)]
+    if cpu_profile_dir:
+        cmd += ["--cpu_profile_dir", str(cpu_profile_dir)]
+    if memory_limit_mb:
+        cmd += ["--memory_limit_mb", str(memory_limit_mb)]
+    if trace_memory:
+        cmd += ["--trace_memory"]
+    if cancel_path:
+        cmd += ["--cancel_file", str(cancel_path)]
+    with stdout_path.open("w", encoding="utf-8") as out, stderr_path.open("w", encoding="utf-8") as err:
+        proc = subprocess.Popen(
+            cmd,
+            cwd=str(repo_root),
+            stdout=out,
+            stderr=err,
+            env=os.environ.copy(),
+        )
+        try:
+            rc = proc.wait(timeout=timeout_s)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            raise TimeoutError(f"Video job timed out after {timeout_s} seconds")
+
+    if rc != 0:
+        raise RuntimeError(f"Video process exited with code {rc}. See stdout/stderr logs.")
+
+
+def _cpu_profile_sampled() -> bool:
+    """
+    Whether a ticket that did not ask for it is profiled anyway: a fraction
+    IGSISMANI_CPU_PROFILE_SAMPLE_RATE (0..1, default 0) of the tickets is.
+    """
+    try:
+        rate = float(os.environ.get("IGSISMANI_CPU_PROFILE_SAMPLE_RATE", "0"))
+    except ValueError:
+        logging.warning("invalid IGSISMANI_CPU_PROFILE_SAMPLE_RATE, profiling disabled")
+        return False
+    return rate > 0 and random.random() < rate
+
+
+def _job_memory_limit_mb() -> Optional[float]:
+    """Per-job RSS ceiling from IGSISMANI_JOB_MEMORY_LIMIT_MB (unset or 0: no limit)."""
+    value = os.environ.get("IGSISMANI_JOB_MEMORY_LIMIT_MB", "").strip()
+    if not value:
+        return None
+    try:
+        limit = float(value)
+    except ValueError:
+        logging.warning(f"invalid IGSISMANI_JOB_MEMORY_LIMIT_MB: {value!r}, no memory limit")
+        return None
+    return limit if limit > 0 else None
+
+
+def _job_config_path() -> Path:
+    config_env = os.environ.get("IGSISMANI_DEFAULT_IGANIMA_CONFIG")
+    if not config_env:
+        raise RuntimeError(
+            "Missing env var IGSISMANI_DEFAULT_IGANIMA_CONFIG "
+            "(path to the iganima config ini for run_igsismani.py)."
+        )
+    config_path = Path(config_env).expanduser().resolve()
+    if not config_path.exists():
+        logging.error(f"IGSISMANI_DEFAULT_IGANIMA_CONFIG not found: {config_path}")
+        raise FileNotFoundError(f"IGSISMANI_DEFAULT_IGANIMA_CONFIG not found: {config_path}")
+    return config_path
+
+
+def _run_job(**job_args: Any) -> None:
+    """
+    Run one render with the configured job mode (see _job_mode). job_args are
+    the ticket paths of run_job_in_worker / _run_job_subprocess; the config
+    path and timeout come from the environment.
+    """
+    repo_root = _repo_root()
+    script = (repo_root / "run_igsismani.py").resolve()
+    if not script.exists():
+        logging.error(f"run_igsismani.py not found under repo root: {repo_root}")
+        raise FileNotFoundError(f"run_igsismani.py not found under repo root: {repo_root}")
+
+    job_args["config_path"] = _job_config_path()
+    job_args["timeout_s"] = int(os.environ.get("IGSISMANI_JOB_TIMEOUT_SECONDS", "7200"))
+    job_args["memory_limit_mb"] = _job_memory_limit_mb()
+    job_args["trace_memory"] = os.environ.get("IGSISMANI_TRACEMALLOC", "0").strip().lower() in ("1", "true", "yes")
+    if _job_mode() == "subprocess":
+        _run_job_subprocess(script=script, repo_root=repo_root, **job_args)
+    else:
+        run_job_in_worker(cwd=repo_root, **job_args)
+
+
+def _supersede_debounce_seconds() -> float:
+    """Seconds a superseding render waits for a still newer revision (IGSISMANI_SUPERSEDE_DEBOUNCE_SECONDS)."""
+    try:
+        return max(0.0, float(os.environ.get("IGSISMANI_SUPERSEDE_DEBOUNCE_SECONDS", "10")))
+    except ValueError:
+        return 10.0
+
+
+def revision_fingerprint(
+    revision: Optional[str] = None,
+    event_status: Optional[str] = None,
+    magnitude: Optional[float] = None,
+) -> Optional[Dict[str, Any]]:
+    """What a ticket request says about the revision of the event; None if it says nothing."""
+    fingerprint: Dict[str, Any] = {}
+    if revision and revision.strip():
+        fingerprint["revision"] = revision.strip()
+    if event_status and event_status.strip():
+        fingerprint["event_status"] = event_status.strip().lower()
+    if magnitude is not None:
+        fingerprint["magnitude"] = round(float(magnitude), 2)
+    return fingerprint or None
+
+
+def is_newer_revision(new: Optional[Dict[str, Any]], old: Optional[Dict[str, Any]]) -> bool:
+    """
+    True if the request fingerprint `new` describes a later revision of the
+    event than `old` (the one of the active ticket). With an explicit revision
+    on both sides (e.g. the origin creation time in ISO 8601) the later one
+    wins; otherwise any change of status or magnitude counts, as requests
+    arrive in order. Without both fingerprints nothing can be told: False.
+    """
+    if not new or not old:
+        return False
+    if "revision" in new and "revision" in old:
+        return new["revision"] > old["revision"]
+    return any(key in old and new[key] != old[key] for key in new if key != "revision")
+
+
+def _cancel_superseded(store: StateStore, tickets_dir: Path, ticket_id: str, newer_ticket_id: str) -> None:
+    """Ask the render of ticket_id to stop: it ends as superseded at its next stage boundary (or before starting)."""
+    tdir = _ticket_dir(tickets_dir, ticket_id)
+    tdir.mkdir(parents=True, exist_ok=True)
+    (tdir / CANCEL_FILE).write_text(newer_ticket_id, encoding="utf-8")
+    _set_ticket_status(store, ticket_id, superseded_by=newer_ticket_id)
+    logging.info(f"ticket {ticket_id} superseded by {newer_ticket_id}")
+
+
+def _cancel_requested(
+    store: TicketStore, ticket_id: str, cancel_path: Path, ticket: Optional[Dict[str, Any]] = None
+) -> bool:
+    """
+    True if the ticket was superseded. The cancel file written by the API is
+    only in its own ticket directory: a superseded_by found in the ticket
+    (ticket, or read from the store) is written to cancel_path, where the
+    render of this host looks for it.
+    """
+    if cancel_path.exists():
+        return True
+    if ticket is None:
+        ticket = store.get_ticket(ticket_id) or {}
+    newer = ticket.get("superseded_by")
+    if not newer:
+        return False
+    cancel_path.parent.mkdir(parents=True, exist_ok=True)
+    cancel_path.write_text(newer, encoding="utf-8")
+    return True
+
+
+def _finish_superseded(
+    store: TicketStore,
+    ticket_id: str,
+    cancel_path: Path,
+    started: Optional[float] = None,
+    progress: Optional[Dict[str, Any]] = None,
+) -> None:
+    """Close a ticket whose render was cancelled (or never started) because a newer revision superseded it."""
+    try:
+        newer = cancel_path.read_text(encoding="utf-8").strip() or None
+    except OSError:
+        newer = None
+    progress = progress or {}
+    updates: Dict[str, Any] = {}
+    if started is None:
+        metrics.JOBS.inc(kind="full", result="superseded")
+    else:
+        duration = round(time.monotonic() - started, 3)
+        metrics.observe_job("full", "superseded", duration, progress.get("stages"),
+                            rss_peak_mb=progress.get("rss_peak_mb"))
+        updates = dict(duration_seconds=duration, timings=progress.get("stages"), rss_peak_mb=progress.get("rss_peak_mb"))
+    _set_ticket_status(
+        store,
+        ticket_id,
+        status="superseded",
+        finished_at=utc_now_iso(),
+        message=f"superseded by ticket {newer}" if newer else "superseded by a newer revision",
+        superseded_by=newer,
+        progress=None,
+        **updates,
+    )
 
 
 def get_ticket_status_by_id(
     event_id: str,
-    tickets_dir: Path,
-    events_dir: Path,
+    store: StateStore,
     ticket_id_hint: Optional[str] = None,
 ) -> Optional[Dict[str, Any]]:
     if ticket_id_hint:
-        sp = _ticket_status_path(tickets_dir, ticket_id_hint)
-        if sp.exists():
-            try:
-                return _read_json(sp)
-            except Exception:
-                return None
-        return None
+        return store.get_ticket(ticket_id_hint)
 
-    stp = _event_state_path(events_dir, event_id)
-    if not stp.exists():
-        return None
-    try:
-        state = _read_json(stp)
-    except Exception:
+    state = store.get_event(event_id)
+    if not state:
         return None
 
     tid = state.get("active_ticket_id")
     if not tid:
         return None
-    sp = _ticket_status_path(tickets_dir, tid)
-    if not sp.exists():
-        return None
+    return store.get_ticket(tid)
+
+
+def _run_full_job(
+    store: TicketStore,
+    *,
+    ticket_id: str,
+    event_id: str,
+    artifacts: ArtifactStore,
+    outputs: Sequence[str],
+    cpu_profile: bool,
+    queued_at: float,
+) -> None:
+    """
+    Full render of a ticket: run the pipeline, publish the outputs under the
+    event directory (through artifacts), record the result in the ticket and
+    release the event.
+
+    A superseded ticket (see CANCEL_FILE) ends as "superseded" without
+    publishing anything; if it was superseded while queued, it never starts.
+    """
+    tdir = _ticket_dir(artifacts.tickets_dir, ticket_id)
+    tdir.mkdir(parents=True, exist_ok=True)
+    cancel_path = tdir / CANCEL_FILE
+    if _cancel_requested(store, ticket_id, cancel_path):
+        _finish_superseded(store, ticket_id, cancel_path)
+        return
+    print("####start worker")
+    logging.info("###Start WORKER ")
+    started = time.monotonic()
+    # queued_at is wall-clock time: the job may have been queued by another process or host.
+    queue_wait = round(max(0.0, time.time() - queued_at), 3)
+    metrics.JOB_QUEUE_WAIT.observe(queue_wait, kind="full")
+    _set_ticket_status(
+        store, ticket_id, status="processing", started_at=utc_now_iso(), message=None,
+        queue_wait_seconds=queue_wait,
+    )
+    _set_event_state(store, event_id, status="processing", started_at=utc_now_iso(), message=None)
+
+    stdout_path = tdir / "stdout.log"
+    stderr_path = tdir / "stderr.log"
+    # Ticket-private working paths: concurrent jobs never share frames or outputs.
+    work_dir = tdir / "work"
+    manifest_path = tdir / "manifest.json"
+    # Content-addressed index of finished renders: renders/<render_key>.mp4
+    renders_dir = artifacts.artifacts_dir / "renders"
+    # Per-event stage outputs (map / info frames), reused when an event is revised.
+    stage_cache_dir = _event_dir(artifacts.events_dir, event_id) / "stages"
+    # Running stage, frames done and per-stage timings, written by the job.
+    progress_path = tdir / "progress.json"
+
     try:
-        return _read_json(sp)
-    except Exception:
-        return None
+        logging.info("###Start video creation ")
+        progress = _run_watched_job(
+            progress_path,
+            store,
+            ticket_id,
+            event_id=event_id,
+            frames_dir=work_dir / "frames",
+            output_dir=work_dir / "output",
+            manifest_path=manifest_path,
+            render_cache_dir=renders_dir,
+            stage_cache_dir=stage_cache_dir,
+            outputs=outputs,
+            stdout_path=stdout_path,
+            stderr_path=stderr_path,
+            # profile.pstats / profile.collapsed.txt next to stdout.log
+            cpu_profile_dir=tdir if cpu_profile else None,
+            cancel_path=cancel_path,
+        )
+        if _cancel_requested(store, ticket_id, cancel_path):
+            raise JobCancelled("superseded before its outputs were published")
+
+        manifest = _read_manifest(manifest_path)
+        key = manifest.get("render_key")
+        job_outputs = {fmt: Path(path) for fmt, path in (manifest.get("outputs") or {}).items()}
+        job_outputs["mp4"] = Path(manifest["output_file"])
+        published, version = artifacts.publish_render(
+            ticket_id, event_id, job_outputs, key, bool(manifest.get("cache_hit"))
+        )
+        rel_output = published["mp4"]
+        event_updates: Dict[str, Any] = {}
+        if version is not None:
+            event_updates["last_version"] = version
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+        timings = progress.get("stages") or manifest.get("timings")
+        rss_peak = progress.get("rss_peak_mb") or manifest.get("rss_peak_mb")
+        duration = round(time.monotonic() - started, 3)
+        metrics.observe_job("full", "done", duration, timings, cache_hit=bool(manifest.get("cache_hit")),
+                            rss_peak_mb=rss_peak)
+        JOB_COST.observe(rss_peak, progress.get("cpu_seconds"), duration)
+        _set_ticket_status(
+            store,
+            ticket_id,
+            status="done",
+            finished_at=utc_now_iso(),
+            message=None,
+            output_file=rel_output,
+            artifacts=published,
+            render_key=key,
+            cache_hit=bool(manifest.get("cache_hit")),
+            stage=None,
+            progress=None,
+            timings=timings,
+            duration_seconds=duration,
+            rss_peak_mb=rss_peak,
+        )
+        _set_event_state(
+            store,
+            event_id,
+            status="done",
+            finished_at=utc_now_iso(),
+            last_output_file=rel_output,
+            message=None,
+            **event_updates,
+        )
+
+    except Exception as e:
+        progress = read_progress(progress_path) or {}
+        if _cancel_requested(store, ticket_id, cancel_path):
+            shutil.rmtree(work_dir, ignore_errors=True)
+            _finish_superseded(store, ticket_id, cancel_path, started=started, progress=progress)
+            return
+        # stage is left as the stage that failed
+        duration = round(time.monotonic() - started, 3)
+        result = "memory_limit" if progress.get("memory_limit_exceeded") else "error"
+        metrics.observe_job("full", result, duration, progress.get("stages"),
+                            rss_peak_mb=progress.get("rss_peak_mb"))
+        JOB_COST.observe(progress.get("rss_peak_mb"), progress.get("cpu_seconds"), duration)
+        if result == "memory_limit":
+            e = RuntimeError(progress.get("error") or str(e))
+        _set_ticket_status(
+            store,
+            ticket_id,
+            status="error",
+            finished_at=utc_now_iso(),
+            message=str(e),
+            progress=None,
+            timings=progress.get("stages"),
+            duration_seconds=duration,
+            rss_peak_mb=progress.get("rss_peak_mb"),
+        )
+        _set_event_state(
+            store,
+            event_id,
+            status="error",
+            finished_at=utc_now_iso(),
+            message=str(e),
+        )
+    finally:
+        if cpu_profile:
+            _publish_profile(artifacts, ticket_id, tdir)
+        store.release_event(event_id, ticket_id, updated_at=utc_now_iso())
+
+
+def _publish_profile(artifacts: ArtifactStore, ticket_id: str, tdir: Path) -> None:
+    """Hand the CPU profile of the ticket (see PROFILE_FILES) to the API; a failure only loses the profile."""
+    for name in PROFILE_FILES.values():
+        path = tdir / name
+        if not path.is_file():
+            continue
+        try:
+            artifacts.publish_ticket_file(ticket_id, path)
+        except Exception as e:
+            logging.warning(f"could not publish {name} of ticket {ticket_id}: {e}")
+
+
+def _run_preview_job(
+    store: TicketStore,
+    *,
+    ticket_id: str,
+    event_id: str,
+    artifacts: ArtifactStore,
+    queued_at: float,
+) -> None:
+    """
+    Preview render of a ticket (low resolution, poster); skipped if the full
+    render has already finished or the ticket was superseded.
+    """
+    tdir = _ticket_dir(artifacts.tickets_dir, ticket_id)
+    cancel_path = tdir / CANCEL_FILE
+    current = store.get_ticket(ticket_id) or {}
+    if _cancel_requested(store, ticket_id, cancel_path, current) or current.get("status") not in ACTIVE_STATUSES:
+        # The full render already finished (or failed): nothing to preview.
+        _set_ticket_status(store, ticket_id, preview_status="skipped")
+        return
+    _set_ticket_status(store, ticket_id, preview_status="processing")
+    started = time.monotonic()
+    metrics.JOB_QUEUE_WAIT.observe(max(0.0, time.time() - queued_at), kind="preview")
+
+    pdir = tdir / "preview"
+    work_dir = pdir / "work"
+    manifest_path = pdir / "manifest.json"
+    renders_dir = artifacts.artifacts_dir / "renders"
+    try:
+        pdir.mkdir(parents=True, exist_ok=True)
+        _run_job(
+            event_id=event_id,
+            frames_dir=work_dir / "frames",
+            output_dir=work_dir / "output",
+            manifest_path=manifest_path,
+            render_cache_dir=renders_dir,
+            # own directory: the full render keeps its map/info frames
+            stage_cache_dir=_event_dir(artifacts.events_dir, event_id) / "stages" / "preview",
+            outputs=None,
+            profile="preview",
+            stdout_path=pdir / "stdout.log",
+            stderr_path=pdir / "stderr.log",
+            progress_path=pdir / "progress.json",
+            cancel_path=cancel_path,
+        )
+        manifest = _read_manifest(manifest_path)
+        preview_artifacts = artifacts.publish_preview(
+            ticket_id,
+            event_id,
+            {fmt: Path(src) for fmt, src in (manifest.get("outputs") or {}).items()},
+            manifest.get("render_key"),
+            bool(manifest.get("cache_hit")),
+        )
+        shutil.rmtree(work_dir, ignore_errors=True)
+        metrics.observe_job("preview", "done", time.monotonic() - started, manifest.get("timings"),
+                            cache_hit=bool(manifest.get("cache_hit")), rss_peak_mb=manifest.get("rss_peak_mb"))
+        _set_ticket_status(store, ticket_id, preview_status="done", preview_artifacts=preview_artifacts)
+    except Exception as e:
+        if _cancel_requested(store, ticket_id, cancel_path):
+            shutil.rmtree(work_dir, ignore_errors=True)
+            _set_ticket_status(store, ticket_id, preview_status="skipped", preview_message="superseded")
+            return
+        logging.warning(f"preview of ticket {ticket_id} failed: {e}")
+        progress = read_progress(pdir / "progress.json") or {}
+        metrics.observe_job("preview", "memory_limit" if progress.get("memory_limit_exceeded") else "error",
+                            time.monotonic() - started, progress.get("stages"),
+                            rss_peak_mb=progress.get("rss_peak_mb"))
+        _set_ticket_status(store, ticket_id, preview_status="error", preview_message=str(e))
+
+
+def run_job_spec(spec: Dict[str, Any], store: TicketStore, artifacts: Optional[ArtifactStore] = None) -> None:
+    """
+    Run a queued job from its spec (see start_video_job): the ticket, the
+    event, the artifact directories and the render options, all JSON values.
+    Used in the API process and by worker processes (iganima.api.fleet).
+
+    Without artifacts, the job works and publishes in the artifact
+    directories of the spec (LocalArtifacts, same host as the API).
+    """
+    if artifacts is None:
+        artifacts = LocalArtifacts(
+            Path(spec["artifacts_dir"]), Path(spec["events_dir"]), Path(spec["tickets_dir"]), store
+        )
+    kwargs = dict(
+        ticket_id=spec["ticket_id"],
+        event_id=spec["event_id"],
+        artifacts=artifacts,
+        queued_at=float(spec.get("queued_at") or time.time()),
+    )
+    if spec.get("kind") == "preview":
+        _run_preview_job(store, **kwargs)
+    else:
+        _run_full_job(
+            store, outputs=spec.get("outputs") or ["mp4"], cpu_profile=bool(spec.get("cpu_profile")), **kwargs
+        )
+
+
+def abandon_job_spec(spec: Dict[str, Any], store: TicketStore, message: str) -> None:
+    """Fail the ticket of a queued job that will not run again, and release its event."""
+    ticket_id, event_id = spec["ticket_id"], spec["event_id"]
+    if spec.get("kind") == "preview":
+        metrics.JOBS.inc(kind="preview", result="error")
+        _set_ticket_status(store, ticket_id, preview_status="error", preview_message=message)
+        return
+    metrics.JOBS.inc(kind="full", result="error")
+    _set_ticket_status(store, ticket_id, status="error", finished_at=utc_now_iso(), message=message, progress=None)
+    _set_event_state(store, event_id, status="error", finished_at=utc_now_iso(), message=message)
+    store.release_event(event_id, ticket_id, updated_at=utc_now_iso())
+
+
+class QueuedJob:
+    """
+    A job as submitted to the scheduler: calling it runs the spec in this
+    process. A durable broker (iganima.api.job_queue) keeps only the spec, and
+    the worker that leases it runs it with its own store.
+    """
+
+    def __init__(self, spec: Dict[str, Any], store: StateStore) -> None:
+        self.spec = spec
+        self.store = store
+
+    def __call__(self) -> None:
+        run_job_spec(self.spec, self.store)
 
 
 def start_video_job(
@@ -238,177 +970,182 @@ def start_video_job(
     artifacts_dir: Path,
     events_dir: Path,
     tickets_dir: Path,
-    semaphore: threading.Semaphore,
+    store: StateStore,
+    scheduler: JobScheduler | BrokerScheduler,
+    priority: float = 0.0,
+    outputs: Optional[Sequence[str]] = None,
+    preview: bool = False,
+    cpu_profile: Optional[bool] = None,
+    revision: Optional[Dict[str, Any]] = None,
+    supersede: bool = False,
 ) -> str:
+    """
+    Claim event_id and queue its render; returns the ticket id (the active
+    ticket of the event if there is one).
+
+    revision is the fingerprint of the event revision the request is about
+    (see revision_fingerprint). With supersede, a request for a newer revision
+    than the active ticket's replaces it: the old render is cancelled at its
+    next stage boundary and ends as "superseded", and the new one waits
+    IGSISMANI_SUPERSEDE_DEBOUNCE_SECONDS so that a burst of revisions is
+    rendered once, for the last one.
+
+    With preview, a low-resolution preview video and a poster JPEG are also
+    rendered, queued ahead of the full render. They are reported in the ticket
+    as preview_status / preview_artifacts and do not affect its status.
+
+    With cpu_profile, the full render runs under cProfile and the profile is
+    written to the ticket directory (see resolve_ticket_profile_path). When it
+    is None, the ticket is profiled with probability
+    IGSISMANI_CPU_PROFILE_SAMPLE_RATE.
+
+    The jobs run in this process (JobScheduler) or, with a BrokerScheduler,
+    in the worker process that leases them from the durable queue.
+    """
     event_id = normalize_event_id(event_id)
+    outputs = parse_outputs(outputs)
+    if cpu_profile is None:
+        cpu_profile = _cpu_profile_sampled()
     events_dir = events_dir.resolve()
     tickets_dir = tickets_dir.resolve()
     artifacts_dir = artifacts_dir.resolve()
     for d in (events_dir, tickets_dir, artifacts_dir):
         d.mkdir(parents=True, exist_ok=True)
 
-    acquired = _acquire_event_lock(events_dir, event_id)
-    if not acquired:
-        existing = get_ticket_status_by_id(event_id, tickets_dir, events_dir)
-        if existing:
-            return existing["ticket_id"]
-        raise RuntimeError(f"event '{event_id}' is locked but active ticket cannot be determined")
-
     ticket_id = _new_ticket_id()
+    ticket = _init_ticket_status(
+        ticket_id, event_id, priority=priority, outputs=outputs, cpu_profile=cpu_profile, revision=revision
+    )
+    event_updates = dict(status="queued", message=None, updated_at=utc_now_iso())
+    superseded = None
+    # Second round only if the active ticket was released while we compared revisions.
+    for _ in range(2):
+        acquired, active_ticket_id = store.claim_event(event_id, ticket, _init_event_state(event_id), **event_updates)
+        if acquired:
+            break
+        active = store.get_ticket(active_ticket_id) if supersede else None
+        if not (active and is_newer_revision(revision, active.get("revision"))):
+            return active_ticket_id
+        if store.supersede_event(event_id, active_ticket_id, dict(ticket, supersedes=active_ticket_id), **event_updates):
+            superseded = active_ticket_id
+            break
+    else:
+        return active_ticket_id
+
     tdir = _ticket_dir(tickets_dir, ticket_id)
     tdir.mkdir(parents=True, exist_ok=True)
 
-    _atomic_write_json(_ticket_status_path(tickets_dir, ticket_id), _init_ticket_status(ticket_id, event_id))
-    _set_event_state(events_dir, event_id, status="queued", active_ticket_id=ticket_id, message=None)
-
-    def _worker() -> None:
-        print("####start worker")
-        logging.info("###Start WORKER ")
-        with semaphore:
-            started_epoch = time.time()
-            _set_ticket_status(tickets_dir, ticket_id, status="processing", started_at=utc_now_iso(), message=None)
-            _set_event_state(events_dir, event_id, status="processing", started_at=utc_now_iso(), message=None)
-
-            repo_root = _repo_root()
-            script = (repo_root / "run_igsismani.py").resolve()
-            stdout_path = tdir / "stdout.log"
-            stderr_path = tdir / "stderr.log"
-
-            try:
-                if not script.exists():
-                    logging.error(f"run_igsismani.py not found under repo root: {repo_root}")
-                    raise FileNotFoundError(f"run_igsismani.py not found under repo root: {repo_root}")
-
-                config_env = os.environ.get("IGSISMANI_DEFAULT_IGANIMA_CONFIG")
-                if not config_env:
-                    raise RuntimeError(
-                        "Missing env var IGSISMANI_DEFAULT_IGANIMA_CONFIG "
-                        "(path to the iganima config ini for run_igsismani.py)."
-                    )
-                config_path = Path(config_env).expanduser().resolve()
-                if not config_path.exists():
-                    logging.error(f"IGSISMANI_DEFAULT_IGANIMA_CONFIG not found: {config_path}")
-                    raise FileNotFoundError(f"IGSISMANI_DEFAULT_IGANIMA_CONFIG not found: {config_path}")
-
-                timeout_s = int(os.environ.get("IGSISMANI_JOB_TIMEOUT_SECONDS", "7200"))
-
-                cmd = [
-                    "python",
-                    str(script),
-                    "--iganima_config",
-                    str(config_path),
-                    "--event_id",
-                    str(event_id),
-                ]
-                logging.info("###Start video creation ")
-                with stdout_path.open("w", encoding="utf-8") as out, stderr_path.open("w", encoding="utf-8") as err:
-                    proc = subprocess.Popen(
-                        cmd,
-                        cwd=str(repo_root),
-                        stdout=out,
-                        stderr=err,
-                        env=os.environ.copy(),
-                    )
-                    try:
-                        rc = proc.wait(timeout=timeout_s)
-                    except subprocess.TimeoutExpired:
-                        proc.kill()
-                        raise TimeoutError(f"Video job timed out after {timeout_s} seconds")
-
-                if rc != 0:
-                    raise RuntimeError(f"Video process exited with code {rc}. See stdout/stderr logs.")
-
-                # Determine next output name while still holding the per-event lock.
-                output_path = _next_output_path(events_dir, event_id)
-
-                candidate = _find_newest_mp4(repo_root, started_epoch)
-                if candidate is None or not candidate.exists():
-                    raise FileNotFoundError(
-                        "Video process finished but no MP4 was found. "
-                        "Update the pipeline/config to write MP4 outputs, or adjust search strategy."
-                    )
-
-                output_path.parent.mkdir(parents=True, exist_ok=True)
-                tmp_out = output_path.with_suffix(".mp4.tmp")
-                shutil.copy2(candidate, tmp_out)
-                tmp_out.replace(output_path)
-
-                rel_output = str(output_path.relative_to(artifacts_dir))
-
-                _set_ticket_status(
-                    tickets_dir,
-                    ticket_id,
-                    status="done",
-                    finished_at=utc_now_iso(),
-                    message=None,
-                    output_file=rel_output,
-                )
-                _set_event_state(
-                    events_dir,
-                    event_id,
-                    status="done",
-                    finished_at=utc_now_iso(),
-                    last_output_file=rel_output,
-                    message=None,
-                )
-
-            except Exception as e:
-                _set_ticket_status(
-                    tickets_dir,
-                    ticket_id,
-                    status="error",
-                    finished_at=utc_now_iso(),
-                    message=str(e),
-                )
-                _set_event_state(
-                    events_dir,
-                    event_id,
-                    status="error",
-                    finished_at=utc_now_iso(),
-                    message=str(e),
-                )
-            finally:
-                try:
-                    _set_event_state(events_dir, event_id, active_ticket_id=None)
-                finally:
-                    _release_event_lock(events_dir, event_id)
-
-    threading.Thread(target=_worker, daemon=True).start()
+    spec = {
+        "kind": "full",
+        "ticket_id": ticket_id,
+        "event_id": event_id,
+        "artifacts_dir": str(artifacts_dir),
+        "events_dir": str(events_dir),
+        "tickets_dir": str(tickets_dir),
+        "outputs": list(outputs),
+        "cpu_profile": bool(cpu_profile),
+        "queued_at": time.time(),
+    }
+    # Debounce at dispatch: a superseding job stays queued (without holding a
+    # slot) until not_before, so a burst of revisions ends in one render.
+    not_before = None
+    if superseded:
+        _cancel_superseded(store, tickets_dir, superseded, ticket_id)
+        not_before = time.time() + _supersede_debounce_seconds()
+    try:
+        scheduler.submit(ticket_id, QueuedJob(spec, store), priority=priority, not_before=not_before)
+    except QueueFullError as e:
+        metrics.JOBS.inc(kind="full", result="rejected")
+        _set_ticket_status(store, ticket_id, status="rejected", finished_at=utc_now_iso(), message=str(e))
+        store.release_event(event_id, ticket_id, status="idle", message=str(e), updated_at=utc_now_iso())
+        raise
+
+    if preview:
+        _set_ticket_status(store, ticket_id, preview_status="queued")
+        preview_spec = dict(spec, kind="preview", queued_at=time.time())
+        try:
+            scheduler.submit(
+                f"{ticket_id}-preview",
+                QueuedJob(preview_spec, store),
+                priority=priority + PREVIEW_PRIORITY_BOOST,
+                not_before=not_before,
+            )
+        except QueueFullError as e:
+            metrics.JOBS.inc(kind="preview", result="rejected")
+            # The full render is queued; only the preview is dropped.
+            _set_ticket_status(store, ticket_id, preview_status="skipped", preview_message=str(e))
     return ticket_id
 
 
-def resolve_ticket_video_path(*, ticket_id: str, tickets_dir: Path, artifacts_dir: Path) -> Path:
+def resolve_ticket_artifact_path(
+    *,
+    ticket_id: str,
+    store: StateStore,
+    artifacts_dir: Path,
+    fmt: str,
+    preview: bool = False,
+) -> Path:
     """
-    Resolve and validate the final MP4 path for a given ticket_id.
+    Resolve and validate the path of one output (mp4, webm, gif, jpg) of a ticket.
 
-    Expects:
-      tickets_dir/<ticket_id>/status.json contains:
-        - status == "done"
-        - output_file: relative path under artifacts_dir (e.g. "events/<event_id>/<event_id>-3.mp4")
+    Expects the ticket state to contain:
+        - status == "done" (preview_status == "done" for preview outputs)
+        - artifacts[fmt] (or output_file for "mp4"), or preview_artifacts[fmt]:
+          relative path under artifacts_dir (e.g. "events/<event_id>/<event_id>-3.gif")
     """
     artifacts_dir = artifacts_dir.resolve()
-    status_path = _ticket_status_path(tickets_dir, ticket_id)
+    status = store.get_ticket(ticket_id)
 
-    if not status_path.exists():
+    if status is None:
         raise FileNotFoundError("ticket not found")
 
-    status = _read_json(status_path)
-    if status.get("status") != "done":
-        raise RuntimeError(f"ticket not ready: {status.get('status')}")
-
-    rel = status.get("output_file")
+    if preview:
+        if status.get("preview_status") != "done":
+            raise RuntimeError(f"preview not ready: {status.get('preview_status')}")
+        rel = (status.get("preview_artifacts") or {}).get(fmt)
+    else:
+        if status.get("status") != "done":
+            raise RuntimeError(f"ticket not ready: {status.get('status')}")
+        rel = (status.get("artifacts") or {}).get(fmt)
+        if not rel and fmt == "mp4":
+            rel = status.get("output_file")
     if not rel:
-        raise FileNotFoundError("ticket has no output_file")
+        raise FileNotFoundError(f"ticket has no {'preview ' if preview else ''}{fmt} output")
 
-    video_path = (artifacts_dir / rel).resolve()
+    path = (artifacts_dir / rel).resolve()
 
     # Safety: ensure the resolved path stays under artifacts_dir (prevents path traversal)
     try:
-        video_path.relative_to(artifacts_dir)
+        path.relative_to(artifacts_dir)
     except ValueError as e:
         raise PermissionError("invalid output path") from e
 
-    if not video_path.exists() or not video_path.is_file():
-        raise FileNotFoundError("video file not found on disk")
+    if not path.exists() or not path.is_file():
+        raise FileNotFoundError(f"{fmt} file not found on disk")
+
+    return path
+
+
+def resolve_ticket_profile_path(*, ticket_id: str, store: StateStore, tickets_dir: Path, fmt: str) -> Path:
+    """
+    Path of the CPU profile of a ticket: fmt is "pstats" or "collapsed" (see
+    iganima.profiling.PROFILE_FILES). The profile is written when the render
+    ends, also if it fails.
+    """
+    if fmt not in PROFILE_FILES:
+        raise FileNotFoundError(f"unknown profile format: {fmt}")
+    status = store.get_ticket(ticket_id)
+    if status is None:
+        raise FileNotFoundError("ticket not found")
+    if not status.get("cpu_profile"):
+        raise FileNotFoundError("ticket was not profiled")
+
+    path = _ticket_dir(tickets_dir.resolve(), ticket_id) / PROFILE_FILES[fmt]
+    if not path.is_file():
+        raise RuntimeError(f"profile not ready: {status.get('status')}")
+    return path
+
 
-    return video_path
\ No newline at end of file
+def resolve_ticket_video_path(*, ticket_id: str, store: StateStore, artifacts_dir: Path) -> Path:
+    """Resolve and validate the final MP4 path for a given ticket_id."""
+    return resolve_ticket_artifact_path(ticket_id=ticket_id, store=store, artifacts_dir=artifacts_dir, fmt="mp4")
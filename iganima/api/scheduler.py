@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Event statuses (FDSN evaluation_status or the labels from iganima_utils.status)
+# that correspond to an analyst-reviewed origin.
+REVIEWED_STATUSES = {"manual", "confirmed", "reviewed", "revisado"}
+
+
+class QueueFullError(RuntimeError):
+    """Raised when the scheduler queue is at capacity."""
+
+    def __init__(self, message: str, retry_after: int) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def compute_priority(
+    magnitude: Optional[float] = None,
+    event_status: Optional[str] = None,
+    explicit: Optional[float] = None,
+) -> float:
+    """
+    Priority of a job: higher runs first.
+
+    An explicit priority wins. Otherwise the magnitude is used, and reviewed
+    events get +0.5 so that, at equal magnitude, they run before automatic ones.
+    """
+    if explicit is not None:
+        return float(explicit)
+    priority = float(magnitude) if magnitude is not None else 0.0
+    if event_status and event_status.strip().lower() in REVIEWED_STATUSES:
+        priority += 0.5
+    return priority
+
+
+class JobScheduler:
+    """
+    Fixed pool of worker threads consuming a bounded priority queue.
+
+    Jobs with higher priority run first; equal priorities run in FIFO order.
+    At most `limit` jobs run at once: max_concurrent unless it is lowered
+    with set_limit (see iganima.api.admission). A job submitted with
+    not_before stays queued, without holding a slot, until that time.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int,
+        max_queued: int,
+        default_job_seconds: float = 60.0,
+        limit: Optional[int] = None,
+    ) -> None:
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.max_queued = max(1, int(max_queued))
+        self.limit = self._clamp(self.max_concurrent if limit is None else limit)
+        self._heap: List[Tuple[float, int, str]] = []
+        self._jobs: Dict[str, Callable[[], None]] = {}
+        self._not_before: Dict[str, float] = {}
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._running = 0
+        # Exponential moving average of job duration, used for the retry hint.
+        self._avg_job_seconds = float(default_job_seconds)
+
+        for i in range(self.max_concurrent):
+            threading.Thread(target=self._loop, name=f"igsismani-job-{i}", daemon=True).start()
+
+    def submit(
+        self,
+        job_id: str,
+        fn: Callable[[], None],
+        priority: float = 0.0,
+        not_before: Optional[float] = None,
+    ) -> int:
+        """
+        Queue fn under job_id. Returns the 1-based queue position.
+
+        :param not_before: wall-clock time (time.time()) before which the job is not started
+
+        :raises QueueFullError: if max_queued jobs are already waiting.
+        """
+        with self._cond:
+            if len(self._heap) >= self.max_queued:
+                raise QueueFullError(
+                    f"job queue is full ({self.max_queued} waiting)",
+                    retry_after=self._retry_after_locked(),
+                )
+            heapq.heappush(self._heap, (-float(priority), next(self._seq), job_id))
+            self._jobs[job_id] = fn
+            if not_before:
+                self._not_before[job_id] = float(not_before)
+            self._cond.notify()
+            return self._position_locked(job_id) or 1
+
+    def set_limit(self, limit: int) -> int:
+        """
+        Change the number of jobs that may run at once, between 1 and
+        max_concurrent. Running jobs are never stopped: a lower limit only
+        holds back the next ones. Returns the limit applied.
+        """
+        with self._cond:
+            self.limit = self._clamp(limit)
+            self._cond.notify_all()
+            return self.limit
+
+    def _clamp(self, limit: int) -> int:
+        return max(1, min(self.max_concurrent, int(limit)))
+
+    def position(self, job_id: str) -> Optional[int]:
+        """1-based position of job_id among waiting jobs, or None if it is not waiting."""
+        with self._cond:
+            return self._position_locked(job_id)
+
+    def stats(self) -> Dict[str, float]:
+        with self._cond:
+            return {
+                "queued": len(self._heap),
+                "running": self._running,
+                "max_concurrent": self.max_concurrent,
+                "concurrency_limit": self.limit,
+                "max_queued": self.max_queued,
+                "avg_job_seconds": round(self._avg_job_seconds, 1),
+            }
+
+    def _position_locked(self, job_id: str) -> Optional[int]:
+        if job_id not in self._jobs:
+            return None
+        key = next((item for item in self._heap if item[2] == job_id), None)
+        if key is None:
+            return None
+        return 1 + sum(1 for item in self._heap if item < key)
+
+    def _retry_after_locked(self) -> int:
+        waves = (len(self._heap) + self._running) / self.limit
+        return max(1, int(waves * self._avg_job_seconds))
+
+    def _pop_due_locked(self) -> Tuple[Optional[str], Optional[float]]:
+        """Highest priority job that may start now, else (None, seconds until the next one is due)."""
+        if not self._not_before:
+            return heapq.heappop(self._heap)[2], None
+        now = time.time()
+        due = [item for item in self._heap if self._not_before.get(item[2], 0.0) <= now]
+        if not due:
+            return None, max(0.01, min(self._not_before.values()) - now)
+        item = min(due)
+        self._heap.remove(item)
+        heapq.heapify(self._heap)
+        self._not_before.pop(item[2], None)
+        return item[2], None
+
+    def _loop(self) -> None:
+        while True:
+            with self._cond:
+                while True:
+                    if self._heap and self._running < self.limit:
+                        job_id, wait = self._pop_due_locked()
+                        if job_id is not None:
+                            break
+                    else:
+                        wait = None
+                    self._cond.wait(wait)
+                fn = self._jobs.pop(job_id)
+                self._running += 1
+
+            started = time.monotonic()
+            try:
+                fn()
+            except Exception:
+                logger.exception("scheduled job %s failed", job_id)
+            finally:
+                elapsed = time.monotonic() - started
+                with self._cond:
+                    self._running -= 1
+                    self._avg_job_seconds = 0.8 * self._avg_job_seconds + 0.2 * elapsed
+                    self._cond.notify()
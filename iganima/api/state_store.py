@@ -0,0 +1,403 @@
+from __future__ import annotations
+
+import json
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ("pending", "queued", "processing")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tickets (
+    ticket_id  TEXT PRIMARY KEY,
+    event_id   TEXT NOT NULL,
+    status     TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    updated_at TEXT,
+    data       TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tickets_event_idx ON tickets (event_id, created_at);
+CREATE INDEX IF NOT EXISTS tickets_status_idx ON tickets (status, created_at);
+CREATE INDEX IF NOT EXISTS tickets_created_idx ON tickets (created_at);
+
+CREATE TABLE IF NOT EXISTS events (
+    event_id         TEXT PRIMARY KEY,
+    status           TEXT NOT NULL,
+    active_ticket_id TEXT,
+    updated_at       TEXT,
+    data             TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS renders (
+    render_key  TEXT PRIMARY KEY,
+    event_id    TEXT NOT NULL,
+    output_file TEXT NOT NULL,
+    created_at  TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class TicketStore:
+    """
+    Ticket, event and render-index state as seen by a render job
+    (runner.run_job_spec). StateStore is the local implementation, owned by
+    the API; iganima.api.remote.HttpStateStore reaches it from worker
+    processes on other hosts.
+    """
+
+    def get_ticket(self, ticket_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def update_ticket(self, ticket_id: str, **updates: Any) -> Dict[str, Any]:
+        """Apply updates to the ticket and return it. :raises KeyError: if it does not exist"""
+        raise NotImplementedError
+
+    def get_event(self, event_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def update_event(self, event_id: str, initial: Dict[str, Any], **updates: Any) -> Dict[str, Any]:
+        """Apply updates to the event (created from initial if missing) and return it."""
+        raise NotImplementedError
+
+    def release_event(self, event_id: str, ticket_id: str, **event_updates: Any) -> None:
+        """Clear the active ticket of event_id, only if it is still ticket_id."""
+        raise NotImplementedError
+
+    def get_render(self, render_key: str) -> Optional[str]:
+        """Published output_file (relative to the artifacts dir) of a previous render with this key."""
+        raise NotImplementedError
+
+    def put_render(self, render_key: str, event_id: str, output_file: str, created_at: str) -> None:
+        raise NotImplementedError
+
+
+class StateStore(TicketStore):
+    """
+    Ticket and event state in a SQLite database (WAL mode), on a local disk
+    of the API host.
+
+    Reads are served from an in-memory cache that is dropped whenever another
+    connection (e.g. another uvicorn worker) commits, detected through
+    `PRAGMA data_version`. Writes go through the database first.
+    """
+
+    def __init__(self, db_path: Path) -> None:
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(
+            str(self.db_path),
+            timeout=30.0,
+            isolation_level=None,  # explicit transactions only
+            check_same_thread=False,
+        )
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._tickets: Dict[str, Dict[str, Any]] = {}
+        self._events: Dict[str, Dict[str, Any]] = {}
+        self._data_version = self._read_data_version()
+        self._ticket_listeners: List[Callable[[str], None]] = []
+
+    def add_ticket_listener(self, callback: Callable[[str], None]) -> None:
+        """Call callback(ticket_id) after every committed ticket update made through this store."""
+        self._ticket_listeners.append(callback)
+
+    def _fire_ticket_listeners(self, ticket_id: str) -> None:
+        for callback in self._ticket_listeners:
+            try:
+                callback(ticket_id)
+            except Exception:
+                logger.exception("ticket listener failed for %s", ticket_id)
+
+    # -- cache ---------------------------------------------------------------
+
+    def _read_data_version(self) -> int:
+        return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _sync_cache(self) -> None:
+        version = self._read_data_version()
+        if version != self._data_version:
+            self._tickets.clear()
+            self._events.clear()
+            self._data_version = version
+
+    # -- tickets -------------------------------------------------------------
+
+    def get_ticket(self, ticket_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self._sync_cache()
+            data = self._tickets.get(ticket_id)
+            if data is None:
+                row = self._conn.execute("SELECT data FROM tickets WHERE ticket_id = ?", (ticket_id,)).fetchone()
+                if row is None:
+                    return None
+                data = json.loads(row["data"])
+                self._tickets[ticket_id] = data
+            return dict(data)
+
+    def _put_ticket(self, data: Dict[str, Any]) -> None:
+        self._conn.execute(
+            "INSERT OR REPLACE INTO tickets (ticket_id, event_id, status, created_at, updated_at, data) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                data["ticket_id"],
+                data["event_id"],
+                data["status"],
+                data["created_at"],
+                data.get("updated_at"),
+                json.dumps(data, ensure_ascii=False),
+            ),
+        )
+
+    def update_ticket(self, ticket_id: str, **updates: Any) -> Dict[str, Any]:
+        with self._lock, self._transaction():
+            row = self._conn.execute("SELECT data FROM tickets WHERE ticket_id = ?", (ticket_id,)).fetchone()
+            if row is None:
+                raise KeyError(f"ticket '{ticket_id}' not found")
+            data = json.loads(row["data"])
+            data.update(updates)
+            self._put_ticket(data)
+            self._tickets[ticket_id] = data
+        self._fire_ticket_listeners(ticket_id)
+        return dict(data)
+
+    def list_tickets(
+        self,
+        *,
+        status: Optional[str] = None,
+        event_id: Optional[str] = None,
+        limit: int = 50,
+    ) -> List[Dict[str, Any]]:
+        """Most recent tickets first, optionally filtered by status and/or event."""
+        clauses, params = [], []
+        if status:
+            clauses.append("status = ?")
+            params.append(status)
+        if event_id:
+            clauses.append("event_id = ?")
+            params.append(event_id)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        params.append(int(limit))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT data FROM tickets {where} ORDER BY created_at DESC LIMIT ?", params
+            ).fetchall()
+        return [json.loads(r["data"]) for r in rows]
+
+    # -- events --------------------------------------------------------------
+
+    def get_event(self, event_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self._sync_cache()
+            data = self._events.get(event_id)
+            if data is None:
+                row = self._conn.execute("SELECT data FROM events WHERE event_id = ?", (event_id,)).fetchone()
+                if row is None:
+                    return None
+                data = json.loads(row["data"])
+                self._events[event_id] = data
+            return dict(data)
+
+    def _put_event(self, data: Dict[str, Any]) -> None:
+        self._conn.execute(
+            "INSERT OR REPLACE INTO events (event_id, status, active_ticket_id, updated_at, data) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (
+                data["event_id"],
+                data["status"],
+                data.get("active_ticket_id"),
+                data.get("updated_at"),
+                json.dumps(data, ensure_ascii=False),
+            ),
+        )
+
+    def update_event(self, event_id: str, initial: Dict[str, Any], **updates: Any) -> Dict[str, Any]:
+        """Merge updates into the event state, creating it from initial if missing."""
+        with self._lock, self._transaction():
+            data = self._load_event_locked(event_id) or dict(initial)
+            data.update(updates)
+            self._put_event(data)
+            self._events[event_id] = data
+            return dict(data)
+
+    def _load_event_locked(self, event_id: str) -> Optional[Dict[str, Any]]:
+        row = self._conn.execute("SELECT data FROM events WHERE event_id = ?", (event_id,)).fetchone()
+        return json.loads(row["data"]) if row else None
+
+    def claim_event(
+        self,
+        event_id: str,
+        ticket: Dict[str, Any],
+        initial_event: Dict[str, Any],
+        **event_updates: Any,
+    ) -> Tuple[bool, Optional[str]]:
+        """
+        Atomic check-and-set for "one active ticket per event".
+
+        If the event has no active ticket, insert ticket and make it the
+        active one; returns (True, ticket_id). Otherwise nothing is written
+        and (False, active_ticket_id) is returned.
+        """
+        with self._lock, self._transaction():
+            event = self._load_event_locked(event_id) or dict(initial_event)
+            active = event.get("active_ticket_id")
+            if active:
+                return False, active
+            self._put_ticket(ticket)
+            event.update(event_updates)
+            event["active_ticket_id"] = ticket["ticket_id"]
+            self._put_event(event)
+            self._tickets[ticket["ticket_id"]] = dict(ticket)
+            self._events[event_id] = event
+            return True, ticket["ticket_id"]
+
+    def release_event(self, event_id: str, ticket_id: str, **event_updates: Any) -> None:
+        """Clear the active ticket of event_id, only if it is still ticket_id."""
+        with self._lock, self._transaction():
+            event = self._load_event_locked(event_id)
+            if event is None or event.get("active_ticket_id") != ticket_id:
+                return
+            event.update(event_updates)
+            event["active_ticket_id"] = None
+            self._put_event(event)
+            self._events[event_id] = event
+
+    def supersede_event(
+        self,
+        event_id: str,
+        old_ticket_id: str,
+        ticket: Dict[str, Any],
+        **event_updates: Any,
+    ) -> bool:
+        """
+        Atomically insert ticket and make it the active ticket of event_id in
+        place of old_ticket_id. Returns False (nothing written) if
+        old_ticket_id is no longer the active ticket.
+        """
+        with self._lock, self._transaction():
+            event = self._load_event_locked(event_id)
+            if event is None or event.get("active_ticket_id") != old_ticket_id:
+                return False
+            self._put_ticket(ticket)
+            event.update(event_updates)
+            event["active_ticket_id"] = ticket["ticket_id"]
+            self._put_event(event)
+            self._tickets[ticket["ticket_id"]] = dict(ticket)
+            self._events[event_id] = event
+            return True
+
+    # -- render cache --------------------------------------------------------
+
+    def get_render(self, render_key: str) -> Optional[str]:
+        """Published output_file (relative to the artifacts dir) of a previous render with this key."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT output_file FROM renders WHERE render_key = ?", (render_key,)
+            ).fetchone()
+        return row["output_file"] if row else None
+
+    def put_render(self, render_key: str, event_id: str, output_file: str, created_at: str) -> None:
+        with self._lock, self._transaction():
+            self._conn.execute(
+                "INSERT OR REPLACE INTO renders (render_key, event_id, output_file, created_at) VALUES (?, ?, ?, ?)",
+                (render_key, event_id, output_file, created_at),
+            )
+
+    # -- transactions / migration -------------------------------------------
+
+    def _transaction(self) -> "_Transaction":
+        return _Transaction(self._conn)
+
+    def migrate_json_state(self, tickets_dir: Path, events_dir: Path) -> int:
+        """
+        Import legacy tickets/<id>/status.json and events/<id>/state.json files.
+
+        Runs once per database (recorded in the meta table). Leftover event.lock
+        files are ignored. Tickets still queued or processing belonged to a
+        previous API process, so they are imported as errors and their events
+        released. Returns the number of imported records.
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'json_migrated_at'").fetchone()
+            if row is not None:
+                return 0
+
+        count = 0
+        tickets: Dict[str, Dict[str, Any]] = {}
+        for sp in Path(tickets_dir).glob("*/status.json"):
+            try:
+                data = json.loads(sp.read_text())
+                if data.get("ticket_id") and data.get("event_id") and data.get("status"):
+                    tickets[data["ticket_id"]] = data
+            except Exception as e:
+                logger.warning("skipping unreadable ticket status %s: %s", sp, e)
+
+        events: Dict[str, Dict[str, Any]] = {}
+        for sp in Path(events_dir).glob("*/state.json"):
+            try:
+                data = json.loads(sp.read_text())
+                if data.get("event_id") and data.get("status"):
+                    events[data["event_id"]] = data
+            except Exception as e:
+                logger.warning("skipping unreadable event state %s: %s", sp, e)
+
+        with self._lock, self._transaction():
+            if self._conn.execute("SELECT 1 FROM meta WHERE key = 'json_migrated_at'").fetchone():
+                return 0
+            for data in tickets.values():
+                data.setdefault("created_at", data.get("updated_at") or "")
+                if data["status"] in ACTIVE_STATUSES:
+                    data["status"] = "error"
+                    data["message"] = "interrupted: job was running when the state store was migrated"
+                exists = self._conn.execute(
+                    "SELECT 1 FROM tickets WHERE ticket_id = ?", (data["ticket_id"],)
+                ).fetchone()
+                if not exists:
+                    self._put_ticket(data)
+                    count += 1
+            for data in events.values():
+                if data.get("active_ticket_id"):
+                    data["active_ticket_id"] = None
+                    if data["status"] in ACTIVE_STATUSES:
+                        data["status"] = "error"
+                exists = self._conn.execute(
+                    "SELECT 1 FROM events WHERE event_id = ?", (data["event_id"],)
+                ).fetchone()
+                if not exists:
+                    self._put_event(data)
+                    count += 1
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('json_migrated_at', datetime('now'))"
+            )
+        self._tickets.clear()
+        self._events.clear()
+        logger.info("migrated %s JSON state records into %s", count, self.db_path)
+        return count
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT/ROLLBACK, serialising writers across processes."""
+
+    def __init__(self, conn: sqlite3.Connection) -> None:
+        self._conn = conn
+
+    def __enter__(self) -> None:
+        self._conn.execute("BEGIN IMMEDIATE")
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        if exc_type is None:
+            self._conn.execute("COMMIT")
+        else:
+            self._conn.execute("ROLLBACK")
+        return False
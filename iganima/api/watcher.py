@@ -0,0 +1,306 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import requests
+
+from iganima.api.scheduler import REVIEWED_STATUSES
+
+logger = logging.getLogger(__name__)
+
+# Proactive renders: a daemon (run_watcher.py) polls the event service and asks
+# the API for the video of every event above a magnitude in the monitored
+# region as soon as it shows up, and again when it is reviewed, so the video
+# already exists when someone asks for it.
+
+# (min_latitude, max_latitude, min_longitude, max_longitude)
+Region = Tuple[float, float, float, float]
+
+
+def parse_region(value: Optional[str]) -> Optional[Region]:
+    """"minlat,maxlat,minlon,maxlon" -> Region; None (anywhere) for an empty value."""
+    if not value or not value.strip():
+        return None
+    parts = [float(v) for v in value.split(",")]
+    if len(parts) != 4:
+        raise ValueError(f"region must be minlat,maxlat,minlon,maxlon, got {value!r}")
+    return parts[0], parts[1], parts[2], parts[3]
+
+
+def in_region(latitude: Optional[float], longitude: Optional[float], region: Optional[Region]) -> bool:
+    if region is None:
+        return True
+    if latitude is None or longitude is None:
+        return False
+    return region[0] <= latitude <= region[1] and region[2] <= longitude <= region[3]
+
+
+def event_summary(event: Any) -> Dict[str, Any]:
+    """
+    What the watcher needs of an obspy Event: id, origin time and place,
+    magnitude, evaluation status and revision (creation time of the origin).
+    """
+    origin = event.preferred_origin() or (event.origins[0] if event.origins else None)
+    magnitude = event.preferred_magnitude() or (event.magnitudes[0] if event.magnitudes else None)
+    creation_info = getattr(origin, "creation_info", None)
+    creation_time = getattr(creation_info, "creation_time", None)
+    return {
+        "event_id": event.resource_id.id.split("/")[-1],
+        "time": origin.time.datetime.replace(tzinfo=timezone.utc) if origin and origin.time else None,
+        "latitude": origin.latitude if origin else None,
+        "longitude": origin.longitude if origin else None,
+        "magnitude": round(magnitude.mag, 1) if magnitude and magnitude.mag is not None else None,
+        "event_status": (origin.evaluation_status if origin else None) or "automatic",
+        "revision": creation_time.isoformat() if creation_time else None,
+    }
+
+
+class EventSource:
+    """Where the watcher reads events from."""
+
+    def poll(self, updated_after: datetime) -> List[Dict[str, Any]]:
+        """Summaries (see event_summary) of the events created or updated after updated_after."""
+        raise NotImplementedError
+
+
+class FDSNEventSource(EventSource):
+    """
+    FDSN event web service, queried incrementally with updatedafter. The
+    magnitude and region filters are also sent to the server.
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        min_magnitude: Optional[float] = None,
+        region: Optional[Region] = None,
+        lookback: timedelta = timedelta(days=1),
+    ) -> None:
+        self.client = client
+        self.min_magnitude = min_magnitude
+        self.region = region
+        self.lookback = lookback
+
+    def poll(self, updated_after: datetime) -> List[Dict[str, Any]]:
+        from obspy import UTCDateTime
+        from obspy.clients.fdsn.header import FDSNNoDataException
+
+        query: Dict[str, Any] = {
+            "updatedafter": UTCDateTime(updated_after),
+            # Updates of old events (e.g. a catalog revision) are not news.
+            "starttime": UTCDateTime(datetime.now(timezone.utc) - self.lookback),
+            "includeallorigins": False,
+            "includearrivals": False,
+        }
+        if self.min_magnitude is not None:
+            query["minmagnitude"] = self.min_magnitude
+        if self.region is not None:
+            query.update(
+                minlatitude=self.region[0], maxlatitude=self.region[1],
+                minlongitude=self.region[2], maxlongitude=self.region[3],
+            )
+        try:
+            catalog = self.client.get_events(**query)
+        except FDSNNoDataException:
+            return []
+        return [event_summary(event) for event in catalog]
+
+
+class QuakeMLFeedSource(EventSource):
+    """
+    Local event feed: a QuakeML file, or a directory of them, written by
+    another system. A file is read again when its modification time is later
+    than updated_after.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+
+    def poll(self, updated_after: datetime) -> List[Dict[str, Any]]:
+        from obspy import read_events
+
+        files = sorted(self.path.glob("*.xml")) if self.path.is_dir() else [self.path]
+        after = updated_after.timestamp()
+        events = []
+        for f in files:
+            try:
+                if f.stat().st_mtime <= after:
+                    continue
+                events.extend(event_summary(event) for event in read_events(str(f)))
+            except Exception as e:
+                # A file still being written is read on the next poll.
+                logger.warning("could not read event feed %s: %s", f, e)
+        return events
+
+
+class TicketClient:
+    """Requests renders from the API, as any other client (GET /tickets)."""
+
+    def __init__(self, api_url: str, timeout: float = 10.0) -> None:
+        self.api_url = api_url.rstrip("/")
+        self.timeout = timeout
+
+    def __call__(self, summary: Dict[str, Any]) -> Optional[str]:
+        """Ticket id of the render of the event; None if the queue is full (retry on the next poll)."""
+        params = {
+            "event_id": summary["event_id"],
+            "magnitude": summary["magnitude"],
+            "event_status": summary["event_status"],
+            "revision": summary["revision"],
+            "preview": "false",
+        }
+        response = requests.get(
+            f"{self.api_url}/tickets",
+            params={k: v for k, v in params.items() if v is not None},
+            timeout=self.timeout,
+        )
+        if response.status_code == 429:
+            return None
+        response.raise_for_status()
+        return response.json()["ticket_id"]
+
+
+class EventWatcher:
+    """
+    Polls an EventSource and submits a render for every event with a
+    magnitude of at least min_magnitude inside region (anywhere when None):
+
+    - once when it is first seen (or first crosses the threshold);
+    - again when it becomes reviewed ("Revisado": manual / confirmed), so
+      the video shows the final solution. A render still running for the
+      automatic solution is superseded by the API.
+
+    The cursor (updatedafter) and the events already submitted are kept in
+    state_path, so a restart neither loses nor repeats events. Each poll
+    overlaps the previous one by `overlap` to cover clock skew with the server.
+    """
+
+    def __init__(
+        self,
+        source: EventSource,
+        submit: Callable[[Dict[str, Any]], Optional[str]],
+        min_magnitude: float = 4.0,
+        region: Optional[Region] = None,
+        poll_seconds: float = 30.0,
+        lookback: timedelta = timedelta(days=1),
+        overlap: timedelta = timedelta(minutes=2),
+        state_path: Optional[Path] = None,
+    ) -> None:
+        self.source = source
+        self.submit = submit
+        self.min_magnitude = float(min_magnitude)
+        self.region = region
+        self.poll_seconds = float(poll_seconds)
+        self.lookback = lookback
+        self.overlap = overlap
+        self.state_path = Path(state_path) if state_path else None
+        self.cursor = datetime.now(timezone.utc) - lookback
+        # event_id -> {"reviewed": bool, "ticket_id": str, "submitted_at": iso}
+        self.submitted: Dict[str, Dict[str, Any]] = {}
+        self._stop = threading.Event()
+        self._load_state()
+
+    def run(self) -> None:
+        """Poll until stop() is called."""
+        logger.info(
+            "event watcher started: min_magnitude=%s region=%s poll_seconds=%s cursor=%s",
+            self.min_magnitude, self.region, self.poll_seconds, self.cursor.isoformat(),
+        )
+        while not self._stop.is_set():
+            try:
+                self.poll_once()
+            except Exception:
+                logger.exception("event watcher poll failed")
+            self._stop.wait(self.poll_seconds)
+        logger.info("event watcher stopped")
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def poll_once(self) -> int:
+        """One poll of the source. Returns the number of renders submitted."""
+        started = datetime.now(timezone.utc)
+        events = self.source.poll(self.cursor - self.overlap)
+        submitted = 0
+        pending = False
+        for summary in events:
+            reason = self._reason(summary)
+            if reason is None:
+                continue
+            try:
+                ticket_id = self.submit(summary)
+            except Exception as e:
+                logger.warning("render request for %s failed: %s", summary["event_id"], e)
+                ticket_id = None
+            if ticket_id is None:
+                # Not recorded: the event is tried again on the next poll.
+                pending = True
+                continue
+            logger.info(
+                "render requested (%s): event_id=%s magnitude=%s status=%s ticket_id=%s",
+                reason, summary["event_id"], summary["magnitude"], summary["event_status"], ticket_id,
+            )
+            self.submitted[summary["event_id"]] = {
+                "reviewed": _is_reviewed(summary["event_status"]),
+                "ticket_id": ticket_id,
+                "submitted_at": started.isoformat(),
+            }
+            submitted += 1
+        # With failed requests the cursor stays, so the same events come back next time.
+        if not pending:
+            self.cursor = started
+        self._prune(started)
+        self._save_state()
+        return submitted
+
+    def _reason(self, summary: Dict[str, Any]) -> Optional[str]:
+        """Why the event must be rendered now ("new" / "reviewed"), None if it must not."""
+        magnitude = summary.get("magnitude")
+        if magnitude is None or magnitude < self.min_magnitude:
+            return None
+        if not in_region(summary.get("latitude"), summary.get("longitude"), self.region):
+            return None
+        if summary.get("time") and summary["time"] < datetime.now(timezone.utc) - self.lookback:
+            return None
+        previous = self.submitted.get(summary["event_id"])
+        if previous is None:
+            return "new"
+        if _is_reviewed(summary.get("event_status")) and not previous.get("reviewed"):
+            return "reviewed"
+        return None
+
+    def _prune(self, now: datetime) -> None:
+        limit = (now - 2 * self.lookback).isoformat()
+        for event_id in [e for e, s in self.submitted.items() if s.get("submitted_at", "") < limit]:
+            del self.submitted[event_id]
+
+    def _load_state(self) -> None:
+        if not self.state_path or not self.state_path.exists():
+            return
+        try:
+            state = json.loads(self.state_path.read_text(encoding="utf-8"))
+            self.cursor = datetime.fromisoformat(state["cursor"])
+            self.submitted = state.get("submitted", {})
+        except Exception as e:
+            logger.warning("ignoring unreadable watcher state %s: %s", self.state_path, e)
+
+    def _save_state(self) -> None:
+        if not self.state_path:
+            return
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.state_path.with_name(f"{self.state_path.name}.tmp")
+        tmp_path.write_text(
+            json.dumps({"cursor": self.cursor.isoformat(), "submitted": self.submitted}, indent=2),
+            encoding="utf-8",
+        )
+        os.replace(tmp_path, self.state_path)
+
+
+def _is_reviewed(event_status: Optional[str]) -> bool:
+    return bool(event_status) and event_status.strip().lower() in REVIEWED_STATUSES
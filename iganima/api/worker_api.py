@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+import re
+import secrets
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Request
+from pydantic import BaseModel
+
+from iganima.api.job_queue import JobBroker
+from iganima.api.runner import LocalArtifacts
+from iganima.api.state_store import StateStore
+from iganima.output_formats import OUTPUT_FORMATS
+
+# /internal endpoints of the API for worker processes on other hosts
+# (iganima.api.remote): the job queue, the ticket / event state and the upload
+# and publication of their outputs, all backed by the broker, the StateStore
+# and the artifacts directory of this API. Every call needs the worker token.
+
+# Files a worker may upload into a ticket directory: a plain name, no path.
+_FILE_NAME = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]*$")
+
+
+class LeaseRequest(BaseModel):
+    worker_id: str
+    lease_seconds: float
+
+
+class JobRequest(BaseModel):
+    worker_id: str
+    error: Optional[str] = None
+
+
+class EnqueueRequest(BaseModel):
+    job_id: str
+    spec: Dict[str, Any]
+    priority: float = 0.0
+    not_before: Optional[float] = None
+
+
+class WorkerRequest(BaseModel):
+    host: str
+    slots: int
+
+
+class TicketUpdate(BaseModel):
+    updates: Dict[str, Any]
+
+
+class EventUpdate(BaseModel):
+    initial: Dict[str, Any]
+    updates: Dict[str, Any]
+
+
+class EventRelease(BaseModel):
+    ticket_id: str
+    updates: Dict[str, Any] = {}
+
+
+class RenderEntry(BaseModel):
+    event_id: str
+    output_file: str
+    created_at: str
+
+
+class PublishRequest(BaseModel):
+    kind: str  # "full" or "preview"
+    event_id: str
+    render_key: Optional[str] = None
+    cache_hit: bool = False
+    outputs: Dict[str, Optional[str]]  # format -> uploaded file name (None for a cache hit)
+
+
+def worker_router(broker: JobBroker, store: StateStore, artifacts: LocalArtifacts, token: str) -> APIRouter:
+    """Router with the /internal endpoints, for the API that owns broker, store and artifacts."""
+
+    def check_token(authorization: Optional[str] = Header(None)) -> None:
+        if not authorization or not secrets.compare_digest(authorization, f"Bearer {token}"):
+            raise HTTPException(status_code=401, detail="invalid worker token")
+
+    router = APIRouter(prefix="/internal", dependencies=[Depends(check_token)], include_in_schema=False)
+
+    def ticket_dir(ticket_id: str) -> Path:
+        if store.get_ticket(ticket_id) is None:
+            raise HTTPException(status_code=404, detail="ticket not found")
+        return artifacts.tickets_dir / ticket_id
+
+    # -- job queue -----------------------------------------------------------
+
+    @router.post("/jobs")
+    def enqueue(req: EnqueueRequest):
+        broker.enqueue(req.job_id, req.spec, req.priority, not_before=req.not_before)
+
+    @router.post("/jobs/lease")
+    def lease(req: LeaseRequest):
+        job = broker.lease(req.worker_id, req.lease_seconds)
+        if job is None:
+            return None
+        return {"job_id": job.job_id, "spec": job.spec, "priority": job.priority, "attempts": job.attempts}
+
+    @router.get("/jobs/stats")
+    def stats():
+        return broker.stats()
+
+    @router.post("/jobs/{job_id}/heartbeat")
+    def heartbeat(job_id: str, req: LeaseRequest):
+        return {"held": broker.heartbeat(job_id, req.worker_id, req.lease_seconds)}
+
+    @router.post("/jobs/{job_id}/complete")
+    def complete(job_id: str, req: JobRequest):
+        broker.complete(job_id, req.worker_id, error=req.error)
+
+    @router.post("/jobs/{job_id}/release")
+    def release(job_id: str, req: JobRequest):
+        broker.release(job_id, req.worker_id)
+
+    @router.get("/jobs/{job_id}/position")
+    def position(job_id: str):
+        return {"position": broker.position(job_id)}
+
+    @router.put("/workers/{worker_id}")
+    def register_worker(worker_id: str, req: WorkerRequest):
+        broker.register_worker(worker_id, req.host, req.slots)
+
+    @router.delete("/workers/{worker_id}")
+    def unregister_worker(worker_id: str):
+        broker.unregister_worker(worker_id)
+
+    # -- ticket / event state ------------------------------------------------
+
+    @router.get("/tickets/{ticket_id}")
+    def get_ticket(ticket_id: str):
+        ticket = store.get_ticket(ticket_id)
+        if ticket is None:
+            raise HTTPException(status_code=404, detail="ticket not found")
+        return ticket
+
+    @router.patch("/tickets/{ticket_id}")
+    def update_ticket(ticket_id: str, req: TicketUpdate):
+        try:
+            return store.update_ticket(ticket_id, **req.updates)
+        except KeyError as e:
+            raise HTTPException(status_code=404, detail="ticket not found") from e
+
+    @router.get("/events/{event_id}")
+    def get_event(event_id: str):
+        event = store.get_event(event_id)
+        if event is None:
+            raise HTTPException(status_code=404, detail="event not found")
+        return event
+
+    @router.patch("/events/{event_id}")
+    def update_event(event_id: str, req: EventUpdate):
+        return store.update_event(event_id, req.initial, **req.updates)
+
+    @router.post("/events/{event_id}/release")
+    def release_event(event_id: str, req: EventRelease):
+        store.release_event(event_id, req.ticket_id, **req.updates)
+
+    @router.get("/renders/{render_key}")
+    def get_render(render_key: str):
+        output_file = store.get_render(render_key)
+        if output_file is None:
+            raise HTTPException(status_code=404, detail="render not found")
+        return {"output_file": output_file}
+
+    @router.put("/renders/{render_key}")
+    def put_render(render_key: str, req: RenderEntry):
+        store.put_render(render_key, req.event_id, req.output_file, req.created_at)
+
+    # -- artifact handoff ----------------------------------------------------
+
+    @router.put("/tickets/{ticket_id}/files/{name}")
+    async def upload_file(ticket_id: str, name: str, request: Request):
+        """Store the request body as tickets/<ticket_id>/<name> (outputs to publish, CPU profile)."""
+        if not _FILE_NAME.match(name):
+            raise HTTPException(status_code=400, detail="invalid file name")
+        tdir = ticket_dir(ticket_id)
+        tdir.mkdir(parents=True, exist_ok=True)
+        tmp = tdir / f".{name}.upload"
+        try:
+            with tmp.open("wb") as f:
+                async for chunk in request.stream():
+                    f.write(chunk)
+            tmp.replace(tdir / name)
+        finally:
+            tmp.unlink(missing_ok=True)
+
+    @router.post("/tickets/{ticket_id}/publish")
+    def publish(ticket_id: str, req: PublishRequest):
+        """
+        Publish uploaded outputs (or, for a cache hit, the renders/<key>.<ext>
+        copies of this host) as LocalArtifacts does for a local worker. 404 if
+        a cache hit is not available here: the worker then uploads the files.
+        """
+        if req.kind not in ("full", "preview") or not req.outputs:
+            raise HTTPException(status_code=400, detail="invalid publish request")
+        if any(fmt not in OUTPUT_FORMATS for fmt in req.outputs):
+            raise HTTPException(status_code=400, detail="unknown output format")
+        tdir = ticket_dir(ticket_id)
+        if req.cache_hit:
+            if not req.render_key or not _FILE_NAME.match(req.render_key):
+                raise HTTPException(status_code=400, detail="a cache hit needs its render_key")
+            renders_dir = artifacts.artifacts_dir / "renders"
+            paths = {fmt: renders_dir / f"{req.render_key}{OUTPUT_FORMATS[fmt]}" for fmt in req.outputs}
+        else:
+            if any(not name or not _FILE_NAME.match(name) for name in req.outputs.values()):
+                raise HTTPException(status_code=400, detail="invalid file name")
+            paths = {fmt: tdir / name for fmt, name in req.outputs.items()}
+        if not all(path.is_file() for path in paths.values()):
+            raise HTTPException(status_code=404, detail="output not found on the API host")
+
+        if req.kind == "preview":
+            published = artifacts.publish_preview(ticket_id, req.event_id, paths, req.render_key, req.cache_hit)
+            return {"artifacts": published, "version": None}
+        published, version = artifacts.publish_render(ticket_id, req.event_id, paths, req.render_key, req.cache_hit)
+        return {"artifacts": published, "version": version}
+
+    return router
@@ -0,0 +1,194 @@
+from __future__ import annotations
+
+import contextlib
+import logging
+import multiprocessing
+import os
+import sys
+import traceback
+from multiprocessing import forkserver
+from pathlib import Path
+from typing import Optional, Sequence
+
+# Modules imported once by the fork-server; every job process is forked from it.
+PRELOAD_MODULES = ["iganima.api.prewarm"]
+
+_CONTEXT: Optional[multiprocessing.context.BaseContext] = None
+
+
+def _get_context() -> multiprocessing.context.BaseContext:
+    global _CONTEXT
+    if _CONTEXT is None:
+        ctx = multiprocessing.get_context("forkserver")
+        ctx.set_forkserver_preload(PRELOAD_MODULES)
+        _CONTEXT = ctx
+    return _CONTEXT
+
+
+def start_fork_server() -> None:
+    """
+    Start the fork-server now instead of on the first job, so the import cost
+    is paid at API startup.
+    """
+    _get_context()
+    forkserver.ensure_running()
+
+
+def _job_entry(
+    config_path: str,
+    event_id: str,
+    cwd: str,
+    frames_dir: str,
+    output_dir: str,
+    manifest_path: str,
+    render_cache_dir: str,
+    stage_cache_dir: str,
+    outputs: str,
+    profile: str,
+    progress_path: str,
+    cpu_profile_dir: str,
+    memory_limit_mb: float,
+    trace_memory: bool,
+    cancel_path: str,
+    stdout_path: str,
+    stderr_path: str,
+    conn,
+) -> None:
+    """
+    Body of a job process: redirect stdout/stderr to the ticket logs, run the
+    pipeline into the ticket directories and send the output path back to the
+    parent.
+    """
+    os.chdir(cwd)
+    with open(stdout_path, "w", encoding="utf-8") as out, open(stderr_path, "w", encoding="utf-8") as err:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.dup2(out.fileno(), 1)
+        os.dup2(err.fileno(), 2)
+
+    logging.basicConfig(
+        stream=sys.stderr,
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(name)s - %(message)s",
+        force=True,
+    )
+
+    from iganima import video_pipeline
+    from iganima.profiling import cpu_profile
+
+    try:
+        video_pipeline.configure_manim()
+        run_param = video_pipeline.load_run_parameters(config_path)
+        with cpu_profile(cpu_profile_dir) if cpu_profile_dir else contextlib.nullcontext():
+            output = video_pipeline.create_event_video(
+                event_id,
+                run_param,
+                frames_out=frames_dir,
+                video_out=output_dir,
+                manifest_path=manifest_path,
+                render_cache_dir=render_cache_dir or None,
+                stage_cache_dir=stage_cache_dir or None,
+                outputs=outputs or None,
+                profile=profile,
+                progress_path=progress_path or None,
+                memory_limit_mb=memory_limit_mb or None,
+                trace_memory=trace_memory,
+                cancel_path=cancel_path or None,
+            )
+    except BaseException as e:
+        traceback.print_exc()
+        conn.send({"error": str(e)})
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(1)
+
+    conn.send({"output_file": os.path.abspath(output)})
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os._exit(0)
+
+
+def run_job_in_worker(
+    *,
+    config_path: Path,
+    event_id: str,
+    cwd: Path,
+    frames_dir: Path,
+    output_dir: Path,
+    manifest_path: Path,
+    render_cache_dir: Optional[Path],
+    stage_cache_dir: Optional[Path],
+    outputs: Optional[Sequence[str]],
+    stdout_path: Path,
+    stderr_path: Path,
+    timeout_s: int,
+    profile: str = "full",
+    progress_path: Optional[Path] = None,
+    cpu_profile_dir: Optional[Path] = None,
+    memory_limit_mb: Optional[float] = None,
+    trace_memory: bool = False,
+    cancel_path: Optional[Path] = None,
+) -> Path:
+    """
+    Run the pipeline for event_id in a process forked from the pre-warmed
+    fork-server and return the path of the produced MP4. Frames, the MP4 and
+    the manifest are written to the given ticket-specific paths.
+
+    Each job gets its own process, so a crash only fails its ticket; the
+    process is killed if it exceeds timeout_s. With cpu_profile_dir, the
+    pipeline runs under cProfile (see iganima.profiling). Once cancel_path
+    exists, the render stops at its next stage boundary.
+    """
+    ctx = _get_context()
+    parent_conn, child_conn = ctx.Pipe(duplex=False)
+    proc = ctx.Process(
+        target=_job_entry,
+        args=(
+            str(config_path),
+            event_id,
+            str(cwd),
+            str(frames_dir),
+            str(output_dir),
+            str(manifest_path),
+            str(render_cache_dir or ""),
+            str(stage_cache_dir or ""),
+            ",".join(outputs or ()),
+            profile,
+            str(progress_path or ""),
+            str(cpu_profile_dir or ""),
+            float(memory_limit_mb or 0),
+            bool(trace_memory),
+            str(cancel_path or ""),
+            str(stdout_path),
+            str(stderr_path),
+            child_conn,
+        ),
+        daemon=True,
+    )
+    proc.start()
+    child_conn.close()
+
+    try:
+        # poll() also returns when the child dies without sending (EOF).
+        if not parent_conn.poll(timeout_s):
+            proc.kill()
+            proc.join()
+            raise TimeoutError(f"Video job timed out after {timeout_s} seconds")
+        try:
+            result = parent_conn.recv()
+        except EOFError:
+            result = None
+        proc.join(timeout=30)
+        if proc.is_alive():
+            proc.kill()
+            proc.join()
+    finally:
+        parent_conn.close()
+
+    rc = proc.exitcode
+    if rc != 0 or result is None or "output_file" not in result:
+        if result and result.get("error"):
+            raise RuntimeError(f"Video process exited with code {rc}: {result['error']}")
+        raise RuntimeError(f"Video process exited with code {rc}. See stdout/stderr logs.")
+
+    return Path(result["output_file"])
@@ -0,0 +1,148 @@
+"""
+Local static assets of the video: the IGEPN logo and the outro slides.
+
+- The logo drawn on every map frame is read from ``frames_in`` and handed to
+  Plotly/Kaleido as a ``data:`` URI, so rendering a frame does not fetch it
+  from the network. The remote logo of ``save_frame`` is only used when the
+  file is missing.
+- Outro slides are decoded and resized once per output resolution and kept
+  as ``.npy`` files in a cache directory. Jobs open them with
+  ``mmap_mode="r"``, so every worker process shares the same read-only pages.
+  Cache entries are named after the SHA-256 of the source image and are
+  rebuilt when the source changes.
+"""
+
+import os
+import glob
+import base64
+import hashlib
+import logging
+import tempfile
+import threading
+
+import cv2
+import numpy as np
+
+
+logger = logging.getLogger(__name__)
+
+LOGO_FILE = "logo_igepn.png"
+
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), "igsismani-assets")
+
+# (ruta, tamaño, mtime_ns) -> sha256 / data URI / arreglo, para leer cada archivo una vez por proceso
+_HASHES = {}
+_LOGOS = {}
+_SLIDES = {}
+_LOCK = threading.Lock()
+
+
+def _stat_key(path):
+    st = os.stat(path)
+    return (os.path.realpath(path), st.st_size, st.st_mtime_ns)
+
+
+def file_sha256(path):
+    """
+    SHA-256 of a file, memoized per file version.
+
+    :returns: string: hex digest, or None if the file does not exist
+    """
+    if not os.path.isfile(path):
+        return None
+    key = _stat_key(path)
+    with _LOCK:
+        digest = _HASHES.get(key)
+    if digest is None:
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        digest = h.hexdigest()
+        with _LOCK:
+            _HASHES[key] = digest
+    return digest
+
+
+def logo_source(frames_in):
+    """
+    Image source for the logo of the map frames.
+
+    :param string frames_in: directory with the static images
+    :returns: string: ``data:image/png;base64,...`` of ``frames_in/logo_igepn.png``,
+        or None if that file does not exist
+    """
+    path = os.path.join(frames_in, LOGO_FILE)
+    if not os.path.isfile(path):
+        logger.warning(f"{path} not found, the logo will be downloaded for every frame")
+        return None
+    key = _stat_key(path)
+    with _LOCK:
+        source = _LOGOS.get(key)
+    if source is None:
+        with open(path, "rb") as f:
+            source = "data:image/png;base64," + base64.b64encode(f.read()).decode("ascii")
+        with _LOCK:
+            _LOGOS[key] = source
+    return source
+
+
+def load_slide(path, size, cache_dir=None):
+    """
+    Outro slide decoded (BGR) and resized to size.
+
+    :param string path: source image
+    :param tuple size: (width, height) of the video
+    :param string cache_dir: directory of the preprocessed slides, defaults to :data:`DEFAULT_CACHE_DIR`
+    :returns: numpy.ndarray: read-only (height, width, 3) uint8 array, memory-mapped from the cache
+    :raises FileNotFoundError: if the source image cannot be read
+    """
+    digest = file_sha256(path)
+    if digest is None:
+        raise FileNotFoundError(f"Asset not found: {path}")
+    width, height = size
+    with _LOCK:
+        slide = _SLIDES.get((digest, width, height))
+    if slide is not None:
+        return slide
+
+    cache_dir = cache_dir or DEFAULT_CACHE_DIR
+    stem = os.path.splitext(os.path.basename(path))[0]
+    cached = os.path.join(cache_dir, f"{stem}-{width}x{height}-{digest[:16]}.npy")
+    if not os.path.isfile(cached):
+        _build_slide(path, size, cache_dir, stem, cached)
+
+    slide = np.load(cached, mmap_mode="r")
+    with _LOCK:
+        _SLIDES[(digest, width, height)] = slide
+    return slide
+
+
+def _build_slide(path, size, cache_dir, stem, cached):
+    img = cv2.imread(path, cv2.IMREAD_COLOR)
+    if img is None:
+        raise FileNotFoundError(f"Could not read asset {path}")
+    if (img.shape[1], img.shape[0]) != tuple(size):
+        img = cv2.resize(img, tuple(size))
+    img = np.ascontiguousarray(img)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=f".{stem}-", suffix=".npy", dir=cache_dir)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.save(f, img)
+        os.replace(tmp, cached)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+    # versiones anteriores de la misma imagen y resolución
+    width, height = size
+    for old in glob.glob(os.path.join(cache_dir, f"{stem}-{width}x{height}-*.npy")):
+        if old != cached:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+    logger.info(f"Asset {path} cached at {cached}")
@@ -0,0 +1,164 @@
+"""
+Composite the final video frames (column intro + map + info) in NumPy.
+
+All frames are written into one preallocated ``uint8`` buffer of shape
+``(n_frames, height, width, 3)`` in BGR order, ready for ``cv2.VideoWriter``,
+so no intermediate ``frame_<i>.png`` is written or decoded again. Decoding
+(``cv2.imread``) and resizing (``cv2.resize``) release the GIL, so map/info
+frames are composited on a thread pool.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+
+# Colores de las columnas de la intro (RGB)
+AZUL_OSCURO = (46, 95, 168)
+ROJO_QUEMADO = (128, 0, 32)
+BLANCO = (255, 255, 255)
+INTRO_COLORS = (AZUL_OSCURO, ROJO_QUEMADO, BLANCO)
+
+
+def default_threads():
+    return max(1, min(4, os.cpu_count() or 1))
+
+
+def intro_stripe_widths(frames_columns, width):
+    """
+    Width in pixels of each intro column for every intro frame.
+
+    The three columns start at a third of the frame width each and shrink
+    linearly to zero over the intro.
+
+    :param int frames_columns: number of intro frames
+    :param int width: frame width
+    :returns: numpy.ndarray: int array of length frames_columns
+    """
+    t = np.arange(frames_columns) / max(frames_columns - 1, 1)
+    return ((width / 3.0) * np.clip(1.0 - t, 0.0, None)).astype(int)
+
+
+def fill_intro_frame(frame, stripe_width, colors=INTRO_COLORS):
+    """
+    Paint one intro frame in place: the columns side by side over white.
+
+    :param numpy.ndarray frame: (height, width, 3) BGR view into the frame buffer
+    :param int stripe_width: width of each column
+    """
+    frame[:] = 255
+    if stripe_width <= 0:
+        return
+    for k, color in enumerate(colors):
+        x0 = k * stripe_width
+        # como ImageDraw.rectangle, el borde derecho es inclusivo
+        frame[:, x0:x0 + stripe_width + 1] = color[::-1]
+
+
+def _read_bgr(path):
+    img = cv2.imread(path, cv2.IMREAD_COLOR)
+    if img is None:
+        raise FileNotFoundError(f"Could not read frame {path}")
+    return img
+
+
+def _read_info(path, info_height, width):
+    info_img = _read_bgr(path)
+    if info_img.shape[:2] != (info_height, width):
+        shrink = info_img.shape[1] > width
+        info_img = cv2.resize(info_img, (width, info_height),
+                              interpolation=cv2.INTER_AREA if shrink else cv2.INTER_LANCZOS4)
+    return info_img
+
+
+def info_frame_blend(frames_number, info_frames):
+    """
+    Info frames behind each map frame when there are fewer info frames
+    (keyframe mode): the two info frames around its time and the weight of
+    the second, spread over the phase as :func:`keyframes.keyframe_times`.
+
+    :returns: list of (i0, i1, weight) of length frames_number
+    """
+    if info_frames >= frames_number:
+        return [(j, j, 0.0) for j in range(frames_number)]
+    x = np.arange(frames_number) * (info_frames - 1) / max(frames_number - 1, 1)
+    i0 = np.minimum(np.floor(x).astype(int), info_frames - 1)
+    i1 = np.minimum(i0 + 1, info_frames - 1)
+    return [(int(a), int(b), float(w)) for a, b, w in zip(i0, i1, x - i0)]
+
+
+def fill_map_info_frame(frame, map_path, info_path, map_height, info_height, next_info_path=None, weight=0.0):
+    """
+    Paint one map+info frame in place: the map on top, the info bars below.
+
+    The info frame is resized only if its size differs from the reference.
+    With next_info_path, the info bars are the cross-fade of both info frames,
+    with weight on the second one.
+    """
+    width = frame.shape[1]
+    map_img = _read_bgr(map_path)
+    info_img = _read_info(info_path, info_height, width)
+    if next_info_path and weight > 0:
+        info_img = cv2.addWeighted(info_img, 1.0 - weight, _read_info(next_info_path, info_height, width), weight, 0)
+
+    h = min(map_img.shape[0], map_height)
+    w = min(map_img.shape[1], width)
+    if h < map_height or w < width:
+        frame[:map_height] = 255
+    frame[:h, :w] = map_img[:h, :w]
+    frame[map_height:map_height + info_height] = info_img
+
+
+def compose_frames(frames_out, frames_columns, frames_number, threads=None, info_frames=None):
+    """
+    Build every frame of the column intro and the map+info phase.
+
+    ``map_000.png`` and ``info_000.png`` set the frame size: the map width and
+    the sum of both heights, with the info frames scaled to the map width
+    (keeping their aspect ratio) if the widths differ.
+
+    :param string frames_out: directory with ``map_<t>.png`` and ``info_<t>.png``
+    :param int frames_columns: number of intro frames
+    :param int frames_number: number of map/info frames
+    :param int threads: worker threads for the map+info phase, defaults to :func:`default_threads`
+    :param int info_frames: number of info frames when there are fewer than map
+        frames (keyframe mode), see :func:`info_frame_blend`
+    :returns: numpy.ndarray: (frames_columns + frames_number, height, width, 3) uint8 BGR buffer
+    """
+    map_sample = _read_bgr(f"{frames_out}/map_000.png")
+    info_sample = _read_bgr(f"{frames_out}/info_000.png")
+    map_height, width = map_sample.shape[:2]
+    info_height = int(round(info_sample.shape[0] * width / info_sample.shape[1]))
+    height = map_height + info_height
+    del map_sample, info_sample
+
+    frames = np.empty((frames_columns + frames_number, height, width, 3), dtype=np.uint8)
+
+    for i, stripe_width in enumerate(intro_stripe_widths(frames_columns, width)):
+        fill_intro_frame(frames[i], int(stripe_width))
+
+    blend = info_frame_blend(frames_number, info_frames or frames_number)
+
+    def _fill(j):
+        i0, i1, weight = blend[j]
+        fill_map_info_frame(
+            frames[frames_columns + j],
+            f"{frames_out}/map_{j:03}.png",
+            f"{frames_out}/info_{i0:03}.png",
+            map_height,
+            info_height,
+            next_info_path=f"{frames_out}/info_{i1:03}.png",
+            weight=weight,
+        )
+
+    threads = threads or default_threads()
+    if threads > 1 and frames_number > 1:
+        with ThreadPoolExecutor(max_workers=threads, thread_name_prefix="compositor") as pool:
+            list(pool.map(_fill, range(frames_number)))
+    else:
+        for j in range(frames_number):
+            _fill(j)
+
+    return frames
@@ -0,0 +1,103 @@
+"""
+Reduce waveforms to display resolution before drawing them.
+
+A 100 Hz trace of two minutes has 12000 samples, but a panel a few hundred
+pixels wide can only show a few hundred. Two downsamplers keep the shape of
+the trace with that many points:
+
+- :func:`minmax_envelope`: the minimum and the maximum of each of n buckets,
+  in time order (2n points). Peaks are never lost, which suits dense,
+  oscillating seismograms.
+- :func:`lttb`: Largest-Triangle-Three-Buckets, one point per bucket chosen
+  to keep the visual area of the line (n points). Smoother for slowly
+  varying signals.
+"""
+
+import numpy as np
+
+
+METHODS = ("minmax", "lttb")
+
+
+def _bucket_edges(n_samples, n_buckets):
+    return np.linspace(0, n_samples, n_buckets + 1).astype(int)
+
+
+def minmax_envelope(y, n_buckets, x=None):
+    """
+    Min/max envelope of y over n_buckets buckets of (almost) equal size.
+
+    :param numpy.ndarray y: samples
+    :param int n_buckets: number of buckets; the result has 2 * n_buckets points
+    :param numpy.ndarray x: sample times, defaults to the sample index
+    :returns: tuple: (x, y) of the envelope, the minimum and maximum of each
+        bucket in the order they occur
+    """
+    y = np.asarray(y, dtype=float)
+    x = np.arange(len(y), dtype=float) if x is None else np.asarray(x, dtype=float)
+    if len(y) <= 2 * n_buckets:
+        return x, y
+
+    # Cubetas del mismo tamaño: se recorta la cola para poder hacer reshape
+    size = len(y) // n_buckets
+    blocks = y[:size * n_buckets].reshape(n_buckets, size)
+    i_min = np.argmin(blocks, axis=1)
+    i_max = np.argmax(blocks, axis=1)
+    first = np.minimum(i_min, i_max)
+    second = np.maximum(i_min, i_max)
+    offset = np.arange(n_buckets) * size
+    idx = np.stack([offset + first, offset + second], axis=1).ravel()
+    return x[idx], y[idx]
+
+
+def lttb(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+
+    The first and last samples are kept; every other bucket contributes the
+    sample that forms the largest triangle with the point kept in the
+    previous bucket and the mean of the next bucket.
+
+    :param numpy.ndarray x: sample times (increasing)
+    :param numpy.ndarray y: samples
+    :param int n_out: number of points of the result (at least 3)
+    :returns: tuple: (x, y) with n_out points
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return x, y
+
+    edges = _bucket_edges(n - 2, n_out - 2) + 1
+    # Medias de cada cubeta (la última "cubeta siguiente" es el último punto)
+    sums_x = np.add.reduceat(x[1:n - 1], edges[:-1] - 1)
+    sums_y = np.add.reduceat(y[1:n - 1], edges[:-1] - 1)
+    counts = np.diff(edges)
+    mean_x = np.append(sums_x / counts, x[-1])
+    mean_y = np.append(sums_y / counts, y[-1])
+
+    idx = np.empty(n_out, dtype=int)
+    idx[0], idx[-1] = 0, n - 1
+    a = 0
+    for b in range(n_out - 2):
+        lo, hi = edges[b], edges[b + 1]
+        cx, cy = mean_x[b + 1], mean_y[b + 1]
+        # doble del área del triángulo (a, candidato, media siguiente)
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(np.argmax(area))
+        idx[b + 1] = a
+    return x[idx], y[idx]
+
+
+def decimate(x, y, points, method="minmax"):
+    """
+    Reduce (x, y) to about `points` points with one of :data:`METHODS`.
+
+    :returns: tuple: (x, y)
+    """
+    if method == "minmax":
+        return minmax_envelope(y, max(1, points // 2), x=x)
+    if method == "lttb":
+        return lttb(x, y, points)
+    raise ValueError(f"unknown decimation method {method!r}, expected one of {METHODS}")
@@ -0,0 +1,201 @@
+"""
+Output fan-out: one stream of composited frames, several encoders.
+
+:func:`encode_outputs` reads the frame stream once and hands every frame to
+one thread per output format (MP4, WebM, GIF, poster JPEG) through small
+bounded queues. Frames are passed by reference and must not be modified
+after they are yielded. ``cv2.VideoWriter.write`` and the PIL quantizer
+release the GIL, so the encoders really run side by side.
+"""
+
+import queue
+import logging
+import threading
+
+import cv2
+from PIL import Image
+
+from iganima.mp4_faststart import relocate_moov
+from iganima.output_formats import OUTPUT_FORMATS, DEFAULT_OUTPUTS, parse_outputs
+
+
+logger = logging.getLogger(__name__)
+
+_QUEUE_SIZE = 8
+_END = object()
+
+
+class _VideoWriterEncoder:
+    fourcc = None
+
+    def __init__(self, path, fps, size):
+        self.path = path
+        self._writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*self.fourcc), fps, size)
+        if not self._writer.isOpened():
+            raise RuntimeError(f"OpenCV could not open a {self.fourcc} writer for {path}")
+
+    def write(self, frame):
+        self._writer.write(frame)
+
+    def close(self):
+        self._writer.release()
+
+
+class Mp4Encoder(_VideoWriterEncoder):
+    """H.264 MP4, with the moov atom moved to the front after writing."""
+
+    fourcc = "avc1"
+
+    def close(self):
+        super().close()
+        # Index (moov) al inicio para que el video empiece a reproducirse sin descargarlo completo
+        try:
+            relocate_moov(self.path)
+        except Exception as e:
+            logger.warning(f"Could not relocate moov atom of {self.path}: {e}")
+
+
+class WebmEncoder(_VideoWriterEncoder):
+    """VP8 WebM."""
+
+    fourcc = "VP80"
+
+
+class GifEncoder:
+    """
+    Animated GIF with an optimised palette per frame.
+
+    Consecutive repeats of the same frame object (hold and outro frames) are
+    stored once with a longer duration.
+    """
+
+    def __init__(self, path, fps, size):
+        self.path = path
+        self._frame_ms = 1000.0 / fps
+        self._images = []
+        self._durations = []
+        self._last = None
+
+    def write(self, frame):
+        if frame is self._last:
+            self._durations[-1] += self._frame_ms
+            return
+        self._last = frame
+        rgb = Image.fromarray(frame[:, :, ::-1])
+        self._images.append(rgb.quantize(colors=256, method=Image.Quantize.MEDIANCUT, dither=Image.Dither.NONE))
+        self._durations.append(self._frame_ms)
+
+    def close(self):
+        if not self._images:
+            return
+        first, rest = self._images[0], self._images[1:]
+        first.save(
+            self.path,
+            save_all=True,
+            append_images=rest,
+            duration=[int(round(d)) for d in self._durations],
+            loop=0,
+            optimize=True,
+            disposal=1,
+        )
+        self._images = []
+
+
+class PosterEncoder:
+    """JPEG still of one frame (by default the last one)."""
+
+    def __init__(self, path, fps, size, frame_index=None, quality=90):
+        self.path = path
+        self._index = frame_index
+        self._quality = quality
+        self._count = 0
+        self._last = None
+        self._written = False
+
+    def write(self, frame):
+        if self._written:
+            return
+        if self._index is not None and self._count == self._index:
+            self._save(frame)
+        self._last = frame
+        self._count += 1
+
+    def _save(self, frame):
+        if not cv2.imwrite(self.path, frame, [cv2.IMWRITE_JPEG_QUALITY, self._quality]):
+            raise RuntimeError(f"Could not write poster {self.path}")
+        self._written = True
+
+    def close(self):
+        if not self._written and self._last is not None:
+            self._save(self._last)
+
+
+ENCODERS = {
+    "mp4": Mp4Encoder,
+    "webm": WebmEncoder,
+    "gif": GifEncoder,
+    "jpg": PosterEncoder,
+}
+
+
+def _run_encoder(encoder, frames, errors):
+    failed = False
+    while True:
+        frame = frames.get()
+        if frame is _END:
+            break
+        if failed:
+            continue  # vaciar la cola para no bloquear al productor
+        try:
+            encoder.write(frame)
+        except Exception as e:
+            errors.append((encoder.path, e))
+            failed = True
+    if not failed:
+        try:
+            encoder.close()
+        except Exception as e:
+            errors.append((encoder.path, e))
+
+
+def encode_outputs(frames, paths, fps, size, poster_index=None):
+    """
+    Encode one frame stream into several outputs in parallel.
+
+    :param frames: iterable of (height, width, 3) uint8 BGR frames
+    :param dict paths: {format: output path}, formats from :data:`OUTPUT_FORMATS`
+    :param int fps: frames per second
+    :param tuple size: (width, height)
+    :param int poster_index: index of the frame used for the poster JPEG (default: last frame)
+    :returns: dict: {format: output path}
+    :raises RuntimeError: if any encoder fails
+    """
+    encoders = []
+    for fmt, path in paths.items():
+        if fmt == "jpg":
+            encoders.append(PosterEncoder(path, fps, size, frame_index=poster_index))
+        else:
+            encoders.append(ENCODERS[fmt](path, fps, size))
+
+    errors = []
+    queues = [queue.Queue(maxsize=_QUEUE_SIZE) for _ in encoders]
+    threads = [
+        threading.Thread(target=_run_encoder, args=(enc, q, errors), name=f"encoder-{fmt}", daemon=True)
+        for enc, q, fmt in zip(encoders, queues, paths)
+    ]
+    for t in threads:
+        t.start()
+    try:
+        for frame in frames:
+            for q in queues:
+                q.put(frame)
+    finally:
+        for q in queues:
+            q.put(_END)
+        for t in threads:
+            t.join()
+
+    if errors:
+        path, e = errors[0]
+        raise RuntimeError(f"Error encoding {path}: {e}")
+    return dict(paths)
@@ -7,10 +7,12 @@ sys.path.append(str(current_dir))
 import plotly.graph_objects as go
 import numpy as np
 from moviepy.editor import ImageSequenceClip
+import imageio
 import pandas as pd
 import os
 import glob
 import iganima_utils as u
+from iganima.timeline import circle_geometry
 
 
 def clean_frames_directory(frame_dir):
@@ -26,19 +28,17 @@ def clean_frames_directory(frame_dir):
 def compile_animation(frame_dir, output_gif, output_mp4, fps=2):
     """Compila los frames en un GIF y un MP4."""
     frame_names = sorted(glob.glob(os.path.join(frame_dir, "*.png")))
-    clip = ImageSequenceClip(frame_names, fps=0.001)
+    # Decodificar los PNG una sola vez y usarlos para ambos clips
+    frames = [imageio.imread(f) for f in frame_names]
+    clip = ImageSequenceClip(frames, fps=0.001)
     clip.write_gif(output_gif)
-    clip_video = ImageSequenceClip(frame_names, fps=fps)
+    clip_video = ImageSequenceClip(frames, fps=fps)
     clip_video.write_videofile(output_mp4, codec='libx264')
 
 def generate_circle(lat, lon, radius, points=100):
     """Genera coordenadas para un círculo alrededor de un punto."""
-    lat_circle = []
-    lon_circle = []
-    for i in np.linspace(0, 2*np.pi, points):
-        lat_circle.append(lat + radius * np.sin(i))
-        lon_circle.append(lon + radius * np.cos(i))
-    return lat_circle, lon_circle
+    lat_circle, lon_circle = circle_geometry(radius, lat, lon, points)
+    return lat_circle.tolist(), lon_circle.tolist()
 
 def create_initial_point_frame(event_longitude, event_latitude):
     """Crea el frame inicial con solo un punto."""
@@ -177,8 +177,88 @@ def create_circle_frames(t, SEISMIC_WAVE_GROW, SEISMIC_WAVE_SHRINK, event_latitu
 
 
 
-def save_frame(fig, frame_name, mapbox_access_token, event_latitude, event_longitude, event_annotation, zoom_level):
-    """Guarda un frame como imagen PNG."""
+def create_timeline_frame(f, geometry, event_latitude, event_longitude, circle_colors, lon_stations, lat_stations, station_name_list_ordered, text_magnitude):
+    """
+    Crea el frame f a partir de la geometría precalculada de todos los frames.
+
+    :param int f: índice del frame (desde 0)
+    :param dict geometry: resultado de :func:`timeline.station_intro_geometry`
+    """
+    phase = geometry["phase"][f]
+    if phase == "point" or phase is None:
+        return create_initial_point_frame(event_longitude, event_latitude)
+
+    if phase != "circles":
+        visible = ~np.isnan(geometry["wave_lat"][f])
+        return [
+            go.Scattermapbox(
+                lon=geometry["wave_lon"][f][visible],
+                lat=geometry["wave_lat"][f][visible],
+                mode='lines',
+                line=dict(width=1, color='green'),
+                showlegend=False,
+                hoverinfo='skip'
+            ),
+            go.Scattermapbox(
+                lon=lon_stations,
+                lat=lat_stations,
+                text=station_name_list_ordered,
+                mode="markers+text",
+                marker=dict(color=[], size=4, symbol="circle"),
+                textposition='top left',
+                showlegend=False,
+                hoverinfo='text'
+            )
+        ]
+
+    frame_data = [
+        go.Scattermapbox(
+            lon=lon_circ,
+            lat=lat_circ,
+            mode="lines",
+            line=dict(width=2, color=color),
+            showlegend=False,
+        )
+        for lat_circ, lon_circ, color in zip(geometry["circle_lat"][f], geometry["circle_lon"][f], circle_colors)
+    ]
+    station_colors = np.where(geometry["station_reached"][f], "Red", "Gray").tolist()
+    frame_data.extend([
+        go.Scattermapbox(
+            lon=lon_stations,
+            lat=lat_stations,
+            text=station_name_list_ordered,
+            mode="markers+text",
+            marker=dict(color=station_colors, size=4, symbol="circle"),
+            textposition='top left',
+            showlegend=False,
+            hoverinfo='text'
+        ),
+        go.Scattermapbox(
+            lon=[event_longitude],
+            lat=[event_latitude],
+            text=text_magnitude,
+            mode='markers+text',
+            marker=dict(color='white', size=4, symbol="circle"),
+            textposition='top center',
+            textfont=dict(size=30),
+            showlegend=False,
+            hoverinfo='text'
+        )
+    ])
+    return frame_data
+
+
+LOGO_URL = "https://raw.githubusercontent.com/awacero/grafana_plotly/main/images/logo_igepn.png"
+
+
+def save_frame(fig, frame_name, mapbox_access_token, event_latitude, event_longitude, event_annotation, zoom_level,
+               logo_source=None, map_style="outdoors", scale=1):
+    """Guarda un frame como imagen PNG.
+
+    logo_source: imagen del logo (p. ej. data URI de un archivo local); por defecto LOGO_URL.
+    map_style: estilo del mapa base de Mapbox.
+    scale: factor de escala de la imagen (720x640 con scale=1).
+    """
 
     import math
 
@@ -222,10 +302,10 @@ def save_frame(fig, frame_name, mapbox_access_token, event_latitude, event_longi
             center=dict(lat=event_latitude, lon=event_longitude),
             zoom=zoom_level,
             #style='light'
-            style="outdoors"
+            style=map_style
         ),
         images=[dict(
-            source="https://raw.githubusercontent.com/awacero/grafana_plotly/main/images/logo_igepn.png",
+            source=logo_source or LOGO_URL,
             xref="paper",
             yref="paper",
             x=0,
@@ -241,4 +321,50 @@ def save_frame(fig, frame_name, mapbox_access_token, event_latitude, event_longi
         width=720,
         height=640
     )
-    fig.write_image(frame_name)
+    fig.write_image(frame_name, scale=scale)
+
+
+def save_basemap_frame(frame_name, mapbox_access_token, event_latitude, event_longitude, zoom_level,
+                       map_style="outdoors", scale=1):
+    """Guarda sólo el mapa base (sin trazas ni logo), con el mismo encuadre que save_frame."""
+
+    fig = go.Figure(data=[go.Scattermapbox(lat=[], lon=[], showlegend=False)])
+    fig.update_layout(
+        mapbox=dict(
+            accesstoken=mapbox_access_token,
+            center=dict(lat=event_latitude, lon=event_longitude),
+            zoom=zoom_level,
+            style=map_style
+        ),
+        margin=dict(l=10, r=10, t=10, b=10),
+        width=720,
+        height=640
+    )
+    fig.write_image(frame_name, scale=scale)
+
+
+def save_overlay_frame(frame_name, logo_source=None, scale=1):
+    """Guarda el logo de save_frame sobre fondo transparente (PNG RGBA)."""
+
+    fig = go.Figure()
+    fig.update_layout(
+        images=[dict(
+            source=logo_source or LOGO_URL,
+            xref="paper",
+            yref="paper",
+            x=0,
+            y=1,
+            sizex=0.40,
+            sizey=0.20,
+            sizing="contain",
+            opacity=1.0,
+        )],
+        xaxis=dict(visible=False),
+        yaxis=dict(visible=False),
+        paper_bgcolor="rgba(0,0,0,0)",
+        plot_bgcolor="rgba(0,0,0,0)",
+        margin=dict(l=10, r=10, t=10, b=10),
+        width=720,
+        height=640
+    )
+    fig.write_image(frame_name, scale=scale)
@@ -318,6 +318,55 @@ def order_trace_list_by_distance(trace_list,plot_channel):
 
     return trace_by_distance
 
+def get_nearest_waveforms(fdsn_client, station_list_sorted, origin_time, n_stations, channel="?HZ",
+                          seconds_before=10, seconds_after=120):
+    """
+    Get the waveforms of the n nearest stations with one bulk request.
+
+    :param obspy.fdsn.client fdsn_client: client to connect to a FDSN server
+    :param list station_list_sorted: station dicts (``station_id``, ``latitude``, ``longitude``,
+        ``distance``) ordered by distance, see :func:`attach_distance_dict`
+    :param obspy.UTCDateTime origin_time: origin time of the event
+    :param int n_stations: number of stations to request
+    :param string channel: channel code, wildcards allowed; if a station returns several
+        channels, the one with most samples is kept
+    :returns list of traces ordered by distance, with coordinates and distance attached
+    :raises Exception e: Log if the request fails
+    """
+    stations = station_list_sorted[:int(n_stations)]
+    bulk = []
+    for station in stations:
+        network, station_code = station["station_id"].split(".")[:2]
+        bulk.append((network, station_code, "*", channel,
+                     origin_time - seconds_before, origin_time + seconds_after))
+
+    logging.info(f"Request waveforms of {len(bulk)} stations in one bulk request")
+    try:
+        stream = fdsn_client.get_waveforms_bulk(bulk)
+    except Exception as e:
+        logging.info(f"Error getting waveforms: {e}")
+        raise Exception(f"Error getting waveforms: {e}")
+    stream.merge(fill_value=0)
+
+    trace_list = []
+    for station in stations:
+        network, station_code = station["station_id"].split(".")[:2]
+        # el mismo código de estación puede existir en otra red
+        traces = [tr for tr in stream if tr.stats.network == network and tr.stats.station == station_code]
+        if not traces:
+            continue
+        trace = max(traces, key=lambda tr: tr.stats.npts)
+        trace.stats.coordinates = AttribDict({
+            'latitude': station["latitude"],
+            'longitude': station["longitude"],
+            'elevation': station.get("elevation"),
+        })
+        trace.stats['distance'] = station["distance"]
+        trace_list.append(trace)
+
+    return trace_list
+
+
 def status(stat):
     """
     Take an ``stat`` string and return the same stat string with reassigned value.
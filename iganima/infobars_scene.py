@@ -1,6 +1,7 @@
 from manim import *
 from PIL import Image
 import os
+import time
 
 
 class InfoBarsScene(Scene):
@@ -9,11 +10,15 @@ class InfoBarsScene(Scene):
     usando Manim. Guarda los frames como imágenes PNG.
     """
 
-    def __init__(self, event_info, output_dir="frames_info", n_frames=20, **kwargs):
+    def __init__(self, event_info, output_dir="frames_info", n_frames=20, on_frame=None, growth=None, **kwargs):
         super().__init__(**kwargs)
         self.event_info = event_info
         self.output_dir = output_dir
         self.n_frames = n_frames
+        # growth: crecimiento (0, 1] de las barras en cada frame; por defecto (i + 1) / n_frames
+        self.growth = list(growth) if growth is not None else [(i + 1) / n_frames for i in range(n_frames)]
+        # on_frame(segundos): llamado después de guardar cada frame (progreso del render)
+        self.on_frame = on_frame
 
         os.makedirs(output_dir, exist_ok=True)
 
@@ -82,9 +87,10 @@ class InfoBarsScene(Scene):
         target_widths = [8, 10, 10, 6, 8, 6]
         animate_masks = [False,True, False, True,False,True]
         for i in range(N):
+            frame_start = time.perf_counter()
             for idx, bar in enumerate(bars):
                 if animate_masks[idx]:
-                    w = 0.1 + (target_widths[idx] - 0.1) * (i + 1) / N
+                    w = 0.1 + (target_widths[idx] - 0.1) * self.growth[i]
                 else:
                     w = target_widths[idx]
 
@@ -103,6 +109,8 @@ class InfoBarsScene(Scene):
             frame = self.renderer.get_frame()
             img = Image.fromarray(frame)
             img.save(os.path.join(self.output_dir, f"info_{i:03}.png"))
+            if self.on_frame:
+                self.on_frame(time.perf_counter() - frame_start)
 
     def generate_frames(self):
         """Configura parámetros y ejecuta el renderizado."""
@@ -0,0 +1,209 @@
+"""
+Keyframe rendering of the map animation.
+
+Instead of one Mapbox/Kaleido render per output frame, only K basemaps
+(no traces, no logo) are rendered along the zoom-in. Every output frame is
+then built locally:
+
+- the basemap of the closest keyframe with a lower zoom is scaled about the
+  epicentre (the map centre) to the zoom of that frame (Web Mercator: one
+  zoom level = a factor 2);
+- the epicentre marker, the growing circles and the epicentral zone are
+  drawn analytically at the exact time of the frame, with the same geometry
+  as ``render_map_frames``;
+- the logo, rendered once on a transparent layer, is blended on top.
+
+So a 25-30 fps map phase costs about K map renders.
+"""
+
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+
+# Encuadre de save_frame (plotly): figura 720x640, márgenes de 10 px, mapa centrado en el epicentro
+FIG_WIDTH = 720
+FIG_HEIGHT = 640
+MARGIN = 10
+# mapbox-gl: el mundo mide 512 * 2**zoom píxeles
+TILE_SIZE = 512
+
+ZOOM_START = 4.5
+ZOOM_END = 9.5
+
+# Ondas crecientes: radio (grados) = t * escala
+WAVE_SCALES = (0.1, 0.07, 0.05)
+WAVE_POINTS = 100
+
+EPICENTRAL_RADIUS_KM = 7
+EARTH_RADIUS_KM = 6371
+
+# Colores BGR (CSS "green" y "red")
+MARKER_COLOR = (0, 128, 0)
+WAVE_COLOR = (0, 0, 255)
+
+
+def map_zoom(t, frames_number):
+    """Zoom of the map at (possibly fractional) frame time t."""
+    return ZOOM_START + (ZOOM_END - ZOOM_START) * (t / frames_number)
+
+
+def keyframe_times(frames_number, keyframes):
+    """Frame times of the K keyframes, evenly spread over [0, frames_number - 1]."""
+    return np.linspace(0.0, frames_number - 1, max(2, int(keyframes)))
+
+
+def keyframe_supersample(frames_number, keyframes, limit=2.0):
+    """
+    Render scale of the keyframes relative to the output, so that the zoom
+    between two keyframes is done by shrinking rather than enlarging.
+    """
+    times = keyframe_times(frames_number, keyframes)
+    step = map_zoom(times[1], frames_number) - map_zoom(times[0], frames_number)
+    return float(min(limit, 2.0 ** step))
+
+
+def _mercator_y(lat):
+    return np.log(np.tan(np.pi / 4 + np.radians(lat) / 2))
+
+
+def project(lat, lon, lat0, lon0, zoom, scale=1.0):
+    """
+    Pixel coordinates in a frame centred on (lat0, lon0) at zoom.
+
+    :returns: tuple: (x, y) numpy arrays in the pixels of a frame rendered with scale
+    """
+    world = TILE_SIZE * 2.0 ** zoom * scale
+    x = (np.asarray(lon, dtype=float) - lon0) / 360.0 * world
+    y = -(_mercator_y(np.asarray(lat, dtype=float)) - _mercator_y(lat0)) / (2 * np.pi) * world
+    return FIG_WIDTH / 2 * scale + x, FIG_HEIGHT / 2 * scale + y
+
+
+def epicentral_zone(lat0, lon0, radius_km=EPICENTRAL_RADIUS_KM, points=100):
+    """Geodesic circle of radius_km around the epicentre, as in ``save_frame``."""
+    angle = 2 * np.pi * np.arange(points) / points
+    d = radius_km / EARTH_RADIUS_KM
+    phi0, lam0 = math.radians(lat0), math.radians(lon0)
+    lat = np.arcsin(math.sin(phi0) * math.cos(d) + math.cos(phi0) * math.sin(d) * np.cos(angle))
+    lon = lam0 + np.arctan2(np.sin(angle) * math.sin(d) * math.cos(phi0),
+                            math.cos(d) - math.sin(phi0) * np.sin(lat))
+    return np.degrees(lat), np.degrees(lon)
+
+
+def _polyline(lat, lon, lat0, lon0, zoom, scale):
+    x, y = project(lat, lon, lat0, lon0, zoom, scale)
+    # coordenadas en punto fijo (4 bits) para el antialiasing de OpenCV
+    return np.round(np.stack([x, y], axis=1) * 16).astype(np.int32)
+
+
+def draw_overlays(frame, t, lat0, lon0, zoom, scale, zone=None):
+    """
+    Draw marker, growing circles and epicentral zone of time t on frame (BGR, in place).
+    """
+    # ondas crecientes
+    theta = np.linspace(0, 2 * np.pi, WAVE_POINTS)
+    thickness = max(1, int(round(2 * scale)))
+    for s in WAVE_SCALES:
+        radius = t * s
+        if radius <= 0:
+            continue
+        pts = _polyline(lat0 + radius * np.sin(theta), lon0 + radius * np.cos(theta), lat0, lon0, zoom, scale)
+        cv2.polylines(frame, [pts], False, WAVE_COLOR, thickness, cv2.LINE_AA, shift=4)
+
+    # marcador del epicentro
+    cx, cy = project(lat0, lon0, lat0, lon0, zoom, scale)
+    cv2.circle(frame, (int(round(float(cx) * 16)), int(round(float(cy) * 16))),
+               max(1, int(round(3 * scale * 16))), MARKER_COLOR, -1, cv2.LINE_AA, shift=4)
+
+    # zona epicentral: traza con opacity=0.3, relleno a la mitad de opacidad
+    zone_lat, zone_lon = zone if zone is not None else epicentral_zone(lat0, lon0)
+    pts = _polyline(zone_lat, zone_lon, lat0, lon0, zoom, scale)
+    x, y, w, h = cv2.boundingRect(pts >> 4)
+    x0, y0 = max(0, x - thickness), max(0, y - thickness)
+    x1 = min(frame.shape[1], x + w + thickness + 1)
+    y1 = min(frame.shape[0], y + h + thickness + 1)
+    if x1 <= x0 or y1 <= y0:
+        return
+    roi = frame[y0:y1, x0:x1]
+    offset = np.array([x0 * 16, y0 * 16], dtype=np.int32)
+    fill = roi.copy()
+    cv2.fillPoly(fill, [pts - offset], WAVE_COLOR, cv2.LINE_AA, shift=4)
+    roi[:] = cv2.addWeighted(fill, 0.15, roi, 0.85, 0)
+    line = roi.copy()
+    cv2.polylines(line, [pts - offset], True, WAVE_COLOR, thickness, cv2.LINE_AA, shift=4)
+    roi[:] = cv2.addWeighted(line, 0.3, roi, 0.7, 0)
+
+
+def _blend_rgba(frame, layer):
+    alpha = layer[:, :, 3:4].astype(np.float32) / 255.0
+    frame[:] = (layer[:, :, :3] * alpha + frame * (1.0 - alpha)).astype(np.uint8)
+
+
+def interpolate_map_frames(frames_out, keyframe_paths, overlay_path, lat0, lon0,
+                           frames_number, n_frames, scale=1.0, supersample=1.0, threads=1, on_frame=None):
+    """
+    Write ``map_<i>.png`` for n_frames output frames from the keyframe basemaps.
+
+    :param string frames_out: output directory
+    :param list keyframe_paths: basemaps rendered at :func:`keyframe_times` with scale * supersample
+    :param string overlay_path: RGBA logo layer rendered with scale (``save_overlay_frame``)
+    :param float lat0: epicentre latitude (map centre)
+    :param float lon0: epicentre longitude (map centre)
+    :param int frames_number: length of the animation timeline (circles and zoom), in original frames
+    :param int n_frames: number of output frames spread over that timeline
+    :param float scale: image scale of the output frames (1 = 720x640)
+    :param float supersample: extra scale of the keyframes
+    :param int threads: worker threads
+    :param on_frame: called with the seconds spent on each frame once it is written (from the worker threads)
+    :returns: list: paths of the written frames
+    """
+    times = keyframe_times(frames_number, len(keyframe_paths))
+    zooms = [map_zoom(t, frames_number) for t in times]
+    width, height = int(round(FIG_WIDTH * scale)), int(round(FIG_HEIGHT * scale))
+    margin = int(round(MARGIN * scale))
+    out_c = np.array([FIG_WIDTH / 2 * scale, FIG_HEIGHT / 2 * scale])
+    key_c = out_c * supersample
+
+    keys = []
+    for path in keyframe_paths:
+        img = cv2.imread(path, cv2.IMREAD_COLOR)
+        if img is None:
+            raise FileNotFoundError(f"Could not read keyframe {path}")
+        keys.append(img)
+    overlay = cv2.imread(overlay_path, cv2.IMREAD_UNCHANGED)
+    if overlay is not None and overlay.shape[:2] != (height, width):
+        overlay = cv2.resize(overlay, (width, height), interpolation=cv2.INTER_AREA)
+    zone = epicentral_zone(lat0, lon0)
+
+    def _frame(i):
+        start = time.perf_counter()
+        t = i * (frames_number - 1) / max(n_frames - 1, 1)
+        zoom = map_zoom(t, frames_number)
+        k = min(int(np.searchsorted(times, t, side="right")) - 1, len(keys) - 1)
+        k = max(k, 0)
+        s = 2.0 ** (zoom - zooms[k]) / supersample
+        m = np.array([[s, 0, out_c[0] - s * key_c[0]],
+                      [0, s, out_c[1] - s * key_c[1]]])
+        frame = cv2.warpAffine(keys[k], m, (width, height), flags=cv2.INTER_LINEAR,
+                               borderMode=cv2.BORDER_REPLICATE)
+        draw_overlays(frame, t, lat0, lon0, zoom, scale, zone=zone)
+        # márgenes del papel (blanco), como en plotly
+        frame[:margin] = 255
+        frame[height - margin:] = 255
+        frame[:, :margin] = 255
+        frame[:, width - margin:] = 255
+        if overlay is not None and overlay.shape[2] == 4:
+            _blend_rgba(frame, overlay)
+        path = f"{frames_out}/map_{i:03}.png"
+        cv2.imwrite(path, frame, [cv2.IMWRITE_PNG_COMPRESSION, 1])
+        if on_frame:
+            on_frame(time.perf_counter() - start)
+        return path
+
+    if threads > 1:
+        with ThreadPoolExecutor(max_workers=threads, thread_name_prefix="keyframes") as pool:
+            return list(pool.map(_frame, range(n_frames)))
+    return [_frame(i) for i in range(n_frames)]
@@ -0,0 +1,191 @@
+"""
+Memory usage of the render process.
+
+RSS is read from ``/proc/self/statm`` (Linux); the peak RSS comes from
+``getrusage``. On platforms without ``/proc`` the current RSS (and the
+available memory of the host) is None and only the peak is reported.
+
+The render also runs child processes (Kaleido's Chromium, ffmpeg), whose
+CPU and memory do not show up in the figures of this process:
+:func:`children_usage` adds the live descendants, read from ``/proc``, to
+the children already waited for (``os.times`` / ``RUSAGE_CHILDREN``). The
+descendants are found by walking ``/proc/<pid>/task/*/children`` from this
+process; on kernels without those files, the known descendants are cached
+and the whole of ``/proc`` is listed only every DESCENDANT_RESCAN_SECONDS.
+"""
+
+import os
+import sys
+import resource
+import threading
+import time
+import tracemalloc
+
+
+MB = 1024 * 1024
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+_CLK_TCK = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+
+class MemoryLimitExceeded(MemoryError):
+    """The render went over its memory ceiling (``memory_limit_mb``)."""
+
+
+def current_rss_mb():
+    """
+    Resident set size of this process.
+
+    :returns: float: MB, or None if it cannot be read
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE / MB
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def available_memory_mb():
+    """
+    Memory the host can give to new processes without swapping (``MemAvailable``).
+
+    :returns: float: MB, or None if it cannot be read
+    """
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, in MB."""
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux lo reporta en KB, macOS en bytes
+    return maxrss / MB if sys.platform == "darwin" else maxrss / 1024
+
+
+# Descendientes conocidos cuando el kernel no tiene /proc/<pid>/task/<tid>/children:
+# se releen en cada llamada y /proc se recorre entero sólo cada DESCENDANT_RESCAN_SECONDS.
+DESCENDANT_RESCAN_SECONDS = 10.0
+_DESCENDANTS = {"pids": set(), "scanned_at": None}
+_DESCENDANTS_LOCK = threading.Lock()
+
+
+def _proc_stat(pid):
+    """(ppid, CPU ticks, RSS pages) of pid from /proc/<pid>/stat, None if it is gone."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            data = f.read()
+        # los campos siguen al nombre del ejecutable, que puede contener espacios y paréntesis
+        fields = data[data.rindex(")") + 2:].split()
+        return int(fields[1]), int(fields[11]) + int(fields[12]), int(fields[21])
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _children_files(pid):
+    """Child pids of pid from /proc/<pid>/task/*/children; None if the kernel does not provide them."""
+    try:
+        tasks = os.listdir(f"/proc/{pid}/task")
+    except OSError:
+        return []
+    children = []
+    for tid in tasks:
+        try:
+            with open(f"/proc/{pid}/task/{tid}/children") as f:
+                children.extend(int(c) for c in f.read().split())
+        except FileNotFoundError:
+            if pid == os.getpid():
+                return None
+        except (OSError, ValueError):
+            continue
+    return children
+
+
+def _scan_descendants(root):
+    """Descendant pids of root, listing every process of the host (fallback)."""
+    children = {}
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            stat = _proc_stat(entry)
+            if stat:
+                children.setdefault(stat[0], []).append(int(entry))
+    found, pending = set(), list(children.get(root, []))
+    while pending:
+        pid = pending.pop()
+        found.add(pid)
+        pending.extend(children.get(pid, []))
+    return found
+
+
+def _live_descendants():
+    """CPU seconds and RSS (MB) summed over the live descendants of this process, from /proc."""
+    root = os.getpid()
+    cpu_ticks = rss_pages = 0
+
+    pending = _children_files(root)
+    if pending is not None:
+        # recorrido sólo del árbol del proceso
+        while pending:
+            pid = pending.pop()
+            stat = _proc_stat(pid)
+            if stat:
+                cpu_ticks += stat[1]
+                rss_pages += stat[2]
+                pending.extend(_children_files(pid) or [])
+        return cpu_ticks / _CLK_TCK, rss_pages * _PAGE_SIZE / MB
+
+    with _DESCENDANTS_LOCK:
+        now = time.monotonic()
+        scanned_at = _DESCENDANTS["scanned_at"]
+        try:
+            if scanned_at is None or now - scanned_at >= DESCENDANT_RESCAN_SECONDS:
+                _DESCENDANTS["pids"] = _scan_descendants(root)
+                _DESCENDANTS["scanned_at"] = now
+        except OSError:
+            return 0.0, 0.0
+        known = _DESCENDANTS["pids"]
+        for pid in list(known):
+            stat = _proc_stat(pid)
+            # un pid terminado (o reutilizado por otro proceso) deja de contarse
+            if stat is None or (stat[0] != root and stat[0] not in known):
+                known.discard(pid)
+                continue
+            cpu_ticks += stat[1]
+            rss_pages += stat[2]
+    return cpu_ticks / _CLK_TCK, rss_pages * _PAGE_SIZE / MB
+
+
+def children_usage():
+    """
+    CPU and memory of the child processes of this process.
+
+    :returns: tuple: (CPU seconds of the live and the finished children,
+        RSS in MB of the live children, peak RSS in MB of the largest
+        finished child)
+    """
+    live_cpu, live_rss = _live_descendants()
+    times = os.times()
+    maxrss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    reaped_peak = maxrss / MB if sys.platform == "darwin" else maxrss / 1024
+    return live_cpu + times.children_user + times.children_system, live_rss, reaped_peak
+
+
+def top_allocations(limit=3):
+    """
+    Source lines holding the most memory allocated by Python (tracemalloc must be tracing).
+
+    :returns: list: ``"file.py:123 45.6 MB"`` strings, largest first
+    """
+    snapshot = tracemalloc.take_snapshot().filter_traces(
+        (tracemalloc.Filter(False, tracemalloc.__file__),)
+    )
+    top = []
+    for stat in snapshot.statistics("lineno")[:limit]:
+        frame = stat.traceback[0]
+        top.append(f"{os.path.basename(frame.filename)}:{frame.lineno} {stat.size / MB:.1f} MB")
+    return top
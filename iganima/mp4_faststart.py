@@ -0,0 +1,120 @@
+"""
+Move the ``moov`` atom of an MP4 in front of ``mdat`` ("faststart").
+
+``cv2.VideoWriter`` writes the index (moov) at the end of the file, so a
+browser has to download the whole video before playback can start. This
+module rewrites the file with moov first and shifts the chunk offsets
+(stco/co64) accordingly. Pure Python, no ffmpeg required.
+"""
+
+import os
+import struct
+
+# Boxes that contain the stco/co64 tables somewhere below them.
+_CONTAINERS = {b"moov", b"trak", b"mdia", b"minf", b"stbl"}
+
+
+def _iter_boxes(data, start, end):
+    """Yield (type, box_start, header_size, box_end) for boxes in data[start:end]."""
+    pos = start
+    while pos + 8 <= end:
+        size, box_type = struct.unpack(">I4s", data[pos:pos + 8])
+        header = 8
+        if size == 1:
+            size = struct.unpack(">Q", data[pos + 8:pos + 16])[0]
+            header = 16
+        elif size == 0:
+            size = end - pos
+        if size < header or pos + size > end:
+            raise ValueError(f"corrupted box {box_type!r} at offset {pos}")
+        yield box_type, pos, header, pos + size
+        pos += size
+
+
+def _top_level_boxes(f):
+    """List of (type, offset, size) for the top-level boxes of an open file."""
+    boxes = []
+    f.seek(0, os.SEEK_END)
+    file_size = f.tell()
+    pos = 0
+    while pos + 8 <= file_size:
+        f.seek(pos)
+        size, box_type = struct.unpack(">I4s", f.read(8))
+        if size == 1:
+            size = struct.unpack(">Q", f.read(8))[0]
+        elif size == 0:
+            size = file_size - pos
+        if size < 8 or pos + size > file_size:
+            raise ValueError(f"corrupted box {box_type!r} at offset {pos}")
+        boxes.append((box_type, pos, size))
+        pos += size
+    return boxes
+
+
+def _shift_chunk_offsets(moov, start, end, delta):
+    """Add delta to every stco/co64 entry found below moov[start:end] (in place)."""
+    for box_type, box_start, header, box_end in _iter_boxes(moov, start, end):
+        if box_type in _CONTAINERS:
+            _shift_chunk_offsets(moov, box_start + header, box_end, delta)
+        elif box_type in (b"stco", b"co64"):
+            # version/flags (4) + entry_count (4), then the offsets
+            table = box_start + header + 4
+            count = struct.unpack(">I", moov[table:table + 4])[0]
+            pos = table + 4
+            if box_type == b"stco":
+                for _ in range(count):
+                    offset = struct.unpack(">I", moov[pos:pos + 4])[0] + delta
+                    if offset > 0xFFFFFFFF:
+                        raise OverflowError("stco offset overflow")
+                    moov[pos:pos + 4] = struct.pack(">I", offset)
+                    pos += 4
+            else:
+                for _ in range(count):
+                    offset = struct.unpack(">Q", moov[pos:pos + 8])[0] + delta
+                    moov[pos:pos + 8] = struct.pack(">Q", offset)
+                    pos += 8
+
+
+def relocate_moov(path, chunk_size=1 << 20):
+    """
+    Rewrite the MP4 at path with the moov atom before mdat.
+
+    :param string path: MP4 file, replaced atomically
+    :returns: bool: True if the file was rewritten, False if it already was faststart
+    :raises ValueError: if the file is not a well-formed MP4
+    :raises OverflowError: if shifted offsets do not fit in a 32-bit stco table
+    """
+    with open(path, "rb") as f:
+        boxes = _top_level_boxes(f)
+        types = [b[0] for b in boxes]
+        if b"moov" not in types or b"mdat" not in types:
+            raise ValueError("not an MP4 with moov and mdat boxes")
+
+        moov_index = types.index(b"moov")
+        mdat_index = types.index(b"mdat")
+        if moov_index < mdat_index:
+            return False
+
+        _, moov_offset, moov_size = boxes[moov_index]
+        f.seek(moov_offset)
+        moov = bytearray(f.read(moov_size))
+        _shift_chunk_offsets(moov, 0, len(moov), moov_size)
+
+        tmp_path = f"{path}.faststart.tmp"
+        with open(tmp_path, "wb") as out:
+            for i, (box_type, offset, size) in enumerate(boxes):
+                if i == mdat_index:
+                    out.write(moov)
+                if i == moov_index:
+                    continue
+                f.seek(offset)
+                remaining = size
+                while remaining > 0:
+                    chunk = f.read(min(chunk_size, remaining))
+                    if not chunk:
+                        break
+                    out.write(chunk)
+                    remaining -= len(chunk)
+
+    os.replace(tmp_path, path)
+    return True
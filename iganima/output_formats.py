@@ -0,0 +1,48 @@
+"""
+Output formats of a render.
+
+Kept apart from :mod:`iganima.encoders` so the API can validate the formats of
+a ticket without importing OpenCV or PIL.
+"""
+
+# formato -> extensión del archivo
+OUTPUT_FORMATS = {
+    "mp4": ".mp4",
+    "webm": ".webm",
+    "gif": ".gif",
+    "jpg": ".jpg",
+}
+
+# El MP4 siempre se genera: es el video de /tickets/<id>/video y de la caché de renders.
+DEFAULT_OUTPUTS = ("mp4",)
+
+MEDIA_TYPES = {
+    "mp4": "video/mp4",
+    "webm": "video/webm",
+    "gif": "image/gif",
+    "jpg": "image/jpeg",
+}
+
+
+def parse_outputs(value):
+    """
+    Normalize a list of output formats.
+
+    :param value: comma separated string (``"mp4,gif"``), iterable of formats or None
+    :returns: tuple: known formats in :data:`OUTPUT_FORMATS` order, always including ``mp4``
+    :raises ValueError: for unknown formats
+    """
+    if not value:
+        return DEFAULT_OUTPUTS
+    if isinstance(value, str):
+        value = value.split(",")
+    requested = {v.strip().lower() for v in value if v and v.strip()}
+    if "jpeg" in requested:
+        requested.discard("jpeg")
+        requested.add("jpg")
+    unknown = requested - set(OUTPUT_FORMATS)
+    if unknown:
+        raise ValueError(f"unknown output formats: {', '.join(sorted(unknown))}; "
+                         f"expected some of {', '.join(OUTPUT_FORMATS)}")
+    requested.update(DEFAULT_OUTPUTS)
+    return tuple(f for f in OUTPUT_FORMATS if f in requested)
@@ -0,0 +1,115 @@
+"""
+CPU profile of one render with cProfile.
+
+:func:`cpu_profile` profiles the block (the calling thread; the compositor
+and encoder threads show up as the time the main thread waits for them) and
+writes two files into a directory:
+
+- ``profile.pstats``: the raw statistics, for ``python -m pstats`` or snakeviz;
+- ``profile.collapsed.txt``: collapsed stacks (``a;b;c <microseconds>`` per
+  line), for flamegraph.pl, speedscope or inferno.
+
+cProfile records caller/callee pairs, not full stacks, so the collapsed
+stacks are rebuilt by walking the call graph from its roots and splitting
+the time of every function among its callers in proportion to the time of
+each call edge.
+"""
+
+import os
+import cProfile
+import logging
+import pstats
+from contextlib import contextmanager
+
+
+logger = logging.getLogger(__name__)
+
+PROFILE_FILES = {
+    "pstats": "profile.pstats",
+    "collapsed": "profile.collapsed.txt",
+}
+
+# Caminos con menos tiempo que esto (segundos) no se expanden en el grafo
+_MIN_SECONDS = 1e-4
+_MAX_DEPTH = 200
+
+
+@contextmanager
+def cpu_profile(output_dir):
+    """
+    Profile the block and write :data:`PROFILE_FILES` into output_dir, also
+    when the block raises.
+
+    :param string output_dir: destination directory (the ticket directory)
+    """
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        try:
+            os.makedirs(output_dir, exist_ok=True)
+            profiler.dump_stats(os.path.join(output_dir, PROFILE_FILES["pstats"]))
+            write_collapsed(pstats.Stats(profiler), os.path.join(output_dir, PROFILE_FILES["collapsed"]))
+            logger.info(f"CPU profile written to {output_dir}")
+        except Exception as e:
+            # El perfil es opcional: un error al escribirlo no debe ocultar el resultado del render
+            logger.warning(f"Could not write the CPU profile: {e}")
+
+
+def _label(func):
+    filename, line, name = func
+    if filename == "~":
+        label = name  # funciones built-in: "<built-in method ...>"
+    else:
+        label = f"{os.path.basename(filename)}:{name}:{line}"
+    return label.replace(";", ",").replace(" ", "_")
+
+
+def collapsed_stacks(stats):
+    """
+    Collapsed stacks of a cProfile run.
+
+    :param pstats.Stats stats: profile statistics
+    :returns: dict: {"root;...;leaf": microseconds of own time}
+    """
+    raw = stats.stats
+    children = {}
+    for func, (_, _, _, _, callers) in raw.items():
+        for caller, edge in callers.items():
+            # edge: (cc, nc, tt, ct) de las llamadas de caller a func
+            children.setdefault(caller, []).append((func, edge[3]))
+
+    stacks = {}
+
+    def walk(func, path, labels, scale):
+        _, _, tt, ct, _ = raw[func]
+        labels = labels + [_label(func)]
+        own = tt * scale
+        if own > 0:
+            key = ";".join(labels)
+            stacks[key] = stacks.get(key, 0.0) + own
+        if len(labels) >= _MAX_DEPTH:
+            return
+        for child, edge_ct in children.get(func, ()):
+            child_ct = raw[child][3]
+            share = scale * edge_ct
+            if child in path or child_ct <= 0 or share < _MIN_SECONDS:
+                continue
+            walk(child, path | {child}, labels, min(1.0, share / child_ct))
+
+    roots = [f for f, (_, _, _, _, callers) in raw.items() if not callers]
+    for root in roots:
+        walk(root, {root}, [], 1.0)
+    return {k: int(round(v * 1e6)) for k, v in stacks.items() if v * 1e6 >= 1}
+
+
+def write_collapsed(stats, path):
+    """Write :func:`collapsed_stacks` as ``stack microseconds`` lines, heaviest first."""
+    stacks = collapsed_stacks(stats)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for stack, us in sorted(stacks.items(), key=lambda kv: -kv[1]):
+            f.write(f"{stack} {us}\n")
+    os.replace(tmp_path, path)
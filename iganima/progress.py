@@ -0,0 +1,246 @@
+"""
+Per-stage timings and live progress of one render.
+
+:class:`JobProgress` records how long each pipeline stage takes, per-frame
+statistics (min/avg/max seconds) for the stages that render frame by frame,
+and the frames done out of the total of the running stage. The state is
+mirrored to a JSON file (written atomically, at most every ``min_interval``
+seconds while frames advance) that the ticket service reads while the job
+runs in another process. Without a path it only keeps the data in memory.
+
+The CPU time of the whole process (all threads) and of its child processes
+(Kaleido's Chromium, ffmpeg) is kept in ``cpu_seconds``, and the peak RSS of
+the process plus that of the children (``children_rss_peak_mb``, the live
+ones sampled every time the state is written) in ``rss_peak_mb``; both feed
+the admission control. Memory is also accounted per stage, for this process: the RSS at the end of the stage and its
+peak (exact when the process peak grew during the stage, otherwise the
+highest RSS sampled at every frame), and, with ``trace_memory``, the
+tracemalloc peak of Python allocations and the lines holding the most
+memory. With ``memory_limit_mb`` the render fails fast with
+:class:`memory.MemoryLimitExceeded` as soon as the RSS sampled at a frame or
+stage boundary is over the ceiling.
+
+With ``cancel_path`` the render is cancelled from outside: once that file
+exists, the next stage boundary (or frame, checked every ``min_interval``
+seconds) raises :class:`JobCancelled`, so the process stops and frees its CPU.
+
+State written::
+
+    {"stage": "map", "frames_done": 12, "frames_total": 20, "rss_peak_mb": 842.4, "cpu_seconds": 21.7,
+     "children_rss_peak_mb": 230.0, "children_cpu_seconds": 7.5, "memory_limit_mb": 2048, "error": null, "memory_limit_exceeded": false,
+     "stages": {"event": {"seconds": 0.41, "rss_mb": 402.1, "rss_peak_mb": 402.3},
+                "map": {"seconds": 9.8, "frames": 12, "frame_min": 0.7,
+                        "frame_avg": 0.8, "frame_max": 1.1, "rss_mb": 598.0,
+                        "rss_peak_mb": 612.4, "py_peak_mb": 88.2,
+                        "py_top": ["keyframes.py:170 42.0 MB"]}}}
+"""
+
+import os
+import json
+import time
+import threading
+import tracemalloc
+from contextlib import contextmanager
+
+from iganima.memory import MemoryLimitExceeded, children_usage, current_rss_mb, peak_rss_mb, top_allocations, MB
+
+
+class JobCancelled(Exception):
+    """The render was cancelled from outside (its ``cancel_path`` exists), e.g. superseded by a newer revision."""
+
+
+class JobProgress:
+
+    def __init__(self, path=None, min_interval=0.5, memory_limit_mb=None, trace_memory=False, cancel_path=None):
+        self.path = path
+        self.min_interval = min_interval
+        self.memory_limit_mb = memory_limit_mb
+        self.trace_memory = trace_memory
+        self.cancel_path = cancel_path
+        self.stage = None
+        self.frames_done = 0
+        self.frames_total = None
+        self.stages = {}
+        self.error = None
+        self.memory_limit_exceeded = False
+        self._rss_max = 0.0
+        self._children_rss_max = 0.0
+        self._lock = threading.Lock()
+        self._last_write = 0.0
+        self._last_cancel_check = 0.0
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def track(self, stage, frames_total=None):
+        """
+        Time the block as stage. Stages run more than once add up.
+
+        :param string stage: stage name
+        :param int frames_total: frames the stage will render, for the progress
+        """
+        with self._lock:
+            self.stage = stage
+            self.frames_done = 0
+            self.frames_total = frames_total
+            self.stages.setdefault(stage, {"seconds": 0.0})
+            self._rss_max = 0.0
+        self.flush(force=True)
+        peak_start = peak_rss_mb()
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            self.check_cancelled(force=True)
+            self.check_memory()
+            yield self
+        except Exception as e:
+            with self._lock:
+                if self.error is None:
+                    self.error = f"{stage}: {e}"
+            raise
+        finally:
+            seconds = time.perf_counter() - start
+            rss = current_rss_mb()
+            peak_end = peak_rss_mb()
+            stage_peak = peak_end if peak_end > peak_start else max(self._rss_max, rss or 0.0)
+            py_peak = tracemalloc.get_traced_memory()[1] / MB if self.trace_memory else None
+            py_top = top_allocations() if self.trace_memory else None
+            with self._lock:
+                s = self.stages[stage]
+                s["seconds"] = round(s["seconds"] + seconds, 3)
+                if rss is not None:
+                    s["rss_mb"] = round(rss, 1)
+                s["rss_peak_mb"] = round(max(stage_peak, s.get("rss_peak_mb", 0.0)), 1)
+                if py_peak is not None:
+                    s["py_peak_mb"] = round(max(py_peak, s.get("py_peak_mb", 0.0)), 1)
+                    s["py_top"] = py_top
+            self.flush(force=True)
+
+    def check_memory(self):
+        """
+        Sample the RSS for the stage peak and enforce ``memory_limit_mb``.
+
+        :raises MemoryLimitExceeded: if the RSS is over the limit
+        """
+        rss = current_rss_mb()
+        if rss is None:
+            return
+        with self._lock:
+            self._rss_max = max(self._rss_max, rss)
+            stage = self.stage
+        if self.memory_limit_mb and rss > self.memory_limit_mb:
+            with self._lock:
+                self.memory_limit_exceeded = True
+            raise MemoryLimitExceeded(
+                f"render memory {rss:.0f} MB exceeds the limit of {self.memory_limit_mb} MB "
+                f"in stage {stage}"
+            )
+
+    def check_cancelled(self, force=False):
+        """
+        :raises JobCancelled: if ``cancel_path`` exists (looked up at most every
+            ``min_interval`` seconds unless force)
+        """
+        if not self.cancel_path:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_cancel_check < self.min_interval:
+            return
+        self._last_cancel_check = now
+        if os.path.exists(self.cancel_path):
+            raise JobCancelled(f"render cancelled in stage {self.stage}")
+
+    def mark(self, **values):
+        """Attach values to the running stage (e.g. ``cached=True`` when restored from the stage cache)."""
+        with self._lock:
+            if self.stage:
+                self.stages[self.stage].update(values)
+
+    def frame_done(self, seconds=None):
+        """
+        Count one frame of the running stage. Safe to call from worker threads.
+
+        :param float seconds: time spent on the frame, for the per-frame statistics
+        """
+        with self._lock:
+            self.frames_done += 1
+            if seconds is not None and self.stage:
+                s = self.stages[self.stage]
+                n = s.get("frames", 0)
+                s["frame_min"] = round(min(seconds, s.get("frame_min", seconds)), 4)
+                s["frame_max"] = round(max(seconds, s.get("frame_max", seconds)), 4)
+                s["frame_avg"] = round((s.get("frame_avg", 0.0) * n + seconds) / (n + 1), 4)
+                s["frames"] = n + 1
+        self.flush()
+        self.check_memory()
+        self.check_cancelled()
+
+    def iterate(self, items):
+        """Yield items, counting each one as a frame of the running stage (without timing)."""
+        for item in items:
+            yield item
+            self.frame_done()
+
+    @contextmanager
+    def frame(self):
+        """Time the block as one frame of the running stage."""
+        start = time.perf_counter()
+        yield
+        self.frame_done(time.perf_counter() - start)
+
+    def to_dict(self):
+        children_cpu, children_rss, children_reaped_peak = children_usage()
+        with self._lock:
+            self._children_rss_max = max(self._children_rss_max, children_rss, children_reaped_peak)
+            return {
+                "stage": self.stage,
+                "frames_done": self.frames_done,
+                "frames_total": self.frames_total,
+                "rss_peak_mb": round(peak_rss_mb() + self._children_rss_max, 1),
+                "cpu_seconds": round(time.process_time() + children_cpu, 2),
+                "children_rss_peak_mb": round(self._children_rss_max, 1),
+                "children_cpu_seconds": round(children_cpu, 2),
+                "memory_limit_mb": self.memory_limit_mb,
+                "error": self.error,
+                "memory_limit_exceeded": self.memory_limit_exceeded,
+                "stages": {k: dict(v) for k, v in self.stages.items()},
+            }
+
+    def finish(self):
+        """Mark the render as finished and write the final state."""
+        with self._lock:
+            self.stage = None
+            self.frames_done = 0
+            self.frames_total = None
+        self.flush(force=True)
+
+    def flush(self, force=False):
+        if not self.path:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_write < self.min_interval:
+            return
+        self._last_write = now
+        data = self.to_dict()
+        tmp_path = f"{self.path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            # El progreso es informativo: nunca debe hacer fallar el render
+            pass
+
+
+def read_progress(path):
+    """
+    State written by :class:`JobProgress`.
+
+    :returns: dict, or None if the file does not exist or is being replaced
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
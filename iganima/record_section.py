@@ -0,0 +1,120 @@
+"""
+Record-section panel: real seismograms of the stations nearest to the
+epicentre, one row per station ordered by distance, revealed along the time
+axis as the panel plays.
+
+Each trace is reduced once to display resolution (:mod:`iganima.decimate`)
+and projected to pixel coordinates for the whole panel, so a frame only
+draws the prefix of each polyline up to the time cursor: a 100 Hz trace
+adds a few hundred points per frame instead of thousands of samples.
+"""
+
+import cv2
+import numpy as np
+
+from iganima import iganima_utils as u
+from iganima.decimate import decimate
+
+
+# Colores BGR
+BACKGROUND = (255, 255, 255)
+TRACE_COLOR = (70, 70, 70)
+CURSOR_COLOR = (0, 0, 255)
+TEXT_COLOR = (0, 0, 0)
+
+MARGIN_LEFT = 150
+MARGIN = 40
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+
+
+def nearest_stations(event, inventory, n_stations):
+    """
+    The n stations of the inventory nearest to the preferred origin of event.
+
+    :param obspy.event event: obspy event object
+    :param obspy.Inventory inventory: station inventory
+    :returns list of station dicts (see :func:`iganima_utils.create_stations_dict`) with distance, ordered by it
+    """
+    station_set = {f"{net.code}.{sta.code}" for net in inventory for sta in net}
+    _, stations_list = u.create_stations_dict(station_set, inventory)
+    stations_list = [u.attach_distance_dict(station, event) for station in stations_list]
+    return sorted(stations_list, key=lambda x: x['distance'])[:int(n_stations)]
+
+
+def record_section_geometry(traces, origin_time, points=400, method="minmax"):
+    """
+    Display geometry of the traces, computed once for the whole panel.
+
+    :param list traces: obspy traces ordered by distance, with ``distance`` in the stats
+        (see :func:`iganima_utils.get_nearest_waveforms`)
+    :param obspy.UTCDateTime origin_time: origin time of the event
+    :param int points: points per trace after decimation
+    :param string method: ``minmax`` or ``lttb``, see :mod:`iganima.decimate`
+    :returns: dict: ``times`` (seconds from the origin) and ``amplitude``
+        (normalised to [-1, 1]) per trace, ``labels`` and ``distance_km``
+    """
+    times = []
+    amplitude = []
+    for trace in traces:
+        data = trace.data.astype(float)
+        data -= data.mean()
+        t = (trace.stats.starttime - origin_time) + np.arange(trace.stats.npts) * trace.stats.delta
+        x, y = decimate(t, data, points, method)
+        peak = np.abs(data).max() or 1.0
+        times.append(x)
+        amplitude.append(y / peak)
+    return {
+        "times": times,
+        "amplitude": amplitude,
+        "labels": [trace.stats.station for trace in traces],
+        "distance_km": np.array([trace.stats.distance / 1000.0 for trace in traces]),
+    }
+
+
+def _background(geometry, width, height, t0, t1):
+    frame = np.empty((height, width, 3), dtype=np.uint8)
+    frame[:] = BACKGROUND
+    n = len(geometry["labels"])
+    row = (height - 2 * MARGIN) / max(n, 1)
+    for i, (label, distance) in enumerate(zip(geometry["labels"], geometry["distance_km"])):
+        y = int(MARGIN + (i + 0.5) * row)
+        cv2.putText(frame, f"{label} {distance:.0f} km", (10, y + 5), FONT, 0.45, TEXT_COLOR, 1, cv2.LINE_AA)
+    cv2.putText(frame, f"{t0:.0f} s", (MARGIN_LEFT, height - 12), FONT, 0.45, TEXT_COLOR, 1, cv2.LINE_AA)
+    cv2.putText(frame, f"{t1:.0f} s", (width - MARGIN - 40, height - 12), FONT, 0.45, TEXT_COLOR, 1, cv2.LINE_AA)
+    return frame
+
+
+def record_section_frames(geometry, n_frames, width, height):
+    """
+    Frames of the panel, with the time cursor moving from the first to the
+    last sample over n_frames.
+
+    :param dict geometry: result of :func:`record_section_geometry`
+    :returns: generator of (height, width, 3) uint8 BGR frames
+    """
+    times = geometry["times"]
+    if not times:
+        return
+    t0 = min(float(t[0]) for t in times)
+    t1 = max(float(t[-1]) for t in times)
+    span = (t1 - t0) or 1.0
+    row = (height - 2 * MARGIN) / len(times)
+    plot_width = width - MARGIN_LEFT - MARGIN
+
+    # coordenadas en punto fijo (4 bits) para el antialiasing de OpenCV, calculadas una vez
+    polylines = []
+    for i, (t, a) in enumerate(zip(times, geometry["amplitude"])):
+        x = MARGIN_LEFT + (t - t0) / span * plot_width
+        y = MARGIN + (i + 0.5) * row - a * 0.45 * row
+        polylines.append(np.round(np.stack([x, y], axis=1) * 16).astype(np.int32))
+
+    background = _background(geometry, width, height, t0, t1)
+    for cursor in np.linspace(t0, t1, max(1, int(n_frames))):
+        frame = background.copy()
+        for t, pts in zip(times, polylines):
+            k = int(np.searchsorted(t, cursor, side="right"))
+            if k >= 2:
+                cv2.polylines(frame, [pts[:k]], False, TRACE_COLOR, 1, cv2.LINE_AA, shift=4)
+        x = int(MARGIN_LEFT + (cursor - t0) / span * plot_width)
+        cv2.line(frame, (x, MARGIN // 2), (x, height - MARGIN), CURSOR_COLOR, 1, cv2.LINE_AA)
+        yield frame
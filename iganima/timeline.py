@@ -0,0 +1,261 @@
+"""
+Declarative timeline of the station animation (``run_iganima.py``).
+
+The animation is a list of :class:`Phase` (name, number of frames, easing)
+instead of an if/elif ladder over the frame number. :meth:`Timeline.evaluate`
+resolves the phase, the frame within the phase and the eased progress of
+every frame at once, and :func:`station_intro_geometry` turns that into the
+geometry of all frames as NumPy arrays (frames x points):
+
+- the line through the epicentre that grows, becomes a seismic wave that
+  grows and shrinks, and shrinks back to the epicentre;
+- the growing circles around the epicentre (same geometry as
+  :func:`iganima_functions.generate_circle`) and the stations they reached.
+
+Rendering a frame is then just a row lookup; the Plotly builder is
+:func:`iganima_functions.create_timeline_frame`, any other backend can read the
+same arrays.
+"""
+
+import numpy as np
+
+
+EASINGS = {
+    "linear": lambda p: p,
+    "ease_in": lambda p: p * p,
+    "ease_out": lambda p: 1.0 - (1.0 - p) ** 2,
+    "ease_in_out": lambda p: 0.5 - 0.5 * np.cos(np.pi * p),
+}
+
+# Radio de los círculos (grados) = frames transcurridos * escala, como en create_circle_frames
+CIRCLE_SCALES = (0.1, 0.07, 0.05)
+
+
+class Phase:
+    """
+    One phase of the animation.
+
+    :param string name: phase name, see :func:`station_intro_geometry`
+    :param int frames: length in frames; None takes the frames left by the
+        other phases (at most one phase per timeline)
+    :param string easing: name in :data:`EASINGS` applied to the progress
+    :param int span: frames over which the progress goes from 0 to 1, defaults
+        to the length; a phase shorter than its span is cut before the end, a
+        longer one holds the last value
+    :param int offset: frames of the phase already elapsed when it is first
+        shown; negative to show the phase before its own start
+    """
+
+    def __init__(self, name, frames=None, easing="linear", span=None, offset=0):
+        if easing not in EASINGS:
+            raise ValueError(f"unknown easing {easing!r}, expected one of {sorted(EASINGS)}")
+        if frames is not None and int(frames) < 0:
+            raise ValueError(f"phase {name} has a negative length")
+        if span is not None and int(span) <= 0:
+            raise ValueError(f"phase {name} needs a positive span")
+        self.name = name
+        self.frames = None if frames is None else int(frames)
+        self.easing = easing
+        self.span = None if span is None else int(span)
+        self.offset = int(offset)
+
+    def __repr__(self):
+        return f"Phase({self.name!r}, {self.frames!r}, {self.easing!r}, {self.span!r}, {self.offset!r})"
+
+
+class TimelineFrames:
+    """
+    A timeline evaluated over n frames.
+
+    :ivar tuple names: phase names, indexed by ``phase``
+    :ivar numpy.ndarray phase: phase index of each frame (-1 past the last phase)
+    :ivar numpy.ndarray local: frame number within its phase, from offset + 1
+    :ivar numpy.ndarray progress: eased progress within its phase, in (0, 1]
+    """
+
+    def __init__(self, names, phase, local, progress):
+        self.names = names
+        self.phase = phase
+        self.local = local
+        self.progress = progress
+
+    def __len__(self):
+        return len(self.phase)
+
+    def mask(self, name):
+        """Boolean array of the frames in phase name."""
+        if name not in self.names:
+            return np.zeros(len(self), dtype=bool)
+        return self.phase == self.names.index(name)
+
+    def phase_names(self):
+        """Phase name of every frame (None past the last phase)."""
+        return [self.names[p] if p >= 0 else None for p in self.phase]
+
+
+class Timeline:
+    """Ordered list of phases."""
+
+    def __init__(self, phases):
+        self.phases = list(phases)
+        if sum(p.frames is None for p in self.phases) > 1:
+            raise ValueError("only one phase can take the remaining frames")
+
+    @classmethod
+    def from_spec(cls, spec):
+        """
+        Timeline from text, e.g. for the ``timeline`` key of the ini file:
+        ``point:3, line_grow:3:ease_out, ..., circles``.
+
+        :param string spec: comma separated ``name[:frames[:easing[:span[:offset]]]]``;
+            without frames (or ``*``) the phase takes the remaining frames
+        """
+        phases = []
+        for item in spec.split(","):
+            parts = [p.strip() for p in item.split(":")]
+            if not parts[0]:
+                continue
+            parts += [""] * (5 - len(parts))
+            phases.append(Phase(
+                parts[0],
+                parts[1] if parts[1] not in ("", "*") else None,
+                parts[2] or "linear",
+                parts[3] or None,
+                parts[4] or 0,
+            ))
+        return cls(phases)
+
+    def evaluate(self, frames_number):
+        """
+        Phase, frame within the phase and eased progress of each of frames_number frames.
+
+        :returns: TimelineFrames
+        """
+        fixed = sum(p.frames for p in self.phases if p.frames is not None)
+        remaining = max(0, frames_number - fixed)
+
+        phase = np.full(frames_number, -1, dtype=int)
+        local = np.zeros(frames_number, dtype=int)
+        progress = np.ones(frames_number, dtype=float)
+        start = 0
+        for k, p in enumerate(self.phases):
+            length = remaining if p.frames is None else p.frames
+            end = min(frames_number, start + length)
+            if end > start:
+                n = p.offset + np.arange(1, end - start + 1)
+                phase[start:end] = k
+                local[start:end] = n
+                span = p.span or length
+                progress[start:end] = EASINGS[p.easing](np.minimum(1.0, n / float(span)))
+            start += length
+        return TimelineFrames(tuple(p.name for p in self.phases), phase, local, progress)
+
+
+# La secuencia original de run_iganima.py, frame a frame: punto (t=1..3), línea que
+# crece (4..5), onda que crece hasta 0.8 (6..9, 4 de 5), onda completa (10), onda que
+# decrece hasta 0 (11..15), línea que se reduce hasta 40 puntos (16..18, 3 de 5) y
+# círculos hasta el final desde t=19, con t_circle = t - 20 (radio -1, 0, 1, ...).
+STATION_INTRO_TIMELINE = Timeline([
+    Phase("point", 3),
+    Phase("line_grow", 2),
+    Phase("wave_grow", 4, span=5),
+    Phase("wave_hold", 1),
+    Phase("wave_shrink", 5),
+    Phase("line_shrink", 3, span=5),
+    Phase("circles", offset=-2),
+])
+
+
+def seismic_waveform(points=100):
+    """Synthetic seismic wave (Gaussian-windowed sine) drawn along the line."""
+    t = np.linspace(-1, 1, points)
+    return np.exp(-t ** 2) * np.sin(13 * t)
+
+
+def line_wave_geometry(frames, event_latitude, event_longitude, vertical_scale, horizontal_scale=0.3, points=100):
+    """
+    Line / seismic wave through the epicentre for every frame.
+
+    Phases used: ``line_grow`` and ``line_shrink`` (visible length, centred on
+    the epicentre, truncated to whole points), ``wave_grow``, ``wave_hold``
+    and ``wave_shrink`` (wave amplitude). Points not drawn in a frame are NaN,
+    and so is the whole row outside these phases.
+
+    :param TimelineFrames frames: evaluated timeline
+    :returns: tuple: (lon, lat) arrays of shape (frames, points)
+    """
+    n = len(frames)
+    lon_total = np.linspace(event_longitude - horizontal_scale, event_longitude + horizontal_scale, points)
+    waveform = seismic_waveform(points)
+
+    length = np.zeros(n)
+    amplitude = np.zeros(n)
+    length[frames.mask("line_grow")] = frames.progress[frames.mask("line_grow")] * points
+    length[frames.mask("line_shrink")] = (1.0 - frames.progress[frames.mask("line_shrink")]) * points
+    # como int() en la secuencia original; el épsilon absorbe el redondeo de 0.6 * 100
+    length = np.floor(length + 1e-9)
+    hold = np.ones(n)
+    for name, amp in (("wave_grow", frames.progress), ("wave_hold", hold), ("wave_shrink", 1.0 - frames.progress)):
+        m = frames.mask(name)
+        length[m] = points
+        amplitude[m] = amp[m]
+
+    # tramo visible centrado en el epicentro
+    offset = np.abs(np.arange(points) - (points - 1) / 2.0)
+    visible = offset[None, :] <= np.maximum(length, 1.0)[:, None] / 2.0
+    visible &= (length > 0)[:, None]
+
+    lat = event_latitude + amplitude[:, None] * waveform[None, :] * vertical_scale
+    lon = np.broadcast_to(lon_total, (n, points)).copy()
+    lat[~visible] = np.nan
+    lon[~visible] = np.nan
+    return lon, lat
+
+
+def circle_geometry(radius, event_latitude, event_longitude, points=100):
+    """
+    Circles around the epicentre, as :func:`iganima_functions.generate_circle`.
+
+    :param numpy.ndarray radius: radii in degrees, any shape
+    :returns: tuple: (lat, lon) arrays of shape radius.shape + (points,)
+    """
+    theta = np.linspace(0, 2 * np.pi, points)
+    radius = np.asarray(radius, dtype=float)[..., None]
+    return event_latitude + radius * np.sin(theta), event_longitude + radius * np.cos(theta)
+
+
+def station_intro_geometry(frames, event_latitude, event_longitude, lat_stations, lon_stations, vertical_scale,
+                           horizontal_scale=0.3, wave_points=100, circle_scales=CIRCLE_SCALES, circle_points=100):
+    """
+    Geometry of every frame of the station animation.
+
+    :param TimelineFrames frames: evaluated timeline (see :data:`STATION_INTRO_TIMELINE`)
+    :param vertical_scale: wave amplitude in degrees (``get_circle_color.get_value_from_intensity``)
+    :returns: dict: ``phase`` (name per frame), ``wave_lon`` / ``wave_lat``
+        (frames x wave_points), ``circle_lat`` / ``circle_lon``
+        (frames x circles x circle_points), ``circle_radius`` (frames x circles)
+        and ``station_reached`` (frames x stations, bool)
+    """
+    wave_lon, wave_lat = line_wave_geometry(
+        frames, event_latitude, event_longitude, vertical_scale, horizontal_scale, wave_points
+    )
+
+    elapsed = np.where(frames.mask("circles"), frames.local, 0).astype(float)
+    circle_radius = elapsed[:, None] * np.asarray(circle_scales, dtype=float)[None, :]
+    circle_lat, circle_lon = circle_geometry(circle_radius, event_latitude, event_longitude, circle_points)
+
+    distance = np.hypot(np.asarray(lat_stations, dtype=float) - event_latitude,
+                        np.asarray(lon_stations, dtype=float) - event_longitude)
+    # con radio negativo (primer frame de los círculos) ninguna estación está alcanzada
+    reached = distance[None, :] <= circle_radius.max(axis=1, initial=-np.inf)[:, None]
+    reached &= frames.mask("circles")[:, None]
+
+    return {
+        "phase": frames.phase_names(),
+        "wave_lon": wave_lon,
+        "wave_lat": wave_lat,
+        "circle_radius": circle_radius,
+        "circle_lat": circle_lat,
+        "circle_lon": circle_lon,
+        "station_reached": reached,
+    }
@@ -0,0 +1,770 @@
+"""
+Library entry point of the IGSISMANI video pipeline.
+
+``run_igsismani.py`` and the ticket API both call :func:`create_event_video`,
+which renders the video of one event and returns the path of the MP4 instead
+of terminating the interpreter.
+"""
+
+import os
+import json
+import glob
+import shutil
+import hashlib
+import tempfile
+import logging
+import configparser
+
+import numpy as np
+import requests
+from manim import config
+from obspy import read_inventory
+
+from iganima import iganima_utils as u
+from iganima.iganima_functions import *
+from iganima.infobars_scene import InfoBarsScene
+from iganima.compositor import compose_frames, default_threads
+from iganima import asset_store
+from iganima.keyframes import (
+    WAVE_SCALES, interpolate_map_frames, keyframe_supersample, keyframe_times, map_zoom,
+)
+from iganima.encoders import OUTPUT_FORMATS, encode_outputs, parse_outputs
+from iganima.progress import JobProgress
+from iganima.timeline import circle_geometry
+from iganima.record_section import nearest_stations, record_section_frames, record_section_geometry
+
+
+logger = logging.getLogger(__name__)
+
+# Configuraciones ya leídas: {ruta: (mtime, run_param)}
+_CONFIG_CACHE = {}
+
+# Incrementar cuando cambie el código de renderizado: invalida la caché de renders.
+RENDER_VERSION = "1"
+
+# Campos de event_dict que aparecen en el video
+RENDER_EVENT_FIELDS = (
+    "event_id", "magnitude", "latitude", "longitude", "depth", "status",
+    "time_local", "local_date", "local_time", "distance", "city", "province",
+)
+
+# Parámetros de [animation] que no afectan el video
+RENDER_IGNORED_PARAMS = ("mapbox_access_token", "frames_out", "video_out", "frames_in", "compositor_threads",
+                         "asset_cache_dir")
+
+# Campos de event_dict usados por InfoBarsScene
+INFO_EVENT_FIELDS = ("magnitude", "depth", "distance", "city", "province", "local_date", "local_time")
+
+# Perfiles de render: "preview" es un video rápido de baja resolución que se entrega antes del completo
+RENDER_PROFILES = {
+    "full": {"frames_factor": 1.0, "map_scale": 1.0, "map_style": "outdoors", "outputs": ()},
+    "preview": {"frames_factor": 0.5, "map_scale": 0.5, "map_style": "light", "outputs": ("mp4", "jpg")},
+}
+
+# Imágenes de frames_in usadas por el video
+RENDER_ASSETS = ("outro.igepn.png", "doc_anuncio_1.png", asset_store.LOGO_FILE)
+
+
+def read_parameters(file_path):
+    """
+    Read a configuration text file
+
+    :param string file_path: path to configuration text file
+    :returns: dict: dict of a parser object
+    """
+    parser = configparser.ConfigParser()
+    parser.read(file_path)
+    return parser._sections
+
+
+def load_config_from_file(json_file_path):
+    """
+    Read a JSON configuration file and return it as a dictionary.
+    Expands environment variables in string values.
+    """
+    with open(os.path.expandvars(json_file_path), 'r') as f:
+        config_data = json.load(f)
+
+    # Expand env vars recursively (optional but useful)
+    def expand_env(value):
+        if isinstance(value, str):
+            return os.path.expandvars(value)
+        elif isinstance(value, dict):
+            return {k: expand_env(v) for k, v in value.items()}
+        elif isinstance(value, list):
+            return [expand_env(v) for v in value]
+        else:
+            return value
+
+    return expand_env(config_data)
+
+
+def configure_manim():
+    """Configuración de Manim para las escenas internas (InfoBarsScene, etc.)"""
+    config.pixel_width = 720
+    config.pixel_height = 444
+    config.frame_width = 14.0
+    config.frame_height = 8.0
+
+
+def load_run_parameters(configuration_file):
+    """
+    Read the iganima configuration file and the FDSN server file it points to.
+
+    The result is cached per path and reloaded only when the file's mtime
+    changes, so a pre-warmed process pays the parsing cost once.
+
+    :param string configuration_file: path to the iganima CFG file
+    :returns: dict: run parameters, with the server catalog under ``mseed_server``
+    :raises Exception e: if a file cannot be read
+    """
+    try:
+        logger.info(f"Check if configuration file {configuration_file} exists")
+        mtime = os.path.getmtime(configuration_file)
+        logger.info(f"Config file: {configuration_file} OK.Continue")
+    except Exception as e:
+        logger.error(f"Error reading configuration  file: {e}")
+        raise Exception(f"Error reading configuration file: {e}")
+
+    cached = _CONFIG_CACHE.get(configuration_file)
+    if cached and cached[0] == mtime:
+        return cached[1]
+
+    try:
+        logger.info(f"Read configuration file {configuration_file}")
+        run_param = read_parameters(configuration_file)
+    except Exception as e:
+        logger.error(f"Error reading configuration sets in file: {e}")
+        raise Exception(f"Error reading configuration file: {e}")
+
+    try:
+        mseed_server_config_file = run_param['fdsn']['server_config_file']
+        logger.info(f"Read miniseed server file {mseed_server_config_file}")
+        run_param['mseed_server'] = load_config_from_file(mseed_server_config_file)
+    except Exception as e:
+        logger.error(f"Error reading configuration file: {e}")
+        raise Exception(f"Error reading configuration file: {e}")
+
+    _CONFIG_CACHE[configuration_file] = (mtime, run_param)
+    return run_param
+
+
+def write_manifest(manifest_path, **data):
+    """
+    Write the job manifest (JSON) atomically.
+
+    :param string manifest_path: destination of the manifest
+    """
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, manifest_path)
+
+
+def _file_sha256(file_path):
+    if not os.path.isfile(file_path):
+        return None
+    h = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def record_section_params(animation):
+    """
+    Record-section settings of the ``[animation]`` section, with their defaults.
+
+    :returns: dict (``channel``, ``seconds``, ``points``, ``method``), or None if the panel is off
+    """
+    if str(animation.get("record_section", "false")).strip().lower() not in ("1", "true", "yes"):
+        return None
+    return {
+        "channel": animation.get("record_section_channel", "?HZ"),
+        "seconds": float(animation.get("record_section_seconds", 120)),
+        "points": int(animation.get("record_section_points", 400)),
+        "method": animation.get("record_section_method", "minmax"),
+    }
+
+
+def render_key(event_dict, run_param, profile="full", waveforms=True):
+    """
+    Content hash of everything that determines the rendered video.
+
+    Covers the event fields drawn in the frames, the animation parameters
+    and the content of the image assets, plus :data:`RENDER_VERSION`. With
+    the record section on, also its resolved settings and whether the
+    waveforms were obtained.
+
+    :param dict event_dict: event information (after nearest city lookup)
+    :param dict run_param: parameters returned by :func:`load_run_parameters`
+    :param string profile: render profile from :data:`RENDER_PROFILES`
+    :param bool waveforms: False for a video rendered without its record
+        section because the waveforms could not be fetched, so that it is
+        never served for a render that has them
+    :returns: string: hex SHA-256
+    """
+    animation = {
+        k: v for k, v in run_param["animation"].items()
+        if k not in RENDER_IGNORED_PARAMS
+    }
+    frames_in = run_param["animation"]["frames_in"]
+    inputs = {
+        "version": RENDER_VERSION,
+        "event": {k: event_dict.get(k) for k in RENDER_EVENT_FIELDS},
+        "animation": animation,
+        "assets": {a: _file_sha256(os.path.join(frames_in, a)) for a in RENDER_ASSETS},
+    }
+    if profile != "full":
+        inputs["profile"] = RENDER_PROFILES[profile]
+    else:
+        section = record_section_params(run_param["animation"])
+        if section:
+            inputs["record_section"] = dict(section, waveforms=bool(waveforms))
+    payload = json.dumps(inputs, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def render_map_frames(frames_out, event_latitude, event_longitude, event_annotation,
+                      FRAMES_NUMBER, mapbox_access_token, logo_source=None,
+                      map_style="outdoors", map_scale=1, progress=None):
+    """
+    Render the map frames ``map_<t>.png`` (epicentre with growing circles and zoom-in).
+
+    :param string logo_source: logo image passed to ``save_frame`` (see :func:`asset_store.logo_source`)
+    :param string map_style: Mapbox basemap style
+    :param float map_scale: image scale of the frames (1 = 720x640)
+    :param JobProgress progress: receives the time of each frame
+    """
+    progress = progress or JobProgress()
+    colors_list = ['red','red','red']
+
+    # ondas crecientes de todos los frames de una vez: radio = t * escala
+    radius = np.arange(FRAMES_NUMBER)[:, None] * np.asarray(WAVE_SCALES)[None, :]
+    circles_lat, circles_lon = circle_geometry(radius, event_latitude, event_longitude)
+
+    # TRY DO IT IN PARALLEL
+    frame_names = []
+    for t in range(0, FRAMES_NUMBER):
+        frame_data = create_initial_point_frame(event_longitude, event_latitude)
+
+        for color, lat_circ, lon_circ in zip(colors_list, circles_lat[t], circles_lon[t]):
+            frame_data.append(
+                go.Scattermapbox(
+                    lon=lon_circ,
+                    lat=lat_circ,
+                    mode="lines",
+                    line=dict(width=2, color=color),
+                    showlegend=False,
+                )
+            )
+
+        # Guardar el frame
+        frame_name = f'{frames_out}/map_{t:03}.png'
+        frame_names.append(frame_name)
+        fig = go.Figure(data=frame_data)
+        zoom_level = map_zoom(t, FRAMES_NUMBER)
+        with progress.frame():
+            save_frame(
+                fig,
+                frame_name,
+                mapbox_access_token,
+                event_latitude,
+                event_longitude,
+                event_annotation,
+                zoom_level,
+                logo_source=logo_source,
+                map_style=map_style,
+                scale=map_scale,
+            )
+    return frame_names
+
+
+def render_map_keyframes(frames_out, event_latitude, event_longitude, FRAMES_NUMBER, n_frames, keyframes,
+                         mapbox_access_token, logo_source=None, map_style="outdoors", map_scale=1, threads=1,
+                         progress=None):
+    """
+    Render ``map_<i>.png`` for n_frames output frames from only `keyframes` Mapbox renders.
+
+    The basemaps (``mapkey_<k>.png``) and the logo layer (``mapoverlay.png``)
+    are rendered with Kaleido; the frames in between are produced by
+    :func:`keyframes.interpolate_map_frames`. The animation follows the same
+    timeline as :func:`render_map_frames` with FRAMES_NUMBER frames.
+
+    :param JobProgress progress: receives the time of each keyframe render; the
+        interpolation is tracked as the ``map_interpolate`` stage
+    """
+    progress = progress or JobProgress()
+    supersample = keyframe_supersample(FRAMES_NUMBER, keyframes)
+    keyframe_paths = []
+    for k, t in enumerate(keyframe_times(FRAMES_NUMBER, keyframes)):
+        path = f"{frames_out}/mapkey_{k:03}.png"
+        with progress.frame():
+            save_basemap_frame(
+                path,
+                mapbox_access_token,
+                event_latitude,
+                event_longitude,
+                map_zoom(t, FRAMES_NUMBER),
+                map_style=map_style,
+                scale=map_scale * supersample,
+            )
+        keyframe_paths.append(path)
+
+    overlay_path = f"{frames_out}/mapoverlay.png"
+    save_overlay_frame(overlay_path, logo_source=logo_source, scale=map_scale)
+
+    with progress.track("map_interpolate", n_frames):
+        return interpolate_map_frames(
+            frames_out,
+            keyframe_paths,
+            overlay_path,
+            event_latitude,
+            event_longitude,
+            FRAMES_NUMBER,
+            n_frames,
+            scale=map_scale,
+            supersample=supersample,
+            threads=threads,
+            on_frame=progress.frame_done,
+        )
+
+
+def render_info_frames(event_dict, frames_out, FRAMES_NUMBER, progress=None, keyframes=0):
+    """
+    Render the info bar frames ``info_<t>.png`` with Manim.
+
+    :param JobProgress progress: receives the time of each frame
+    :param int keyframes: if at least 2, render only these frames, at the
+        times of the map keyframes (:func:`keyframes.keyframe_times`); the
+        compositor interpolates the rest
+    """
+    growth = None
+    n_frames = FRAMES_NUMBER
+    if keyframes >= 2:
+        # crecimiento de las barras en el frame (fraccionario) de cada keyframe
+        growth = (keyframe_times(FRAMES_NUMBER, keyframes) + 1) / FRAMES_NUMBER
+        n_frames = len(growth)
+    scene = InfoBarsScene(event_dict, output_dir=frames_out, n_frames=n_frames, growth=growth,
+                          on_frame=progress.frame_done if progress else None)
+    scene.generate_frames()
+
+
+def stage_key(stage, inputs):
+    """
+    Hash of the inputs of one pipeline stage.
+
+    :param string stage: stage name (``map``, ``info``)
+    :param dict inputs: every value the stage output depends on
+    :returns: string: hex SHA-256
+    """
+    payload = json.dumps({"stage": stage, "version": RENDER_VERSION, "inputs": inputs},
+                         sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _link_or_copy(src, dst):
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def restore_stage(stage_cache_dir, stage, key, frames_out):
+    """
+    Bring the frames of a previous run of stage with the same key into frames_out.
+
+    :returns: bool: True if the stage output was restored and the stage can be skipped
+    """
+    if not stage_cache_dir:
+        return False
+    cached = os.path.join(stage_cache_dir, f"{stage}-{key}")
+    if not os.path.isfile(os.path.join(cached, ".complete")):
+        return False
+
+    os.makedirs(frames_out, exist_ok=True)
+    for name in os.listdir(cached):
+        if name.startswith(f"{stage}_") and name.endswith(".png"):
+            dst = os.path.join(frames_out, name)
+            if os.path.exists(dst):
+                os.remove(dst)
+            _link_or_copy(os.path.join(cached, name), dst)
+    logger.info(f"Stage {stage} restored from {cached}")
+    return True
+
+
+def save_stage(stage_cache_dir, stage, key, frames_out):
+    """
+    Keep the frames produced by stage in stage_cache_dir, replacing older
+    outputs of the same stage.
+    """
+    if not stage_cache_dir:
+        return
+    try:
+        os.makedirs(stage_cache_dir, exist_ok=True)
+        cached = os.path.join(stage_cache_dir, f"{stage}-{key}")
+        tmp = tempfile.mkdtemp(prefix=f".{stage}-", dir=stage_cache_dir)
+        for f in glob.glob(os.path.join(frames_out, f"{stage}_*.png")):
+            _link_or_copy(f, os.path.join(tmp, os.path.basename(f)))
+        open(os.path.join(tmp, ".complete"), "w").close()
+
+        for old in glob.glob(os.path.join(stage_cache_dir, f"{stage}-*")):
+            shutil.rmtree(old, ignore_errors=True)
+        os.rename(tmp, cached)
+    except Exception as e:
+        logger.warning(f"Could not cache stage {stage}: {e}")
+
+
+def video_frames(frames, hold_frames, slides, slide_frames, section=()):
+    """
+    Frame stream of the final video: the composited frames, the last one held
+    hold_frames times, the record-section panel frames (if any), then each
+    slide slide_frames times.
+
+    Repeated frames are yielded as the same object, so encoders can detect them.
+    """
+    for frame in frames:
+        yield frame
+    if len(frames):
+        last = frames[-1]
+        for _ in range(hold_frames):
+            yield last
+    for frame in section:
+        yield frame
+    for slide in slides:
+        for _ in range(slide_frames):
+            yield slide
+
+
+def create_event_video(event_id, run_param, frames_out=None, video_out=None, manifest_path=None,
+                       render_cache_dir=None, stage_cache_dir=None, outputs=None, profile="full",
+                       progress_path=None, memory_limit_mb=None, trace_memory=False, cancel_path=None):
+    """
+    Render the video of an event.
+
+    :param string event_id: FDSN event id
+    :param dict run_param: parameters returned by :func:`load_run_parameters`
+    :param string frames_out: working directory for frames, overrides the config
+    :param string video_out: output directory for the MP4, overrides the config
+    :param string manifest_path: if given, a JSON manifest describing the output is written there
+    :param string render_cache_dir: directory of previous renders named ``<render_key>.<ext>``; if
+        every requested output of this key is there, they are returned without rendering
+        (``cache_hit`` in the manifest)
+    :param string stage_cache_dir: directory where the map and info frames are kept, keyed by the
+        inputs of each stage; on a revision only the stages whose inputs changed are rendered again
+    :param outputs: output formats (see :func:`encoders.parse_outputs`), the MP4 is always produced;
+        the manifest lists them under ``outputs``
+    :param string profile: ``full`` or ``preview`` (fewer frames, half resolution, lighter basemap,
+        MP4 + poster JPEG by default), see :data:`RENDER_PROFILES`
+    :param string progress_path: if given, the running stage, frames done and per-stage timings are
+        kept up to date in this JSON file (see :class:`progress.JobProgress`); the manifest lists the
+        timings under ``timings``
+    :param float memory_limit_mb: RSS ceiling of the render; it fails with
+        :class:`memory.MemoryLimitExceeded` when the RSS sampled at a frame or stage boundary is over it
+    :param bool trace_memory: record the tracemalloc peak and top allocations of every stage
+        (slower); RSS is always recorded
+    :param string cancel_path: if this file appears while the render runs, it stops at the next
+        stage boundary or frame with :class:`progress.JobCancelled`
+    :returns: string: path of the MP4 written under ``video_out``
+    :raises ValueError: for unknown output formats or profiles
+    :raises Exception e: if any stage of the pipeline fails
+    """
+
+    if profile not in RENDER_PROFILES:
+        raise ValueError(f"unknown render profile: {profile}")
+    profile_param = RENDER_PROFILES[profile]
+    outputs = parse_outputs(outputs or profile_param["outputs"])
+    progress = JobProgress(
+        progress_path, memory_limit_mb=memory_limit_mb, trace_memory=trace_memory, cancel_path=cancel_path
+    )
+
+    try:
+        logger.info(f"Loaded configuration parameters")
+
+        fdsn_id = run_param['fdsn']['server_id']
+        xml_inventory_file = run_param['fdsn']['xml_inventory_file']
+
+        nearest_url = run_param['fdsn']['nearest_url']
+        nearest_token = run_param['fdsn']['nearest_token']
+
+        mapbox_access_token = run_param["animation"]["mapbox_access_token"]
+        FRAMES_NUMBER = int(run_param["animation"]["frames_number"])
+        FPS = int(run_param["animation"]["fps"])
+        number_stations = run_param["animation"]["number_stations"]
+        frames_out = frames_out or run_param["animation"]["frames_out"]
+        frames_in = run_param["animation"]["frames_in"]
+        asset_cache_dir = run_param["animation"].get("asset_cache_dir")
+        video_out = video_out or run_param["animation"]["video_out"]
+
+        # Nuevo: número de frames para la intro de columnas (opción A).
+        # Si no está definido en el ini, se toma ~1/3 del total, mínimo 5.
+        FRAMES_COLUMNS = int(
+            run_param["animation"].get("frames_columns",
+                                       max(5, FRAMES_NUMBER // 3))
+        )
+        if profile_param["frames_factor"] != 1.0:
+            FRAMES_NUMBER = max(5, int(FRAMES_NUMBER * profile_param["frames_factor"]))
+            FRAMES_COLUMNS = max(2, int(FRAMES_COLUMNS * profile_param["frames_factor"]))
+        COMPOSITOR_THREADS = int(
+            run_param["animation"].get("compositor_threads", default_threads())
+        )
+
+        # Panel de sismogramas reales de las number_stations estaciones más cercanas (opcional)
+        RECORD_SECTION = record_section_params(run_param["animation"])
+
+        # Modo keyframes: sólo KEYFRAMES renders de Mapbox, frames intermedios interpolados a OUTPUT_FPS.
+        # La duración de cada fase es la misma que con FRAMES_NUMBER frames a FPS.
+        KEYFRAMES = int(run_param["animation"].get("keyframes", 0))
+        if KEYFRAMES >= 2:
+            VIDEO_FPS = int(run_param["animation"].get("output_fps", 25))
+            MAP_FRAMES = max(FRAMES_NUMBER, round(FRAMES_NUMBER * VIDEO_FPS / FPS))
+            INTRO_FRAMES = max(FRAMES_COLUMNS, round(FRAMES_COLUMNS * VIDEO_FPS / FPS))
+        else:
+            KEYFRAMES = 0
+            VIDEO_FPS = FPS
+            MAP_FRAMES = FRAMES_NUMBER
+            INTRO_FRAMES = FRAMES_COLUMNS
+
+    except Exception as e:
+        logger.error(f"Error loading configuration sets in file: {e}")
+        raise Exception(f"Error loading configuration file: {e}")
+
+    try:
+        logger.info(f"Get fdsn server info ")
+        mseed_server_param = run_param['mseed_server']
+        fdsn_server_ip = mseed_server_param[fdsn_id]["server_ip"]
+        fdsn_server_port = mseed_server_param[fdsn_id]["port"]
+
+    except Exception as e:
+        logger.error(f"Error reading miniseed server file: {e}")
+        raise Exception(f"Error reading miniseed server file: {e}")
+
+    try:
+        logger.info(f"Connect to fdsn server info ")
+        with progress.track("event"):
+            fdsn_client = u.connect_fdsn(fdsn_server_ip, fdsn_server_port)
+    except Exception as e:
+        logger.error(f"Error connecting configuration file: {e}")
+        raise Exception(f"Error connecting configuration file: {e}")
+
+    try:
+        logger.info(f"Clean frame directory")
+        clean_frames_directory(frames_out)
+    except Exception as e:
+        logger.error(f"Error in cleaning frame directory: {e}")
+        raise Exception(f"Error in cleaning frame directory: {e}")
+
+    try:
+        logger.info(f"Get event info")
+        # Conexión y obtención de datos del evento
+        with progress.track("event"):
+            event_inventory = u.get_event_by_id(fdsn_client, event_id)
+            event_dict = u.event2dict(event_inventory[0])
+
+        # Información del evento para la anotación
+        event_annotation = (
+            f"ID: {event_dict['event_id']} {event_dict['status']}<br>"
+            f"{event_dict['time_local']} Hora Local<br>"
+            f"Prof. {event_dict['depth']} Km.  Magnitud:  {event_dict['magnitude']}"
+        )
+
+        # Parámetros del evento
+        event_latitude = event_dict['latitude']
+        event_longitude = event_dict['longitude']
+        logger.info("Get event info completed")
+        print(event_dict)
+    except Exception as e:
+        logger.error(f"Error getting event info {e}")
+        raise Exception(f"Error getting event info: {e}")
+
+    try:
+        parameters = {
+            "lat": event_latitude,
+            "lon": event_longitude,
+            "token": nearest_token,
+        }
+
+        with progress.track("nearest_city"):
+            response = requests.get(f"{nearest_url}", params=parameters)
+        response.raise_for_status()
+        event_dict['distance'], event_dict['city'], event_dict['province'] = eval(response.text.strip()        )
+
+        event_dict['distance'] = round(event_dict['distance'], 1)
+
+    except Exception as e:
+        logger.error(f"Error getting event nearest {e}.Filling with emptiness")
+        event_dict['distance'] = '--'
+        event_dict['city'] = '--'
+        event_dict['province'] = '--'
+
+    key = render_key(event_dict, run_param, profile)
+    logger.info(f"Render key {key}")
+    if render_cache_dir:
+        cached_paths = {
+            fmt: os.path.join(render_cache_dir, f"{key}{OUTPUT_FORMATS[fmt]}") for fmt in outputs
+        }
+        if all(os.path.isfile(p) for p in cached_paths.values()):
+            cached_path = cached_paths["mp4"]
+            logger.info(f"Render cache hit: {cached_path}")
+            if manifest_path:
+                write_manifest(
+                    manifest_path,
+                    event_id=event_dict["event_id"],
+                    output_file=os.path.abspath(cached_path),
+                    size_bytes=os.path.getsize(cached_path),
+                    outputs={fmt: os.path.abspath(p) for fmt, p in cached_paths.items()},
+                    profile=profile,
+                    render_key=key,
+                    cache_hit=True,
+                    timings=progress.to_dict()["stages"],
+                    rss_peak_mb=progress.to_dict()["rss_peak_mb"],
+                )
+            progress.finish()
+            return cached_path
+
+    # 1. Crear frames del mapa (dependen sólo del epicentro y del número de frames)
+    try:
+        logger.info(f"Create the map animation")
+        map_key = stage_key("map", {
+            "latitude": event_latitude,
+            "longitude": event_longitude,
+            "frames_number": FRAMES_NUMBER,
+            "logo": asset_store.file_sha256(os.path.join(frames_in, asset_store.LOGO_FILE)),
+            "map_style": profile_param["map_style"],
+            "map_scale": profile_param["map_scale"],
+            "keyframes": KEYFRAMES,
+            "map_frames": MAP_FRAMES,
+        })
+        with progress.track("map", KEYFRAMES or FRAMES_NUMBER):
+            if restore_stage(stage_cache_dir, "map", map_key, frames_out):
+                progress.mark(cached=True)
+            elif KEYFRAMES:
+                logger.info(f"Render {KEYFRAMES} keyframes, interpolate {MAP_FRAMES} map frames")
+                render_map_keyframes(frames_out, event_latitude, event_longitude,
+                                     FRAMES_NUMBER, MAP_FRAMES, KEYFRAMES, mapbox_access_token,
+                                     logo_source=asset_store.logo_source(frames_in),
+                                     map_style=profile_param["map_style"],
+                                     map_scale=profile_param["map_scale"],
+                                     threads=COMPOSITOR_THREADS,
+                                     progress=progress)
+                save_stage(stage_cache_dir, "map", map_key, frames_out)
+            else:
+                render_map_frames(frames_out, event_latitude, event_longitude, event_annotation,
+                                  FRAMES_NUMBER, mapbox_access_token,
+                                  logo_source=asset_store.logo_source(frames_in),
+                                  map_style=profile_param["map_style"],
+                                  map_scale=profile_param["map_scale"],
+                                  progress=progress)
+                save_stage(stage_cache_dir, "map", map_key, frames_out)
+
+    except Exception as e:
+        logger.error(f"Error while creating the map frames: {e}")
+        raise Exception(f"Error while creating the map frames: {e}")
+
+    # 2. Crear frames de info (barras inferiores, etc.)
+    try:
+        logger.info("Create info frames")
+        # En modo keyframes sólo se renderizan KEYFRAMES frames de info; el compositor interpola el resto
+        info_key = stage_key("info", {
+            "event": {k: event_dict.get(k) for k in INFO_EVENT_FIELDS},
+            "frames_number": FRAMES_NUMBER,
+            "keyframes": KEYFRAMES,
+        })
+        with progress.track("info", KEYFRAMES or FRAMES_NUMBER):
+            if restore_stage(stage_cache_dir, "info", info_key, frames_out):
+                progress.mark(cached=True)
+            else:
+                render_info_frames(event_dict, frames_out, FRAMES_NUMBER, progress=progress, keyframes=KEYFRAMES)
+                save_stage(stage_cache_dir, "info", info_key, frames_out)
+
+    except Exception as e:
+        logger.error(f"Error while creating the info frames: {e}")
+        raise Exception(f"Error while creating the info frames: {e}")
+
+    # 2b. Sismogramas de las estaciones más cercanas: una sola petición get_waveforms_bulk
+    section = None
+    if RECORD_SECTION and profile == "full":
+        try:
+            logger.info("Get waveforms for the record section")
+            with progress.track("waveforms"):
+                origin_time = (event_inventory[0].preferred_origin() or event_inventory[0].origins[0]).time
+                stations = nearest_stations(event_inventory[0], read_inventory(xml_inventory_file), number_stations)
+                traces = u.get_nearest_waveforms(
+                    fdsn_client, stations, origin_time, len(stations),
+                    channel=RECORD_SECTION["channel"], seconds_after=RECORD_SECTION["seconds"],
+                )
+                if traces:
+                    section = record_section_geometry(
+                        traces, origin_time, points=RECORD_SECTION["points"], method=RECORD_SECTION["method"]
+                    )
+        except Exception as e:
+            # Sin datos de forma de onda el video se genera igual, sin el panel
+            logger.error(f"Error getting waveforms for the record section: {e}. Skipping the panel")
+            section = None
+        if section is None:
+            # El video sin panel no debe servirse desde la caché a un render que sí obtenga los datos
+            key = render_key(event_dict, run_param, profile, waveforms=False)
+            logger.info(f"Render key without record section {key}")
+
+    # 3. Combinar: intro de columnas + mapa + info, y generar video
+    try:
+        logger.info("Create combined frames (columns intro + map + info)")
+        with progress.track("composite"):
+            frames = compose_frames(
+                frames_out,
+                INTRO_FRAMES,
+                MAP_FRAMES,
+                threads=COMPOSITOR_THREADS,
+                info_frames=KEYFRAMES or MAP_FRAMES,
+            )
+        size = (frames.shape[2], frames.shape[1])
+
+        # 4. Crear el video final a partir de los frames combinados
+        logger.info("Create video from frames_combined")
+        hold_frames = VIDEO_FPS * 3  # información visible 3 segundos
+        slide_frames = VIDEO_FPS * 2
+        section_frames = VIDEO_FPS * 4 if section else 0
+        with progress.track("encode", len(frames) + hold_frames + section_frames + 2 * slide_frames):
+            outro_imgs = [
+                asset_store.load_slide(f"{frames_in}/{name}", size, asset_cache_dir)
+                for name in ("outro.igepn.png", "doc_anuncio_1.png")
+            ]
+
+            logger.info(f"Encode outputs: {', '.join(outputs)}")
+            os.makedirs(video_out, exist_ok=True)
+            output_paths = {
+                fmt: f'{video_out}/{event_dict["event_id"]}{OUTPUT_FORMATS[fmt]}' for fmt in outputs
+            }
+            encode_outputs(
+                progress.iterate(video_frames(
+                    frames, hold_frames, outro_imgs, slide_frames,
+                    section=record_section_frames(section, section_frames, *size) if section else (),
+                )),
+                output_paths,
+                VIDEO_FPS,
+                size,
+                poster_index=len(frames) - 1,
+            )
+        video_path = output_paths["mp4"]
+
+    except Exception as e:
+        logger.error(f"Error while creating the combined frames / video: {e}")
+        raise Exception(f"Error while creating the combined frames / video: {e}")
+
+    if manifest_path:
+        write_manifest(
+            manifest_path,
+            event_id=event_dict["event_id"],
+            output_file=os.path.abspath(video_path),
+            size_bytes=os.path.getsize(video_path),
+            outputs={fmt: os.path.abspath(p) for fmt, p in output_paths.items()},
+            profile=profile,
+            render_key=key,
+            cache_hit=False,
+            timings=progress.to_dict()["stages"],
+            rss_peak_mb=progress.to_dict()["rss_peak_mb"],
+        )
+    progress.finish()
+    logger.info(f"Stage timings: {progress.to_dict()['stages']}")
+
+    return video_path
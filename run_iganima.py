@@ -9,6 +9,7 @@ import configparser
 from iganima import iganima_utils as u
 from iganima.iganima_functions import *
 from iganima import get_circle_color
+from iganima.timeline import STATION_INTRO_TIMELINE, Timeline, station_intro_geometry
 
 import json
 from obspy import read_inventory
@@ -197,79 +198,34 @@ def main(args):
         logger.info(f"Create the animation")
         text_magnitude = [f'{magnitude_value}']
         circle_colors = get_circle_color.get_colors_from_intensity(magnitude_value)
-        sinewave_color = get_circle_color.get_color_from_intensity(magnitude_value)
 
-        # Configuración de la onda sísmica
+        # Geometría de todos los frames, calculada una sola vez (ver iganima/timeline.py)
         vertical_scale = get_circle_color.get_value_from_intensity(magnitude_value)
-        horizontal_scale = 0.3
-        seismic_wave_time = np.linspace(-1, 1, 100)
-        lon_total = np.linspace(event_longitude - horizontal_scale, event_longitude + horizontal_scale, len(seismic_wave_time))
-        waveform = np.exp(-seismic_wave_time**2) * np.sin(13 * seismic_wave_time)
-
-        # Parámetros de animación
-        MAX_LEN = len(seismic_wave_time)
-        SEISMIC_WAVE_GROW = 10
-        SEISMIC_WAVE_SHRINK = 10
-        LINE_2_POINT_FRAMES = 5
-        POINT_FRAMES = 2
-        LINE_GROWTH_FRAMES = 3
-        WAVE_GROWTH_FRAMES = 5
+        animation_timeline = run_param["animation"].get("timeline")
+        animation_timeline = Timeline.from_spec(animation_timeline) if animation_timeline else STATION_INTRO_TIMELINE
+        geometry = station_intro_geometry(
+            animation_timeline.evaluate(FRAMES_NUMBER),
+            event_latitude,
+            event_longitude,
+            lat_stations,
+            lon_stations,
+            vertical_scale,
+        )
+        zoom_start = 4.5
+        zoom_end = 10.5
+        zoom_levels = zoom_start + (zoom_end - zoom_start) * (np.arange(1, FRAMES_NUMBER + 1) / FRAMES_NUMBER)
 
         # Generación de frames
-        frames = []
         frame_names = []
 
-        for t in range(1, FRAMES_NUMBER + 1):
-            frame_data = []
-
-            if t <= POINT_FRAMES + 1:
-                frame_data = create_initial_point_frame(event_longitude, event_latitude, lon_stations, lat_stations, station_name_list_ordered)
-            elif POINT_FRAMES - 1 <= t <= POINT_FRAMES + LINE_GROWTH_FRAMES:
-                frame_data = create_line_growth_frame(t, POINT_FRAMES, LINE_GROWTH_FRAMES, MAX_LEN, lon_total, event_latitude, lon_stations, lat_stations, station_name_list_ordered)
-            elif POINT_FRAMES + LINE_GROWTH_FRAMES <= t < POINT_FRAMES + LINE_GROWTH_FRAMES + WAVE_GROWTH_FRAMES:
-                frame_data = create_sine_wave_frame(t, POINT_FRAMES, LINE_GROWTH_FRAMES, WAVE_GROWTH_FRAMES, waveform, vertical_scale, lon_total, event_latitude, lon_stations, lat_stations, station_name_list_ordered, is_growing=True)
-            elif POINT_FRAMES + LINE_GROWTH_FRAMES + WAVE_GROWTH_FRAMES <= t <= POINT_FRAMES + LINE_GROWTH_FRAMES + WAVE_GROWTH_FRAMES*2:
-                frame_data = create_sine_wave_frame(t, POINT_FRAMES, LINE_GROWTH_FRAMES, WAVE_GROWTH_FRAMES, waveform, vertical_scale, lon_total, event_latitude, lon_stations, lat_stations, station_name_list_ordered, is_growing=False)
-            elif POINT_FRAMES + LINE_GROWTH_FRAMES + WAVE_GROWTH_FRAMES*2 <= t <= POINT_FRAMES + LINE_GROWTH_FRAMES*2 + WAVE_GROWTH_FRAMES*2:
-                # Fase de reducción de línea (similar a create_line_growth_frame pero inversa)
-                shrink_time = t - (POINT_FRAMES + LINE_GROWTH_FRAMES + WAVE_GROWTH_FRAMES*2)
-                length = int(np.interp(shrink_time, [0, LINE_2_POINT_FRAMES], [MAX_LEN, 1]))
-                mid = MAX_LEN // 2
-                idx_range = slice(mid - length//2, mid + length//2)
-                lon = lon_total[idx_range]
-                lat = np.full_like(lon, event_latitude)
-
-                frame_data = [
-                    go.Scattermapbox(
-                        lon=lon,
-                        lat=lat,
-                        mode='lines',
-                        line=dict(width=1, color='green'),
-                        showlegend=False,
-                        hoverinfo='skip'
-                    ),
-                    go.Scattermapbox(
-                        lon=lon_stations,
-                        lat=lat_stations,
-                        text=station_name_list_ordered,
-                        mode="markers+text",
-                        marker=dict(color=[], size=4, symbol="circle"),
-                        textposition='top left',
-                        showlegend=False,
-                        hoverinfo='text'
-                    )
-                ]
-            elif t > POINT_FRAMES + LINE_GROWTH_FRAMES*2 + WAVE_GROWTH_FRAMES*2:
-                frame_data = create_circle_frames(t, SEISMIC_WAVE_GROW, SEISMIC_WAVE_SHRINK, event_latitude, event_longitude, circle_colors, station_lat_lon_list_ordered, lon_stations, lat_stations, station_name_list_ordered, text_magnitude)
+        for f in range(FRAMES_NUMBER):
+            frame_data = create_timeline_frame(f, geometry, event_latitude, event_longitude, circle_colors, lon_stations, lat_stations, station_name_list_ordered, text_magnitude)
 
             # Guardar el frame
-            frame_name = f'frames/frame_{t:03}.png'
+            frame_name = f'frames/frame_{f + 1:03}.png'
             frame_names.append(frame_name)
             fig = go.Figure(data=frame_data)
-            zoom_start = 4.5
-            zoom_end = 10.5
-            zoom_level = zoom_start + (zoom_end - zoom_start) * (t / FRAMES_NUMBER)
-            save_frame(fig, frame_name, mapbox_access_token, event_latitude, event_longitude, event_annotation,zoom_level)
+            save_frame(fig, frame_name, mapbox_access_token, event_latitude, event_longitude, event_annotation, float(zoom_levels[f]))
 
         # Compilar la animación
         compile_animation("./frames", f"{event_id}.gif", f"{event_id}.mp4", fps=2)
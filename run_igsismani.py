@@ -1,69 +1,29 @@
 import sys, os
 
 import pandas as pd
-import numpy as np
 import logging
 import logging.config
 import argparse
-import configparser
+import contextlib
 
 from pathlib import Path
 
-from iganima import iganima_utils as u
-from iganima.iganima_functions import *
-from iganima import get_circle_color
-
-import json
-from obspy import read_inventory
-import requests
-from PIL import Image, ImageDraw
-import cv2
-from manim import config
-import shutil
+from iganima.video_pipeline import (
+    load_run_parameters,
+    configure_manim,
+    create_event_video,
+)
+from iganima.profiling import cpu_profile
 
 pd.set_option('display.max_colwidth', None)
 pd.set_option('display.max_columns', None)
 
 
-def read_parameters(file_path):
-    """
-    Read a configuration text file
-    
-    :param string file_path: path to configuration text file
-    :returns: dict: dict of a parser object
-    """
-    parser = configparser.ConfigParser()
-    parser.read(file_path)
-    return parser._sections
-
-
-def load_config_from_file(json_file_path):
-    """
-    Read a JSON configuration file and return it as a dictionary.
-    Expands environment variables in string values.
-    """
-    with open(os.path.expandvars(json_file_path), 'r') as f:
-        config_data = json.load(f)
-
-    # Expand env vars recursively (optional but useful)
-    def expand_env(value):
-        if isinstance(value, str):
-            return os.path.expandvars(value)
-        elif isinstance(value, dict):
-            return {k: expand_env(v) for k, v in value.items()}
-        elif isinstance(value, list):
-            return [expand_env(v) for v in value]
-        else:
-            return value
-
-    return expand_env(config_data)
-
-
 def configure_logging():
 
     print("Start of logging configuration")
     logging.config.fileConfig(Path("./config/", 'logging.ini'),
-                              disable_existing_loggers=True)
+                              disable_existing_loggers=False)
     logger = logging.getLogger(__name__)
 
     logger.info(f"Logger configured was: {logging.getLogger().handlers}")
@@ -79,318 +39,26 @@ def main(args):
         logger.error(f"Error charging parameters from args: {e}")
         raise Exception(f"Error charging parameters from args: {e}")
 
-    try:
-        logger.info(f"Check if configuration file {configuration_file} exists")
-        if os.path.isfile(configuration_file):
-            logger.info(f"Config file: {configuration_file} OK.Continue")
-    except Exception as e:
-        logger.error(f"Error reading configuration  file: {e}")
-        raise Exception(f"Error reading configuration file: {e}")
-
-    try:
-        logger.info(f"Read configuration file {configuration_file}")
-        run_param = read_parameters(configuration_file)
-
-        print(run_param)
-    except Exception as e:
-        logger.error(f"Error reading configuration sets in file: {e}")
-        raise Exception(f"Error reading configuration file: {e}")
-
-    try:
-        logger.info(f"Loaded configuration file {configuration_file}")
-        
-        fdsn_id = run_param['fdsn']['server_id']
-        mseed_server_config_file = run_param['fdsn']['server_config_file']
-        xml_inventory_file = run_param['fdsn']['xml_inventory_file']
-
-        nearest_url = run_param['fdsn']['nearest_url']
-        nearest_token = run_param['fdsn']['nearest_token']
-
-        mapbox_access_token = run_param["animation"]["mapbox_access_token"]
-        FRAMES_NUMBER = int(run_param["animation"]["frames_number"])
-        FPS = int(run_param["animation"]["fps"])
-        number_stations = run_param["animation"]["number_stations"]
-        frames_out = run_param["animation"]["frames_out"]
-        frames_in = run_param["animation"]["frames_in"]
-        video_out = run_param["animation"]["video_out"]
-
-        # Nuevo: número de frames para la intro de columnas (opción A).
-        # Si no está definido en el ini, se toma ~1/3 del total, mínimo 5.
-        FRAMES_COLUMNS = int(
-            run_param["animation"].get("frames_columns",
-                                       max(5, FRAMES_NUMBER // 3))
-        )
-
-    except Exception as e:
-        logger.error(f"Error loading configuration sets in file: {e}")
-        raise Exception(f"Error loading configuration file: {e}")
-
-    try:
-        logger.info(f"Read miniseed server file {mseed_server_config_file}")
-        # mseed_server_param = u.read_config_file(mseed_server_config_file)
-        mseed_server_param = load_config_from_file(mseed_server_config_file)
-        print(f"##### mseed server {mseed_server_param}")
-
-    except Exception as e:
-        logger.error(f"Error reading configuration file: {e}")
-        raise Exception(f"Error reading configuration file: {e}")
-
-    try:
-        logger.info(f"Get fdsn server info ")
-        fdsn_server_ip = mseed_server_param[fdsn_id]["server_ip"]
-        fdsn_server_port = mseed_server_param[fdsn_id]["port"]
-
-    except Exception as e:
-        logger.error(f"Error reading miniseed server file: {e}")
-        raise Exception(f"Error reading miniseed server file: {e}")
-
-    try:
-        logger.info(f"Connect to fdsn server info ")
-        fdsn_client = u.connect_fdsn(fdsn_server_ip, fdsn_server_port)
-    except Exception as e:
-        logger.error(f"Error connecting configuration file: {e}")
-        raise Exception(f"Error connecting configuration file: {e}")
-
-    try:
-        logger.info(f"Clean frame directory")
-        clean_frames_directory(frames_out)
-    except Exception as e:
-        logger.error(f"Error in cleaning frame directory: {e}")
-        raise Exception(f"Error in cleaning frame directory: {e}")
-    
-    try:
-        logger.info(f"Get event info")
-        # Conexión y obtención de datos del evento
-        event_inventory = u.get_event_by_id(fdsn_client, event_id)
-        event_dict = u.event2dict(event_inventory[0])
-
-        # Información del evento para la anotación
-        event_annotation = (
-            f"ID: {event_dict['event_id']} {event_dict['status']}<br>"
-            f"{event_dict['time_local']} Hora Local<br>"
-            f"Prof. {event_dict['depth']} Km.  Magnitud:  {event_dict['magnitude']}"
+    run_param = load_run_parameters(configuration_file)
+    print(run_param)
+
+    with cpu_profile(args.cpu_profile_dir) if args.cpu_profile_dir else contextlib.nullcontext():
+        video_path = create_event_video(
+            event_id,
+            run_param,
+            frames_out=args.frames_dir,
+            video_out=args.output_dir,
+            manifest_path=args.manifest,
+            render_cache_dir=args.render_cache_dir,
+            stage_cache_dir=args.stage_cache_dir,
+            outputs=args.outputs,
+            profile=args.profile,
+            progress_path=args.progress,
+            memory_limit_mb=args.memory_limit_mb,
+            trace_memory=args.trace_memory,
+            cancel_path=args.cancel_file,
         )
-
-        # Parámetros del evento
-        event_latitude = event_dict['latitude']
-        event_longitude = event_dict['longitude']
-        logger.info("Get event info completed")
-        print(event_dict)
-    except Exception as e:
-        logger.error(f"Error getting event info {e}")
-        raise Exception(f"Error getting event info: {e}")
-
-    try:
-        parameters = {
-            "lat": event_latitude,
-            "lon": event_longitude,
-            "token": nearest_token,
-        }
-
-        response = requests.get(f"{nearest_url}", params=parameters)
-        response.raise_for_status()
-        event_dict['distance'], event_dict['city'], event_dict['province'] = eval(response.text.strip()        )
-
-        event_dict['distance'] = round(event_dict['distance'], 1)
-
-    except Exception as e:
-        logger.error(f"Error getting event nearest {e}.Filling with emptiness")
-        event_dict['distance'] = '--'
-        event_dict['city'] = '--'
-        event_dict['province'] = '--'
-
-    # 1. Crear frames del mapa
-    try:
-        logger.info(f"Create the map animation")
-
-        from iganima import iganima_functions
-
-        colors_list = ['red','red','red']
-        radius_list = [FRAMES_NUMBER*0.1, FRAMES_NUMBER*0.07, FRAMES_NUMBER*0.05]
-        scale_list = [0.1, 0.07, 0.05]
-        circle_zip = zip(colors_list,radius_list)
-
-        for color,radius in circle_zip:
-            lat_circle,lon_circle = generate_circle(event_latitude,event_longitude, radius)
-            
-
-        # TRY DO IT IN PARALLEL 
-        frame_names = []
-        for t in range(0, FRAMES_NUMBER):
-            frame_data = create_initial_point_frame(event_longitude, event_latitude)
-
-            # ondas crecientes
-            for color, scale in zip(colors_list, scale_list):
-                radius = t * scale
-                lat_circ, lon_circ = generate_circle(event_latitude, event_longitude, radius)
-
-                frame_data.append(
-                    go.Scattermapbox(
-                        lon=lon_circ,
-                        lat=lat_circ,
-                        mode="lines",
-                        line=dict(width=2, color=color),
-                        showlegend=False,
-                    )
-                )
-
-  
-            # Guardar el frame
-            frame_name = f'{frames_out}/map_{t:03}.png'
-            frame_names.append(frame_name)
-            fig = go.Figure(data=frame_data)
-            zoom_start = 4.5
-            zoom_end = 9.5
-            zoom_level = zoom_start + (zoom_end - zoom_start) * (t / FRAMES_NUMBER)
-            save_frame(
-                fig,
-                frame_name,
-                mapbox_access_token,
-                event_latitude,
-                event_longitude,
-                event_annotation,
-                zoom_level,
-            )
-
-
-    except Exception as e:
-        logger.error(f"Error while creating the map frames: {e}")
-        raise Exception(f"Error while creating the map frames: {e}")
-
-    # 2. Crear frames de info (barras inferiores, etc.)
-    try:
-        logger.info("Create info frames")
-        from iganima.infobars_scene import InfoBarsScene
-
-        scene = InfoBarsScene(event_dict, output_dir=frames_out, n_frames=FRAMES_NUMBER)
-        scene.generate_frames()
-
-    except Exception as e:
-        logger.error(f"Error while creating the info frames: {e}")
-        raise Exception(f"Error while creating the info frames: {e}")
-
-    # 3. Combinar: intro de columnas + mapa + info, y generar video
-    try:
-        logger.info("Create combined frames (columns intro + map + info)")
-        os.makedirs(f"{frames_out}", exist_ok=True)
-
-        # Usar el primer frame de mapa e info como referencia de tamaño
-        sample_map_path = f"{frames_out}/map_000.png"
-        sample_info_path = f"{frames_out}/info_000.png"
-
-        map_sample = Image.open(sample_map_path)
-        info_sample = Image.open(sample_info_path)
-
-        combined_width = map_sample.width
-        map_height = map_sample.height
-        info_height = info_sample.height
-        combined_height = map_height + info_height
-
-        map_sample.close()
-        info_sample.close()
-
-        # Total de frames del video final: intro columnas + mapa+info
-        total_frames = FRAMES_COLUMNS + FRAMES_NUMBER
-
-        # Colores de las columnas (aprox)
-        azul_oscuro = (46, 95, 168)
-        rojo_quemado = (128, 0, 32)
-        blanco = (255, 255, 255)
-        colors = [azul_oscuro, rojo_quemado, blanco]
-
-        for i in range(total_frames):
-
-            if i < FRAMES_COLUMNS:
-                # Intro de columnas: solo columnas sobre fondo blanco
-                t = i / max(FRAMES_COLUMNS - 1, 1)  # 0 -> 1
-
-                combined = Image.new("RGB", (combined_width, combined_height), color="white")
-                draw = ImageDraw.Draw(combined)
-
-                base_width = combined_width / 3.0
-                stripe_width = int(base_width * max(0.0, 1.0 - t))
-
-                current_x = 0
-                for color in colors:
-                    if stripe_width <= 0:
-                        break
-                    x0 = int(current_x)
-                    x1 = int(current_x + stripe_width)
-                    draw.rectangle([(x0, 0), (x1, combined_height)], fill=color)
-                    current_x = x1
-
-                combined.save(f"{frames_out}/frame_{i:03}.png")
-
-            else:
-                # Fase de mapa + info como antes
-                j = i - FRAMES_COLUMNS
-
-                map_img = Image.open(f"{frames_out}/map_{j:03}.png")
-                info_img = Image.open(f"{frames_out}/info_{j:03}.png")
-
-                # asegurar que info tenga la altura EXACTA esperada
-                if info_img.height != info_height:
-                    info_img = info_img.resize((combined_width, info_height),Image.LANCZOS)
-
-                combined = Image.new("RGB", (combined_width, combined_height), color="white")
-                combined.paste(map_img, (0, 0))
-                combined.paste(info_img, (0, map_height))
-
-                combined.save(f"{frames_out}/frame_{i:03}.png")
-
-                map_img.close()
-                info_img.close()
-
-        # 4. Crear el video final a partir de los frames combinados
-        logger.info("Create video from frames_combined")
-        logger.info("Fusion columns intro + map + info")
-        frame_array = []
-
-        for i in range(total_frames):
-            img = cv2.imread(f"{frames_out}/frame_{i:03}.png")
-            height, width, layers = img.shape
-            size = (width, height)
-            frame_array.append(img)
-
-            
-            
-        
-        ##Keep information displayed for 3 segoncds 
-        hold_frames = FPS * 3
-        if frame_array:
-            last_frame = frame_array[-1].copy()
-            for _ in range(hold_frames):
-                frame_array.append(last_frame.copy())
-
-
-        outro_img = cv2.imread(f"{frames_in}/outro.igepn.png")
-        outro_img = cv2.resize(outro_img,(size[0],size[1]))
-
-        for _ in range(FPS *2):
-            frame_array.append(outro_img)
-
-        outro_img = cv2.imread(f"{frames_in}/doc_anuncio_1.png")
-        outro_img = cv2.resize(outro_img,(size[0],size[1]))
-
-        for _ in range(FPS*2):
-            frame_array.append(outro_img)
-
-        logger.info("Create video using opencv")
-        out = cv2.VideoWriter(
-            f'{video_out}/{event_dict["event_id"]}.mp4',
-            cv2.VideoWriter_fourcc(*'avc1'),
-            FPS,  # fps
-            size,
-        )
-
-        for frame in frame_array:
-            #print(frame)
-            out.write(frame)
-        out.release()
-
-    except Exception as e:
-        logger.error(f"Error while creating the combined frames / video: {e}")
-        raise Exception(f"Error while creating the combined frames / video: {e}")
+    logger.info(f"Video created: {video_path}")
 
     sys.exit(0)
 
@@ -403,14 +71,34 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--iganima_config", type=str, required=True)
     parser.add_argument("--event_id", type=str, required=True)
+    parser.add_argument("--frames_dir", type=str, default=None,
+                        help="Frames working directory (default: frames_out from the config)")
+    parser.add_argument("--output_dir", type=str, default=None,
+                        help="MP4 output directory (default: video_out from the config)")
+    parser.add_argument("--manifest", type=str, default=None,
+                        help="Write a JSON manifest describing the produced video")
+    parser.add_argument("--render_cache_dir", type=str, default=None,
+                        help="Reuse <render_key>.mp4 from this directory when the render inputs are unchanged")
+    parser.add_argument("--stage_cache_dir", type=str, default=None,
+                        help="Keep map/info frames here and re-render only the stages whose inputs changed")
+    parser.add_argument("--outputs", type=str, default=None,
+                        help="Comma separated output formats: mp4 (always), webm, gif, jpg (poster)")
+    parser.add_argument("--profile", type=str, default="full", choices=["full", "preview"],
+                        help="Render profile: full quality or a fast low-resolution preview")
+    parser.add_argument("--progress", type=str, default=None,
+                        help="Keep the running stage, frames done and per-stage timings in this JSON file")
+    parser.add_argument("--cpu_profile_dir", type=str, default=None,
+                        help="Run under cProfile and write profile.pstats and profile.collapsed.txt here")
+    parser.add_argument("--memory_limit_mb", type=float, default=None,
+                        help="Fail the render as soon as its RSS goes over this many MB")
+    parser.add_argument("--cancel_file", type=str, default=None,
+                        help="Stop the render at the next stage boundary once this file exists")
+    parser.add_argument("--trace_memory", action="store_true",
+                        help="Record tracemalloc peaks and top allocations per stage in the progress file")
 
     args = parser.parse_args()
     print("OK:", args)
 
-    # Configuración de Manim para las escenas internas (InfoBarsScene, etc.)
-    config.pixel_width = 720
-    config.pixel_height = 444
-    config.frame_width = 14.0
-    config.frame_height = 8.0
+    configure_manim()
 
     main(args)
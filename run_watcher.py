@@ -0,0 +1,60 @@
+import os
+import signal
+import logging.config
+from datetime import timedelta
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+# Carga el archivo .env desde el root del proyecto
+load_dotenv(dotenv_path=Path(__file__).resolve().parent / ".env")
+
+from iganima.api.watcher import EventWatcher, FDSNEventSource, QuakeMLFeedSource, TicketClient, parse_region
+
+
+ARTIFACTS_DIR = Path(os.environ.get("IGSISMANI_ARTIFACTS_DIR", "./artifacts")).resolve()
+
+# API that renders the videos, and where the events come from: "fdsn" (the FDSN server of the
+# iganima config), an FDSN base URL, or a QuakeML file / directory written by another system.
+API_URL = os.environ.get("IGSISMANI_WATCH_API_URL", "http://localhost:8000")
+SOURCE = os.environ.get("IGSISMANI_WATCH_SOURCE", "fdsn").strip()
+MIN_MAGNITUDE = float(os.environ.get("IGSISMANI_WATCH_MIN_MAGNITUDE", "4.0"))
+REGION = parse_region(os.environ.get("IGSISMANI_WATCH_REGION"))  # minlat,maxlat,minlon,maxlon
+POLL_SECONDS = float(os.environ.get("IGSISMANI_WATCH_POLL_SECONDS", "30"))
+LOOKBACK = timedelta(hours=float(os.environ.get("IGSISMANI_WATCH_LOOKBACK_HOURS", "24")))
+STATE_PATH = Path(os.environ.get("IGSISMANI_WATCH_STATE", str(ARTIFACTS_DIR / "watcher_state.json"))).resolve()
+
+
+def build_source():
+    if SOURCE.startswith(("http://", "https://")):
+        from obspy.clients.fdsn import Client
+        return FDSNEventSource(Client(SOURCE), MIN_MAGNITUDE, REGION, LOOKBACK)
+    if SOURCE != "fdsn":
+        return QuakeMLFeedSource(Path(SOURCE).expanduser())
+
+    from iganima import iganima_utils as u
+    from iganima.video_pipeline import load_run_parameters
+
+    run_param = load_run_parameters(os.path.realpath(os.path.expanduser(os.environ["IGSISMANI_DEFAULT_IGANIMA_CONFIG"])))
+    server = run_param["mseed_server"][run_param["fdsn"]["server_id"]]
+    client = u.connect_fdsn(server["server_ip"], server["port"])
+    return FDSNEventSource(client, MIN_MAGNITUDE, REGION, LOOKBACK)
+
+
+if __name__ == "__main__":
+
+    logging.config.fileConfig(os.environ.get("IGSISMANI_LOGGING_INI"))
+
+    watcher = EventWatcher(
+        build_source(),
+        TicketClient(API_URL),
+        min_magnitude=MIN_MAGNITUDE,
+        region=REGION,
+        poll_seconds=POLL_SECONDS,
+        lookback=LOOKBACK,
+        state_path=STATE_PATH,
+    )
+
+    signal.signal(signal.SIGTERM, lambda signum, frame: watcher.stop())
+    signal.signal(signal.SIGINT, lambda signum, frame: watcher.stop())
+    watcher.run()
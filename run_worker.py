@@ -0,0 +1,69 @@
+import os
+import signal
+import logging.config
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+# Carga el archivo .env desde el root del proyecto
+load_dotenv(dotenv_path=Path(__file__).resolve().parent / ".env")
+
+from iganima.api.admission import AdaptiveConcurrency
+from iganima.api.fleet import Worker, open_state, serve_metrics
+from iganima.api.job_queue import open_broker
+from iganima.api.workers import start_fork_server
+
+
+# On the host of the API: the same artifacts directory, state database and broker (SQLite WAL, local disk).
+# On another host: IGSISMANI_JOB_BROKER and IGSISMANI_STATE_URL = http://<api host>:<port>, with the
+# IGSISMANI_WORKER_TOKEN of the API; ARTIFACTS_DIR is then a local working directory of this worker.
+ARTIFACTS_DIR = Path(os.environ.get("IGSISMANI_ARTIFACTS_DIR", "./artifacts")).resolve()
+STATE_DB = Path(os.environ.get("IGSISMANI_STATE_DB", str(ARTIFACTS_DIR / "state.sqlite3"))).resolve()
+STATE_URL = os.environ.get("IGSISMANI_STATE_URL", "").strip() or f"sqlite://{STATE_DB}"
+JOB_BROKER = os.environ.get("IGSISMANI_JOB_BROKER", "sqlite")
+
+WORKER_ID = os.environ.get("IGSISMANI_WORKER_ID") or None
+SLOTS = int(os.environ.get("IGSISMANI_WORKER_SLOTS", "1"))
+LEASE_SECONDS = float(os.environ.get("IGSISMANI_WORKER_LEASE_SECONDS", "60"))
+MAX_ATTEMPTS = int(os.environ.get("IGSISMANI_WORKER_MAX_ATTEMPTS", "3"))
+METRICS_PORT = int(os.environ.get("IGSISMANI_WORKER_METRICS_PORT", "0"))
+METRICS_HOST = os.environ.get("IGSISMANI_WORKER_METRICS_HOST", "0.0.0.0")
+
+# Adaptive concurrency, as in the API: SLOTS becomes the upper bound and the slots in use
+# follow the idle CPU and MemAvailable of this host, given the cost of the jobs it ran.
+ADAPTIVE_CONCURRENCY = os.environ.get("IGSISMANI_ADAPTIVE_CONCURRENCY", "0").strip().lower() in ("1", "true", "yes")
+
+
+if __name__ == "__main__":
+
+    logging.config.fileConfig(os.environ.get("IGSISMANI_LOGGING_INI"))
+
+    store, artifacts = open_state(STATE_URL, ARTIFACTS_DIR)
+    worker = Worker(
+        open_broker(JOB_BROKER, ARTIFACTS_DIR),
+        store,
+        artifacts,
+        worker_id=WORKER_ID,
+        slots=SLOTS,
+        lease_seconds=LEASE_SECONDS,
+        max_attempts=MAX_ATTEMPTS,
+    )
+    if os.environ.get("IGSISMANI_JOB_MODE", "forkserver").strip().lower() != "subprocess":
+        start_fork_server()
+    admission = None
+    if ADAPTIVE_CONCURRENCY:
+        admission = AdaptiveConcurrency(
+            worker,
+            min_jobs=int(os.environ.get("IGSISMANI_MIN_CONCURRENT_JOBS", "1")),
+            interval=float(os.environ.get("IGSISMANI_ADMISSION_INTERVAL_SECONDS", "5")),
+            cpu_target=float(os.environ.get("IGSISMANI_ADMISSION_CPU_TARGET", "0.9")),
+            memory_reserve_mb=float(os.environ.get("IGSISMANI_ADMISSION_MEMORY_RESERVE_MB", "1024")),
+        )
+        admission.start()
+    if METRICS_PORT:
+        serve_metrics(worker, METRICS_HOST, METRICS_PORT, admission=admission)
+
+    # SIGTERM/SIGINT: stop leasing and finish the running jobs.
+    signal.signal(signal.SIGTERM, lambda signum, frame: worker.stop())
+    signal.signal(signal.SIGINT, lambda signum, frame: worker.stop())
+    worker.run()